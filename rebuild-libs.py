@@ -11,11 +11,38 @@ if len(sys.argv) == 1:
 	exit(0)
 
 import urllib.request
+import urllib.parse
+import http.client
 import os
 import subprocess
 import shutil
 import platform
 import re
+import threading
+import concurrent.futures
+import traceback
+import hashlib
+import inspect
+import json
+import time
+import struct
+import tarfile
+import zipfile
+import fnmatch
+import shlex
+import stat
+import atexit
+import zlib
+import random
+import math
+import lzma
+import contextlib
+import base64
+if os.name == 'posix':
+	import fcntl
+	import termios
+else:
+	import msvcrt
 
 tag = "vUNKNOWN"
 
@@ -26,11 +53,14 @@ elif 'GITHUB_SHA' in os.environ:
 	tag = os.environ['GITHUB_SHA'][0:8]
 	print("Set tag from $TAG_NAME to '" + tag + "'")
 
-variant = ''
+#command-line options; everything else on the command line is a library name, 'all', or 'package':
+options = [ arg for arg in sys.argv[1:] if arg.startswith('--') ]
+
 variant_cflags = { '':'' }
 variant_cmake_flags = { '':[] }
 variant_configure_flags = { '':[] }
 variant_env = { '':{} }
+variant_merge_conditions = dict()
 
 
 jobs = os.cpu_count() + 1
@@ -57,6 +87,11 @@ elif platform.system() == 'Darwin':
 		'-x86':{'MACOSX_DEPLOYMENT_TARGET':'10.9'},
 		'-arm':{'MACOSX_DEPLOYMENT_TARGET':'11'}
 	}
+	#preprocessor conditions for headers that differ between variants (None => #else):
+	variant_merge_conditions = {
+		'-arm':'defined(__aarch64__)',
+		'-x86':None
+	}
 	variants = ['-x86','-arm']
 elif platform.system() == 'Windows':
 	target = 'windows'
@@ -64,7 +99,62 @@ elif platform.system() == 'Windows':
 else:
 	exit("Unknown system '" + platform.system() + "'")
 
-print("Will build for '" + target + variant + "'")
+#--variant=<suffix>:<cflags> (repeatable) replaces the target's variants, e.g.
+# `--variant=-O1:-O1 --variant=-O3:-O3` builds everything twice, side by side:
+custom_variants = [ opt[len('--variant='):] for opt in options if opt.startswith('--variant=') ]
+if len(custom_variants) > 0:
+	variants = []
+	for spec in custom_variants:
+		(suffix, _, cflags) = spec.partition(':')
+		if not suffix.startswith('-') or suffix in variants:
+			exit(f"Bad option '--variant={spec}' (expected --variant=-<name>:<cflags>, each name used once).")
+		variants.append(suffix)
+		variant_cflags[suffix] = cflags
+		variant_cmake_flags.setdefault(suffix, [])
+		variant_configure_flags.setdefault(suffix, [])
+		variant_env.setdefault(suffix, {})
+
+#--flavor=<name> adds the flavor's flags to every variant and builds into its own
+# output root (e.g. linux-perf/) and packages (nest-libs-linux-perf-<tag>...), so
+# the baseline build and package are untouched:
+flavors = {
+	#-O3, AVX2-era x86-64 and LTO. Objects are "fat" (LTO bytecode + regular code),
+	# so the static libraries link into non-LTO builds too. CMake's RelWithDebInfo
+	# flags come after CFLAGS, so they are overridden to keep -O3; AR/NM/RANLIB
+	# are the gcc wrappers that index LTO objects in the autoconf-built archives:
+	'perf':{
+		'targets':['linux'],
+		'cflags':'-O3 -march=x86-64-v3 -flto=auto -ffat-lto-objects',
+		'cmake_flags':[
+			'-DCMAKE_INTERPROCEDURAL_OPTIMIZATION=ON',
+			'-DCMAKE_POLICY_DEFAULT_CMP0069=NEW',
+			'-DCMAKE_C_FLAGS_RELWITHDEBINFO=-O3 -g -DNDEBUG',
+			'-DCMAKE_CXX_FLAGS_RELWITHDEBINFO=-O3 -g -DNDEBUG',
+		],
+		'configure_flags':[],
+		'env':{'AR':'gcc-ar', 'NM':'gcc-nm', 'RANLIB':'gcc-ranlib'},
+	},
+}
+
+flavor = None
+for opt in options:
+	if opt.startswith('--flavor='):
+		flavor = opt[len('--flavor='):]
+
+output_root = target
+if flavor is not None:
+	if flavor not in flavors:
+		exit(f"Unknown flavor '{flavor}' (expected one of: " + ", ".join(sorted(flavors)) + ").")
+	if target not in flavors[flavor]['targets']:
+		exit(f"The '{flavor}' flavor isn't available for '{target}'.")
+	for v in variants:
+		variant_cflags[v] = (variant_cflags[v] + ' ' + flavors[flavor]['cflags']).strip()
+		variant_cmake_flags[v] = variant_cmake_flags[v] + flavors[flavor]['cmake_flags']
+		variant_configure_flags[v] = variant_configure_flags[v] + flavors[flavor]['configure_flags']
+		variant_env[v] = dict(variant_env[v], **flavors[flavor]['env'])
+	output_root = target + "-" + flavor
+
+print("Will build for " + ", ".join("'" + output_root + v + "'" for v in variants))
 
 if target == 'macos':
 	if os.path.exists('/usr/local/bin/ranlib'):
@@ -73,6 +163,25 @@ if target == 'macos':
 
 work_folder = "work"
 
+#Everything a build function needs to know about the variant it builds. Each
+# variant installs into its own output folder and (when there is more than one,
+# or a --flavor is set) unpacks and builds sources in its own work folder, so that the variants of a
+# library can build at the same time:
+class BuildContext:
+	def __init__(self, variant):
+		self.target = target
+		self.variant = variant
+		self.cflags = variant_cflags[variant]
+		self.cmake_flags = variant_cmake_flags[variant]
+		self.configure_flags = variant_configure_flags[variant]
+		self.env = variant_env[variant]
+		self.out = output_root + variant
+		self.work = work_folder if len(variants) == 1 and flavor is None else work_folder + "/" + output_root + variant
+		#(relative path from a source folder in self.work back to the top folder)
+		self.top = '../' * (self.work.count('/') + 2)
+
+build_contexts = [ BuildContext(v) for v in variants ]
+
 SDL3_filebase = "SDL3-3.4.14"
 SDL3_urlbase = "https://github.com/libsdl-org/SDL/releases/download/release-3.4.14/" + SDL3_filebase
 
@@ -114,13 +223,548 @@ freetype_url = 'https://prdownloads.sourceforge.net/freetype/freetype2/2.13.3/'
 harfbuzz_filebase = '14.3.1'
 harfbuzz_urlbase = 'https://github.com/harfbuzz/harfbuzz/archive/' + harfbuzz_filebase
 
+if target == 'windows':
+	archive_ext = ".zip"
+else:
+	archive_ext = ".tar.gz"
+
+#source archive for each library, as (url, local filename):
+lib_archives = {
+	"SDL3":(SDL3_urlbase + archive_ext, work_folder + "/" + SDL3_filebase + archive_ext),
+	"glm":(glm_urlbase + ".zip", work_folder + "/" + glm_filebase + ".zip"),
+	"zlib":(zlib_url, work_folder + "/" + zlib_filebase + archive_ext),
+	"libpng":(libpng_url, work_folder + "/" + libpng_filebase + archive_ext),
+	"libogg":(libogg_urlbase + archive_ext, work_folder + "/" + libogg_filebase + archive_ext),
+	"libopus":(libopus_url, work_folder + "/" + libopus_filebase + ".tar.gz"),
+	"opusfile":(opusfile_url, work_folder + "/" + opusfile_filebase + ".tar.gz"),
+	"libopusenc":(libopusenc_url, work_folder + "/" + libopusenc_filebase + ".tar.gz"),
+	"opus-tools":(opustools_url, work_folder + "/" + opustools_filebase + ".tar.gz"),
+	"freetype":(freetype_url, work_folder + "/" + freetype_filebase + ".tar.gz"),
+	"harfbuzz":(harfbuzz_urlbase + ".zip", work_folder + "/" + harfbuzz_filebase + ".zip"),
+}
+
+#other places to get each archive, tried in order if its url fails (the pinned
+# checksum has to match wherever it comes from). NEST_LIBS_MIRRORS lists base
+# urls (space-separated) to try before everything else, as <base>/<archive name>:
+lib_mirrors = {
+	"libpng":[ "https://download.sourceforge.net/libpng/" + libpng_filebase + archive_ext ],
+	"libogg":[ "https://ftp.osuosl.org/pub/xiph/releases/ogg/" + libogg_filebase + archive_ext ],
+	"libopus":[ "https://ftp.osuosl.org/pub/xiph/releases/opus/" + libopus_filebase + ".tar.gz", "https://archive.mozilla.org/pub/opus/" + libopus_filebase + ".tar.gz" ],
+	"opusfile":[ "https://ftp.osuosl.org/pub/xiph/releases/opus/" + opusfile_filebase + ".tar.gz", "https://archive.mozilla.org/pub/opus/" + opusfile_filebase + ".tar.gz" ],
+	"libopusenc":[ "https://ftp.osuosl.org/pub/xiph/releases/opus/" + libopusenc_filebase + ".tar.gz", "https://archive.mozilla.org/pub/opus/" + libopusenc_filebase + ".tar.gz" ],
+	"opus-tools":[ "https://downloads.xiph.org/releases/opus/" + opustools_filebase + ".tar.gz", "https://ftp.osuosl.org/pub/xiph/releases/opus/" + opustools_filebase + ".tar.gz" ],
+	"freetype":[ "https://download.savannah.gnu.org/releases/freetype/" + freetype_filebase + ".tar.gz" ],
+}
+extra_mirrors = os.environ.get('NEST_LIBS_MIRRORS', '').split()
+
+#archive members (relative to the archive's top-level folder) not worth
+# unpacking; a pattern matching a folder skips everything under it:
+lib_extract_excludes = {
+	"SDL3":["test"],
+	"harfbuzz":["test", "docs"],
+	"freetype":["docs"],
+}
+
 if not os.path.exists(work_folder):
 	print("Creating work folder '" + work_folder + "'")
 	os.mkdir(work_folder)
 
+#per-thread state for the library currently being built (see build_libraries):
+build_state = threading.local()
+
+#set when a library fails so that sibling builds stop quickly:
+build_cancelled = threading.Event()
+running_processes = set()
+running_processes_lock = threading.Lock()
+
+class BuildCancelled(Exception):
+	pass
+
+#Build timeline: commands, downloads, extractions and build phases are recorded
+# as events tagged with library, variant and phase; write_timeline() saves a
+# summary to work/timeline.json and a trace (for chrome://tracing or Perfetto)
+# to work/timeline.trace.json.
+timeline_start = time.time()
+timeline_events = []
+timeline_lock = threading.Lock()
+
+#'usage' is a child's resource usage (from os.wait4), where available:
+def record_event(category, name, start, end, usage=None, phase=None, **args):
+	ctx = getattr(build_state, 'ctx', None)
+	event = {
+		'category': category,
+		'name': name,
+		'lib': getattr(build_state, 'lib', None),
+		'variant': ctx.variant if ctx is not None else '',
+		'phase': phase if phase is not None else getattr(build_state, 'phase', None),
+		'thread': threading.current_thread().name,
+		'start': start - timeline_start,
+		'wall': end - start,
+	}
+	if usage is not None:
+		event['user'] = usage.ru_utime
+		event['sys'] = usage.ru_stime
+		#(ru_maxrss is in kilobytes on linux, bytes on macOS)
+		event['maxrss'] = usage.ru_maxrss * (1 if target == 'macos' else 1024)
+	event.update(args)
+	with timeline_lock:
+		timeline_events.append(event)
+	return event
+
+#Per-phase wall and cpu times from the most recent run that ran each phase,
+# by output root + variant, library and phase; --plan estimates from these:
+build_history_file = work_folder + "/build-history.json"
+
+def load_build_history():
+	if not os.path.exists(build_history_file):
+		return dict()
+	with open(build_history_file, 'r') as f:
+		return json.load(f)
+
+def update_build_history(events):
+	history = load_build_history()
+	for e in events:
+		if e['category'] != 'phase' or e.get('failed', False):
+			continue
+		phases = history.setdefault(output_root + e['variant'], dict()).setdefault(e['lib'], dict())
+		phases[e['name']] = { 'wall':e['wall'], 'cpu':e.get('user', 0.0) + e.get('sys', 0.0) }
+	with open(build_history_file + ".tmp", 'w') as f:
+		json.dump(history, f, indent='\t', sort_keys=True)
+	os.replace(build_history_file + ".tmp", build_history_file)
+
+def write_timeline():
+	with timeline_lock:
+		events = list(timeline_events)
+	if len(events) == 0:
+		return
+	#wall and cpu time per library and phase:
+	phases = dict()
+	for e in events:
+		if e['category'] != 'phase':
+			continue
+		totals = phases.setdefault(e['lib'] + e['variant'], dict()).setdefault(e['name'], {'wall':0.0, 'user':0.0, 'sys':0.0, 'maxrss':0})
+		totals['wall'] += e['wall']
+		totals['user'] += e.get('user', 0.0)
+		totals['sys'] += e.get('sys', 0.0)
+		totals['maxrss'] = max(totals['maxrss'], e.get('maxrss', 0))
+	steps = sorted([ e for e in events if e['category'] == 'ninja' ], key=lambda e: e['wall'], reverse=True)
+	summary = {
+		'target': target,
+		'tag': tag,
+		'wall': time.time() - timeline_start,
+		'phases': phases,
+		'slowest_steps': [ { 'lib':e['lib'] + e['variant'], 'output':e['name'], 'wall':e['wall'] } for e in steps[0:50] ],
+		'events': events,
+	}
+	with open(work_folder + "/timeline.json", 'w') as f:
+		json.dump(summary, f, indent='\t')
+	update_build_history(events)
+
+	#chrome trace_event format, one track per thread:
+	tids = dict()
+	trace = []
+	for e in events:
+		if e['thread'] not in tids:
+			tids[e['thread']] = len(tids) + 1
+			trace.append({ 'ph':'M', 'name':'thread_name', 'pid':1, 'tid':tids[e['thread']], 'args':{ 'name':e['thread'] } })
+		args = { key:e[key] for key in e if key not in ['category', 'name', 'thread', 'start', 'wall'] }
+		trace.append({
+			'ph':'X',
+			'cat':e['category'],
+			'name':(e['lib'] + e['variant'] + ' ' if e['lib'] is not None and e['category'] == 'phase' else '') + e['name'],
+			'pid':1,
+			'tid':tids[e['thread']],
+			'ts':round(e['start'] * 1e6),
+			'dur':round(e['wall'] * 1e6),
+			'args':args,
+		})
+	with open(work_folder + "/timeline.trace.json", 'w') as f:
+		json.dump({ 'traceEvents':trace, 'displayTimeUnit':'ms' }, f)
+
+	print(f"Build timeline written to '{work_folder}/timeline.json' and '{work_folder}/timeline.trace.json'. Longest phases:")
+	longest = sorted([ (totals['wall'], lib, name, totals) for lib in phases for (name, totals) in phases[lib].items() ], key=lambda x: x[0], reverse=True)
+	for (wall, lib, name, totals) in longest[0:10]:
+		print(f"  {lib} {name}: {wall:.1f}s wall, {totals['user']:.1f}s user, {totals['sys']:.1f}s sys, {totals['maxrss'] / 1e6:.0f} MB peak rss")
+	if len(steps) > 0:
+		print("Slowest build steps (from .ninja_log):")
+		for e in steps[0:5]:
+			print(f"  {e['lib']}{e['variant']} {e['name']}: {e['wall']:.1f}s")
+
+def lib_jobs():
+	return getattr(build_state, 'jobs', jobs)
+
+#GNU make jobserver (POSIX only): every command run while building a library
+# joins that library's jobserver fifo via MAKEFLAGS, and build_libraries moves
+# tokens between the per-library fifos so that no more than 'jobs' jobs run in
+# total across all libraries. (Libraries built by a ninja that can't join the
+# jobserver get a fixed number of slots instead; see ninja_libs.)
+use_jobserver = os.name == 'posix' and "--no-jobserver" not in options
+
+def get_jobserver_style():
+	try:
+		version = subprocess.run(['make', '--version'], capture_output=True, text=True).stdout
+	except OSError:
+		return 'fifo'
+	m = re.match(r'GNU Make (\d+)\.(\d+)', version)
+	if m is None or (int(m.group(1)), int(m.group(2))) >= (4, 4):
+		return 'fifo' #(also the only style ninja >= 1.13 understands)
+	elif (int(m.group(1)), int(m.group(2))) >= (4, 2):
+		return 'auth'
+	else:
+		return 'fds' #e.g., macOS's make 3.81
+
+jobserver_style = get_jobserver_style() if use_jobserver else None
+
+class Jobserver:
+	def __init__(self, name):
+		self.name = name
+		self.path = os.path.abspath(work_folder + "/jobserver-" + name + ".fifo")
+		remove_if_exists(self.path)
+		os.mkfifo(self.path)
+		self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+		self.client_fd = None
+		self.granted = 1 #includes the implicit token held by the make that gets started
+		self.idle = 0
+		self.start = time.monotonic()
+		self.samples = [] #(seconds, tokens held)
+
+	def makeflags(self):
+		if jobserver_style == 'fifo':
+			return ' -j --jobserver-auth=fifo:' + self.path
+		#older makes inherit a (blocking) descriptor instead of opening the fifo:
+		if self.client_fd is None:
+			self.client_fd = os.open(self.path, os.O_RDWR)
+		if jobserver_style == 'auth':
+			return f' -j --jobserver-auth={self.client_fd},{self.client_fd}'
+		else:
+			return f' -j --jobserver-fds={self.client_fd},{self.client_fd}'
+
+	def poll(self):
+		self.idle = struct.unpack('i', fcntl.ioctl(self.fd, termios.FIONREAD, b'\0\0\0\0'))[0]
+		self.samples.append((time.monotonic() - self.start, self.granted - self.idle))
+
+	def give(self, count):
+		os.write(self.fd, b'+' * count)
+		self.granted += count
+		self.idle += count
+
+	#take back tokens that are sitting unused in the fifo:
+	def reclaim(self):
+		try:
+			count = len(os.read(self.fd, self.idle)) if self.idle > 0 else 0
+		except BlockingIOError:
+			count = 0
+		self.granted -= count
+		self.idle -= count
+		return count
+
+	def report(self):
+		if len(self.samples) == 0:
+			return
+		held = [ h for (t, h) in self.samples ]
+		#max tokens held during each second:
+		timeline = [ 0 ] * (int(self.samples[-1][0]) + 1)
+		for (t, h) in self.samples:
+			timeline[int(t)] = max(timeline[int(t)], h)
+		print(f"  {self.name} jobserver tokens: max {max(held)}, mean {sum(held) / len(held):.1f} over {self.samples[-1][0]:.1f}s")
+		print(f"  {self.name} tokens held per second: " + ' '.join(str(h) for h in timeline))
+
+	def close(self):
+		os.close(self.fd)
+		if self.client_fd is not None:
+			os.close(self.client_fd)
+		remove_if_exists(self.path)
+
+#Compiler cache (opt-in with --ccache, or --ccache=ccache / --ccache=sccache):
+# cmake builds get CMAKE_<LANG>_COMPILER_LAUNCHER, autoconf and meson builds get
+# a wrapped CC/CXX (or, for meson cross builds, wrapped binaries in cross.txt).
+# Each library and variant gets its own cache folder, so variant_cflags never
+# collide, and hits/misses are reported per library.
+compiler_cache_folder = os.environ.get('NEST_LIBS_COMPILER_CACHE', work_folder + "/compiler-cache")
+compiler_cache_stats = dict() #lib + variant => (hits, misses)
+
+def find_compiler_cache():
+	wanted = None
+	for opt in options:
+		if opt == '--ccache':
+			wanted = [ 'ccache', 'sccache' ]
+		elif opt.startswith('--ccache='):
+			wanted = [ opt[len('--ccache='):] ]
+	if wanted is None:
+		return None
+	for name in wanted:
+		path = shutil.which(name)
+		if path is not None:
+			print(f"Using compiler cache '{path}'.")
+			return (name, path)
+	exit("Asked for a compiler cache, but couldn't find " + ' or '.join(wanted) + ".")
+
+compiler_cache = find_compiler_cache()
+
+def compiler_launcher_command():
+	return [] if compiler_cache is None else [ compiler_cache[1] ]
+
+def compiler_launcher_cmake_flags():
+	if compiler_cache is None:
+		return []
+	return [ '-DCMAKE_C_COMPILER_LAUNCHER=' + compiler_cache[1], '-DCMAKE_CXX_COMPILER_LAUNCHER=' + compiler_cache[1] ]
+
+def add_compiler_launcher(env):
+	if compiler_cache is None:
+		return
+	env['CC'] = compiler_cache[1] + ' ' + env.get('CC', 'cc')
+	env['CXX'] = compiler_cache[1] + ' ' + env.get('CXX', 'c++')
+
+#environment that points the compiler cache at the folder for 'lib' in ctx's variant:
+def compiler_cache_env(lib, ctx):
+	folder = os.path.abspath(compiler_cache_folder + "/" + lib + ctx.variant)
+	if compiler_cache[0] == 'sccache':
+		#(sccache runs a server per cache folder, so each library and variant gets its own port)
+		port = 4300 + sorted(lib_builders).index(lib) * len(variants) + variants.index(ctx.variant)
+		return { 'SCCACHE_DIR':folder, 'SCCACHE_SERVER_PORT':str(port) }
+	else:
+		return { 'CCACHE_DIR':folder }
+
+def compiler_cache_command(lib, ctx, args):
+	env = dict(os.environ)
+	env.update(compiler_cache_env(lib, ctx))
+	return subprocess.run([ compiler_cache[1] ] + args, env=env, capture_output=True, text=True)
+
+def start_compiler_cache(lib, ctx):
+	os.makedirs(os.path.abspath(compiler_cache_folder + "/" + lib + ctx.variant), exist_ok=True)
+	if compiler_cache[0] == 'sccache':
+		compiler_cache_command(lib, ctx, [ '--start-server' ])
+	compiler_cache_command(lib, ctx, [ '--zero-stats' ])
+
+def stop_compiler_cache(lib, ctx):
+	hits = 0
+	misses = 0
+	if compiler_cache[0] == 'sccache':
+		try:
+			stats = json.loads(compiler_cache_command(lib, ctx, [ '--show-stats', '--stats-format=json' ]).stdout)['stats']
+			hits = sum(stats['cache_hits']['counts'].values())
+			misses = sum(stats['cache_misses']['counts'].values())
+		except (ValueError, KeyError):
+			pass
+		compiler_cache_command(lib, ctx, [ '--stop-server' ])
+	else:
+		#(--print-stats is tab-separated "name value" lines)
+		for line in compiler_cache_command(lib, ctx, [ '--print-stats' ]).stdout.splitlines():
+			fields = line.split('\t')
+			if len(fields) != 2 or not fields[1].isdigit():
+				continue
+			if fields[0] in [ 'direct_cache_hit', 'preprocessed_cache_hit' ]:
+				hits += int(fields[1])
+			elif fields[0] == 'cache_miss':
+				misses += int(fields[1])
+	compiler_cache_stats[lib + ctx.variant] = (hits, misses)
+
+def report_compiler_cache():
+	if compiler_cache is None or len(compiler_cache_stats) == 0:
+		return
+	print(f"Compiler cache ({compiler_cache[0]}) hits / misses:")
+	for name in sorted(compiler_cache_stats):
+		(hits, misses) = compiler_cache_stats[name]
+		rate = f"{hits / (hits + misses):.0%}" if hits + misses > 0 else "-"
+		print(f"  {name}: {hits} hits, {misses} misses ({rate})")
+
+#Shared autoconf cache: the autoconf configure scripts (libpng, libogg, libopusenc,
+# opusfile, opus-tools) all probe the same headers, types and sizes. Results are
+# pooled in work/autoconf-cache/<key>.cache, where the key hashes the target,
+# variant, variant flags and compiler version, and the library's own compiler
+# environment (CFLAGS, LIBS, and so on, plus anything else the builder sets) --
+# so a change to any of them starts a fresh cache, and results probed with
+# one library's flags are never used for another's. Each configure gets its
+# own copy and merges what it found back in afterwards; the "precious"
+# ac_cv_env_* entries are kept, so configure still checks them itself.
+# --no-config-cache turns this off.
+use_config_cache = "--no-config-cache" not in options
+config_cache_env = [ 'CC', 'CFLAGS', 'CPP', 'CPPFLAGS', 'CXX', 'CXXFLAGS', 'CXXCPP', 'LDFLAGS', 'LIBS', 'PKG_CONFIG', 'PKG_CONFIG_PATH', 'PKG_CONFIG_LIBDIR' ]
+config_cache_lock = threading.Lock()
+configure_times = dict() #lib + variant => (seconds, cached entries used)
+
+def config_cache_file(ctx, configure, env):
+	key = hashlib.sha256(json.dumps([
+		ctx.out,
+		ctx.cflags,
+		ctx.configure_flags,
+		ctx.env,
+		compiler_version,
+		{ name:env.get(name) for name in config_cache_env },
+		env_changes(env),
+		[ arg for arg in configure if re.match(r'^[A-Za-z_]\w*=', arg) ],
+	], sort_keys=True).encode('utf8')).hexdigest()
+	return work_folder + "/autoconf-cache/" + key[0:16] + ".cache"
+
+#autoconf cache lines look like: ac_cv_header_stdint_h=${ac_cv_header_stdint_h=yes}
+def read_config_cache(filename):
+	entries = dict()
+	if os.path.exists(filename):
+		with open(filename, 'r') as f:
+			for line in f:
+				m = re.match(r'^(\w+)=\$\{\1=.*\}$', line.rstrip('\n'))
+				if m is not None:
+					entries[m.group(1)] = line
+	return entries
+
+def run_configure(configure, cwd, env):
+	lib = build_state.lib
+	ctx = build_state.ctx
+	start = time.time()
+	if not use_config_cache:
+		run_command(configure, cwd=cwd, env=env)
+		configure_times[lib + ctx.variant] = (time.time() - start, None)
+		return
+	shared = config_cache_file(ctx, configure, env)
+	local = os.path.abspath(cwd + "/config.cache")
+	with config_cache_lock:
+		entries = read_config_cache(shared)
+	with open(local, 'w') as f:
+		f.write(''.join(entries[name] for name in sorted(entries)))
+	run_command(configure + [ '--cache-file=' + local ], cwd=cwd, env=env)
+	configure_times[lib + ctx.variant] = (time.time() - start, len(entries))
+	with config_cache_lock:
+		merged = read_config_cache(shared)
+		merged.update(read_config_cache(local))
+		os.makedirs(os.path.dirname(shared), exist_ok=True)
+		with open(shared + ".tmp", 'w') as f:
+			f.write(''.join(merged[name] for name in sorted(merged)))
+		os.replace(shared + ".tmp", shared)
+
+def report_configure_times():
+	if len(configure_times) == 0:
+		return
+	print("autoconf configure times:")
+	for name in sorted(configure_times):
+		(seconds, cached) = configure_times[name]
+		if cached is None:
+			note = "no shared cache"
+		elif cached == 0:
+			note = "shared cache was empty"
+		else:
+			note = f"{cached} cached results available"
+		print(f"  {name}: {seconds:.1f}s ({note})")
+
+#extra arguments for make / cmake --build / meson compile; with a jobserver, MAKEFLAGS does this:
+def parallel_args():
+	if getattr(build_state, 'jobserver', None) is not None:
+		return []
+	return ['-j', str(lib_jobs())]
+
 def run_command(args,cwd=None,env=None):
 	print("  Running `\"" + '" "'.join(args) + "\"`")
-	subprocess.run(args,cwd=cwd,check=True,env=env)
+	if build_cancelled.is_set():
+		raise BuildCancelled()
+	pass_fds = ()
+	if compiler_cache is not None and getattr(build_state, 'lib', None) is not None:
+		env = dict(os.environ if env is None else env)
+		env.update(compiler_cache_env(build_state.lib, build_state.ctx))
+	jobserver = getattr(build_state, 'jobserver', None)
+	if jobserver is not None:
+		env = dict(os.environ if env is None else env)
+		env['MAKEFLAGS'] = jobserver.makeflags()
+		if jobserver.client_fd is not None:
+			pass_fds = (jobserver.client_fd,)
+	start = time.time()
+	usage = None
+	#each command gets its own process group so that cancel_builds() can take down make's children as well:
+	with subprocess.Popen(args,cwd=cwd,env=env,pass_fds=pass_fds,start_new_session=(os.name == 'posix')) as proc:
+		with running_processes_lock:
+			running_processes.add(proc)
+		try:
+			if os.name == 'posix':
+				#(wait4 gives this command's own cpu time and peak rss, even with other builds running)
+				(pid, status, usage) = os.wait4(proc.pid, 0)
+				returncode = os.waitstatus_to_exitcode(status)
+				proc.returncode = returncode
+			else:
+				returncode = proc.wait()
+		finally:
+			with running_processes_lock:
+				running_processes.discard(proc)
+	event = record_event('command', os.path.basename(args[0]), start, time.time(), usage, args=args, cwd=cwd)
+	if usage is not None and getattr(build_state, 'phase', None) is not None:
+		build_state.phase_usage.append(event)
+	if build_cancelled.is_set():
+		raise BuildCancelled()
+	if returncode != 0:
+		raise subprocess.CalledProcessError(returncode, args)
+
+#CMake generator: --cmake-generator=<name> picks one; by default, Ninja is used
+# where it is installed (and, with a jobserver, new enough to share it --
+# ninja 1.13+). Windows keeps the Visual Studio generator by default, since
+# its builds expect the multi-config build/RelWithDebInfo/ layout.
+def get_ninja_version():
+	try:
+		version = subprocess.run(['ninja', '--version'], capture_output=True, text=True).stdout.strip()
+	except OSError:
+		return None
+	m = re.match(r'(\d+)\.(\d+)', version)
+	return (int(m.group(1)), int(m.group(2))) if m is not None else None
+
+def get_cmake_generator():
+	for opt in options:
+		if opt.startswith('--cmake-generator='):
+			return opt[len('--cmake-generator='):]
+	if target == 'windows':
+		return None
+	ninja_version = get_ninja_version()
+	if ninja_version is None:
+		return None
+	if use_jobserver and (ninja_version < (1, 13) or jobserver_style != 'fifo'):
+		print(f"Not using ninja {ninja_version[0]}.{ninja_version[1]} for cmake builds, since it can't join the jobserver (that needs ninja 1.13+ and a fifo jobserver).")
+		return None
+	return 'Ninja'
+
+cmake_generator = get_cmake_generator()
+if cmake_generator is not None:
+	print(f"Using cmake generator '{cmake_generator}'.")
+
+#Libraries whose build runs ninja directly (through meson). When ninja can't join
+# the jobserver, they get a fixed share of the job slots (passed on as -j) instead:
+ninja_libs = [ 'harfbuzz' ]
+ninja_joins_jobserver = use_jobserver and jobserver_style == 'fifo' and (get_ninja_version() or (0, 0)) >= (1, 13)
+
+def cmake_generator_args():
+	return [] if cmake_generator is None else [ '-G', cmake_generator ]
+
+#Run a build command ('cmake --build' or 'meson compile') for 'build_dir' and
+# add each step that ninja logged while it ran to the build timeline:
+def run_build(args, build_dir, cwd=None, env=None):
+	log = build_dir + "/.ninja_log"
+	offset = os.path.getsize(log) if os.path.exists(log) else 0
+	start = time.time()
+	run_command(args, cwd=cwd, env=env)
+	if not os.path.exists(log):
+		return
+	with open(log, 'r') as f:
+		if os.path.getsize(log) < offset:
+			return #(ninja recompacted the log; entries from this run can't be told apart)
+		f.seek(offset)
+		lines = f.readlines()
+	#"start_ms end_ms mtime output hash" per line; times are from when ninja started:
+	for line in lines:
+		fields = line.rstrip('\n').split('\t')
+		if len(fields) != 5 or not fields[0].isdigit():
+			continue
+		record_event('ninja', fields[3], start + int(fields[0]) / 1000, start + int(fields[1]) / 1000)
+
+def cancel_builds():
+	build_cancelled.set()
+	if prefetch_pool is not None:
+		prefetch_pool.shutdown(wait=False, cancel_futures=True)
+	with running_processes_lock:
+		procs = list(running_processes)
+	for proc in procs:
+		try:
+			if os.name == 'posix':
+				os.killpg(proc.pid, 9)
+			elif target == 'windows':
+				subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], check=False, capture_output=True)
+			else:
+				proc.kill()
+		except (ProcessLookupError, PermissionError):
+			pass
 
 def remove_if_exists(path):
 	if not os.path.exists(path):
@@ -130,79 +774,898 @@ def remove_if_exists(path):
 	else:
 		os.remove(path)
 
-def unzip_file(filename, folder, *args):
-	if target == 'windows':
-		run_command([
-			"C:\\Program Files\\7-Zip\\7z.exe",
-			"x"
-			] + list(args) + [
-			"-o" + folder,
-			filename
-		])
+#Unpack the source archive for 'lib' into 'dest' in one pass, streaming
+# decompression straight to disk and skipping lib_extract_excludes[lib]:
+def extract_archive(lib, dest):
+	(url, filename) = lib_archives[lib]
+	excludes = lib_extract_excludes.get(lib, [])
+	def excluded(name):
+		parts = name.strip('/').split('/')[1:] #(drop the top-level folder)
+		for i in range(1, len(parts) + 1):
+			for pattern in excludes:
+				if fnmatch.fnmatch('/'.join(parts[0:i]), pattern):
+					return True
+		return False
+
+	print(f"  Extracting '{filename}'...")
+	start = time.time()
+	files = 0
+	written = 0
+	skipped = 0
+	if filename.endswith('.zip'):
+		with zipfile.ZipFile(filename) as archive:
+			for info in archive.infolist():
+				if build_cancelled.is_set():
+					raise BuildCancelled()
+				if excluded(info.filename):
+					skipped += 1
+					continue
+				mode = info.external_attr >> 16
+				path = os.path.join(dest, *info.filename.strip('/').split('/'))
+				if '..' in info.filename.split('/') or os.path.isabs(info.filename):
+					raise RuntimeError(f"Refusing to extract '{info.filename}' from '{filename}'.")
+				if info.is_dir():
+					os.makedirs(path, exist_ok=True)
+					continue
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				if stat.S_ISLNK(mode):
+					#symbolic links can't be relied on when building on windows:
+					if target == 'windows':
+						skipped += 1
+						continue
+					remove_if_exists(path)
+					os.symlink(archive.read(info).decode('utf8'), path)
+				else:
+					with archive.open(info) as src, open(path, 'wb') as dst:
+						shutil.copyfileobj(src, dst, 1 << 20)
+					if mode & 0o111 and target != 'windows':
+						os.chmod(path, mode & 0o777)
+					written += info.file_size
+				files += 1
 	else:
-		run_command([
-			"unzip",
-			] + list(args) + [
-			"-q",
-			filename,
-			"-d", folder
-		])
+		#(tarfile's 'data' filter only exists in newer pythons)
+		extract_args = {}
+		if hasattr(tarfile, 'data_filter'):
+			extract_args['filter'] = 'data'
+		#(only one variant streams an archive at a time; the next may find it on disk or in the download cache)
+		lock = None
+		if not os.path.exists(filename):
+			with stream_locks_lock:
+				lock = stream_locks.setdefault(filename, threading.Lock())
+			lock.acquire()
+		try:
+			if os.path.exists(filename) or (use_download_cache and restore_from_download_cache(filename, pinned_checksums.get(os.path.basename(filename))) is not None):
+				source = open(filename, 'rb')
+			else:
+				source = open_archive_stream(lib)
+			with source, tarfile.open(fileobj=source, mode='r|*') as archive:
+				for member in archive:
+					if build_cancelled.is_set():
+						raise BuildCancelled()
+					if excluded(member.name):
+						skipped += 1
+						continue
+					if not hasattr(tarfile, 'data_filter') and (member.name.startswith('/') or '..' in member.name.split('/')):
+						raise RuntimeError(f"Refusing to extract '{member.name}' from '{filename}'.")
+					archive.extract(member, dest, **extract_args)
+					if not member.isdir():
+						files += 1
+					if member.isfile():
+						written += member.size
+				if isinstance(source, DownloadStream):
+					finish_archive_stream(lib, source, start)
+		finally:
+			if lock is not None:
+				lock.release()
+	elapsed = time.time() - start
+	print(f"  Extracted {lib}: {files} files, {written / 1e6:.1f} MB written in {elapsed:.2f}s ({skipped} archive entries skipped).")
+	record_event('extract', os.path.basename(filename), start, start + elapsed, phase='extract', files=files, bytes=written, skipped=skipped)
+
+#Patch engine: replacements are (old, new) or (old, new, expected count).
+# Every old string is matched in one pass over the file (longest first). One
+# with a count must be found exactly that many times, or the patch fails. One
+# without a count should be found at least once. Until the patch lists have
+# been checked against every platform's sources, a miss there is a warning in
+# a build and an error with --check-patches. Results are cached in
+# work/patch-cache/ by the hash of the input and the replacements.
+patch_cache_folder = work_folder + "/patch-cache"
+
+class PatchError(Exception):
+	pass
+
+#returns (patched data, [ problems ], [ warnings ]); files are patched as bytes, so line endings are left alone:
+def patch_data(data, replacements, strict=False):
+	lookup = { r[0]:r[1] for r in replacements }
+	pattern = re.compile('|'.join(re.escape(old) for old in sorted(lookup, key=len, reverse=True)))
+	counts = { old:0 for old in lookup }
+	def substitute(m):
+		counts[m.group(0)] += 1
+		return lookup[m.group(0)]
+	#(latin-1 maps bytes to characters one-to-one)
+	patched = pattern.sub(substitute, data.decode('latin-1')).encode('latin-1')
+	problems = []
+	warnings = []
+	for r in replacements:
+		expected = r[2] if len(r) > 2 else None
+		if expected is None and counts[r[0]] == 0:
+			(problems if strict else warnings).append(f"{r[0]!r} matched 0 times (expected at least 1)")
+		elif expected is not None and counts[r[0]] != expected:
+			problems.append(f"{r[0]!r} matched {counts[r[0]]} times (expected {expected})")
+	return (patched, problems, warnings)
+
+#compute (but don't write) the patched contents of 'filename'; raises PatchError if a replacement doesn't match:
+def patch_file_contents(filename, replacements):
+	with open(filename, 'rb') as f:
+		data = f.read()
+	key = hashlib.sha256(data + json.dumps(replacements).encode('utf8')).hexdigest()
+	cached = patch_cache_folder + "/" + key
+	if os.path.exists(cached):
+		with open(cached, 'rb') as f:
+			return f.read()
+	(patched, problems, warnings) = patch_data(data, replacements, strict=check_patches_mode)
+	if len(problems) != 0:
+		raise PatchError(f"Patch for '{filename}' no longer applies:\n  " + "\n  ".join(problems))
+	for warning in warnings:
+		print(f"WARNING: part of the patch for '{filename}' didn't apply: {warning}")
+	if len(warnings) != 0:
+		#(not cached, so that every build repeats the warning)
+		return patched
+	os.makedirs(patch_cache_folder, exist_ok=True)
+	#(variants building side by side may be patching the same file)
+	temporary = cached + f".{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(temporary, 'wb') as f:
+		f.write(patched)
+	os.replace(temporary, cached)
+	return patched
+
+def write_file_atomically(filename, data):
+	with open(filename + ".tmp", 'wb') as f:
+		f.write(data)
+	shutil.copymode(filename, filename + ".tmp")
+	os.replace(filename + ".tmp", filename)
 
 def replace_in_file(filename, replacements):
-	os.rename(filename, filename + ".before")
-	with open(filename + ".before", "r") as f:
-		with open(filename, "w") as o:
+	write_file_atomically(filename, patch_file_contents(filename, replacements))
+
+def file_sha256(filename):
+	digest = hashlib.sha256()
+	hash_file_into(digest, filename)
+	return digest.hexdigest()
+
+def hash_file_into(digest, filename):
+	with open(filename, 'rb') as f:
+		while True:
+			block = f.read(1 << 20)
+			if not block:
+				break
+			digest.update(block)
+
+#Pinned SHA-256 digests of the source archives, by local archive name, in `sha256sum` format.
+# Run with --record-checksums to add entries for archives that aren't pinned yet.
+checksums_file = "checksums.sha256"
+record_checksums = "--record-checksums" in options
+checksums_lock = threading.Lock()
+
+def load_checksums():
+	checksums = dict()
+	if os.path.exists(checksums_file):
+		with open(checksums_file, 'r') as f:
 			for line in f:
-				for r in replacements:
-					line = line.replace(r[0], r[1])
-				o.write(line)
+				line = line.strip()
+				if line == '' or line.startswith('#'):
+					continue
+				(digest, name) = line.split(maxsplit=1)
+				checksums[name.lstrip('*')] = digest.lower()
+	return checksums
 
-def fetch_file(url, filename, checksum=None):
-	filename = filename
-	if os.path.exists(filename):
-		print("  File '" + filename + "' exists; TODO: check checksum.")
+pinned_checksums = load_checksums()
+
+#digests of archives in work_folder computed this run, by local filename:
+archive_digests = dict()
+
+def note_checksum(filename, digest):
+	archive_digests[filename] = digest
+	name = os.path.basename(filename)
+	if name in pinned_checksums:
+		return
+	if not record_checksums:
+		#(a warning until every archive's digest is recorded)
+		print(f"WARNING: '{name}' has no pinned checksum in '{checksums_file}' (sha256 {digest}), so it was not verified. Add it with --record-checksums, and check the recorded digest against the upstream release.")
 		return
-	for rep in range(0,3):
+	with checksums_lock:
+		pinned_checksums[name] = digest
+		with open(checksums_file, 'a') as f:
+			f.write(digest + '  ' + name + '\n')
+	print("  Recorded checksum for '" + name + "' in '" + checksums_file + "'.")
+
+#Downloads: connections are kept open and reused for later downloads from the
+# same host, an interrupted transfer picks up where its .part file left off with
+# an HTTP Range request, failed attempts back off exponentially (with jitter),
+# and an archive's mirrors are tried in turn before giving up with DownloadError.
+download_attempts = 5 #(per source; attempts that made progress don't count)
+download_backoff = float(os.environ.get('NEST_LIBS_DOWNLOAD_BACKOFF', '1.0')) #seconds; doubles with each failure
+download_backoff_limit = 30.0
+download_timeout = 60.0
+idle_connections = dict() #(scheme, host) => [ open connections ]
+idle_connections_lock = threading.Lock()
+
+class DownloadError(Exception):
+	def __init__(self, message, retry=True):
+		super().__init__(message)
+		self.retry = retry
+
+#The proxy to reach 'host' through, from http_proxy / https_proxy / no_proxy (as
+# urllib would use them): (proxy host, Proxy-Authorization value or None), or None:
+def download_proxy(scheme, host):
+	proxy = urllib.request.getproxies().get(scheme)
+	if proxy is None or urllib.request.proxy_bypass(host):
+		return None
+	parts = urllib.parse.urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+	auth = None
+	if parts.username is not None:
+		credentials = urllib.parse.unquote(parts.username) + ':' + urllib.parse.unquote(parts.password or '')
+		auth = 'Basic ' + base64.b64encode(credentials.encode('utf8')).decode('ascii')
+	return (parts.hostname + (f":{parts.port}" if parts.port is not None else ''), auth)
+
+#returns (connection, whether it was used before):
+def get_connection(scheme, host):
+	with idle_connections_lock:
+		if len(idle_connections.get((scheme, host), [])) > 0:
+			return (idle_connections[(scheme, host)].pop(), True)
+	proxy = download_proxy(scheme, host)
+	if scheme == 'https':
+		if proxy is None:
+			return (http.client.HTTPSConnection(host, timeout=download_timeout), False)
+		#(https goes through the proxy in a CONNECT tunnel)
+		(proxy_host, auth) = proxy
+		conn = http.client.HTTPSConnection(proxy_host, timeout=download_timeout)
+		conn.set_tunnel(host, headers=({ 'Proxy-Authorization':auth } if auth is not None else None))
+		return (conn, False)
+	elif scheme == 'http':
+		return (http.client.HTTPConnection(host if proxy is None else proxy[0], timeout=download_timeout), False)
+	raise DownloadError(f"Can't download from '{scheme}://{host}'.", retry=False)
+
+def release_connection(scheme, host, conn, response):
+	if response.will_close:
+		conn.close()
+	else:
+		with idle_connections_lock:
+			idle_connections.setdefault((scheme, host), []).append(conn)
+
+#returns (connection, response); pooled connections the server has since closed are skipped:
+def send_request(parts, headers):
+	while True:
+		(conn, reused) = get_connection(parts.scheme, parts.netloc)
+		path = parts.path + ('?' + parts.query if parts.query else '')
+		proxy = download_proxy(parts.scheme, parts.netloc) if parts.scheme == 'http' else None
+		if proxy is not None:
+			#(plain http goes to the proxy with the whole url)
+			path = urllib.parse.urlunsplit(parts._replace(fragment=''))
+			if proxy[1] is not None:
+				headers = dict(headers, **{ 'Proxy-Authorization':proxy[1] })
 		try:
-			print("  Fetching '" + url + "' => '" + filename + "'")
-			urllib.request.urlretrieve(url, filename)
-			return
-		except Exception as e:
-			print(f"ERROR (retry {rep}): {e}")
+			conn.request('GET', path, headers=headers)
+			return (conn, conn.getresponse())
+		except (OSError, http.client.HTTPException):
+			conn.close()
+			if not reused:
+				raise
 
-def build_SDL3():
-	SDL3_dir = work_folder + "/" + SDL3_filebase
+class DownloadRangeError(DownloadError):
+	pass
 
-	print("Cleaning any existing SDL3...")
-	remove_if_exists(SDL3_dir)
-	remove_if_exists(target + variant + "/SDL3/")
+#GET 'url' from byte 'offset' on, following redirects; returns (url, connection,
+# response) once some server answers with (the rest of) the file:
+def open_download(url, offset):
+	for redirect in range(0, 10):
+		parts = urllib.parse.urlsplit(url)
+		headers = { 'User-Agent':'nest-libs', 'Accept-Encoding':'identity' }
+		if offset > 0:
+			headers['Range'] = f"bytes={offset}-"
+		(conn, response) = send_request(parts, headers)
+		if response.status == 206 and not (response.getheader('Content-Range') or '').startswith(f"bytes {offset}-"):
+			conn.close()
+			raise DownloadError(f"'{url}' sent 'Content-Range: {response.getheader('Content-Range')}' when asked for bytes {offset}-.")
+		if response.status in [200, 206]:
+			return (url, conn, response)
+		#(reading the -- short -- body leaves the connection fit for reuse)
+		try:
+			response.read()
+		except (OSError, http.client.HTTPException):
+			conn.close()
+			raise
+		release_connection(parts.scheme, parts.netloc, conn, response)
+		if response.status in [301, 302, 303, 307, 308]:
+			url = urllib.parse.urljoin(url, response.getheader('Location'))
+			continue
+		if response.status == 416:
+			raise DownloadRangeError(f"'{url}' has nothing past byte {offset}.")
+		#(client errors other than timeouts and rate limits won't go away by retrying)
+		retry = response.status >= 500 or response.status in [408, 429]
+		raise DownloadError(f"'{url}' answered {response.status} {response.reason}.", retry=retry)
+	raise DownloadError(f"Too many redirects from '{url}'.", retry=False)
 
-	print("Fetching SDL3...")
-	if target == 'windows':
-		fetch_file(SDL3_urlbase + ".zip", work_folder + "/" + SDL3_filebase + ".zip")
-		unzip_file(work_folder + "/" + SDL3_filebase + ".zip", work_folder)
+#One attempt at getting the rest of 'url' into 'filename':
+#'progress' holds the sha256 of what is in 'filename' so far, updated as blocks arrive:
+def download_attempt(url, filename, progress):
+	offset = os.path.getsize(filename) if os.path.exists(filename) else 0
+	try:
+		(url, conn, response) = open_download(url, offset)
+	except DownloadRangeError:
+		#(what is there already is longer than the file, so start over)
+		os.remove(filename)
+		progress['sha256'] = hashlib.sha256()
+		(url, conn, response) = open_download(url, 0)
+	if response.status == 200 and offset > 0:
+		print(f"  '{url}' doesn't do partial downloads; starting over.")
+	if response.status != 206:
+		progress['sha256'] = hashlib.sha256()
+	expected = response.getheader('Content-Length')
+	received = 0
+	try:
+		with open(filename, 'ab' if response.status == 206 else 'wb') as f:
+			while True:
+				block = response.read(1 << 16)
+				if not block:
+					break
+				f.write(block)
+				progress['sha256'].update(block)
+				received += len(block)
+		#(http.client treats a connection closed early as the end of the body)
+		if expected is not None and received < int(expected):
+			raise http.client.IncompleteRead(b'', int(expected) - received)
+	except BaseException:
+		conn.close()
+		raise
+	parts = urllib.parse.urlsplit(url)
+	release_connection(parts.scheme, parts.netloc, conn, response)
+
+#A download read as a stream (by tarfile, say): hashed as it goes, copied to
+# 'tee' (if given), and picked up again with a Range request if it drops. The
+# 'sources' are tried in turn until one starts sending the file; after that,
+# the stream only continues from the source it started with:
+class DownloadStream:
+	def __init__(self, sources, tee=None):
+		self.sources = list(sources)
+		self.url = self.sources.pop(0)
+		self.errors = []
+		self.tee = tee
+		self.digest = hashlib.sha256()
+		self.received = 0
+		self.total = None
+		self.conn = None
+		self.response = None
+		self.finished = False
+		self.failures = 0
+
+	def read(self, size=1 << 16):
+		while not self.finished:
+			try:
+				if self.response is None:
+					(self.url, self.conn, self.response) = open_download(self.url, self.received)
+					if self.received > 0 and self.response.status != 206:
+						raise DownloadError(f"'{self.url}' can't continue a download from byte {self.received}.", retry=False)
+					length = self.response.getheader('Content-Length')
+					self.total = None if length is None else self.received + int(length)
+				block = self.response.read(size)
+				#(http.client treats a connection closed early as the end of the body)
+				if len(block) == 0 and self.total is not None and self.received < self.total:
+					raise http.client.IncompleteRead(b'', self.total - self.received)
+			except DownloadError as e:
+				error = e
+				if not e.retry:
+					if self.received > 0:
+						self.close()
+						raise
+					#(on to the next source)
+					self.failures = download_attempts - 1
+			except (OSError, http.client.HTTPException) as e:
+				error = e
+			else:
+				if len(block) == 0:
+					parts = urllib.parse.urlsplit(self.url)
+					release_connection(parts.scheme, parts.netloc, self.conn, self.response)
+					self.response = None
+					self.finished = True
+				self.digest.update(block)
+				if self.tee is not None:
+					self.tee.write(block)
+				self.received += len(block)
+				self.failures = 0
+				return block
+			#(the tee stays open, since the stream picks up where it left off)
+			self.drop_connection()
+			self.failures += 1
+			if self.failures >= download_attempts:
+				self.errors.append(f"{self.url}: {error}")
+				if self.received > 0 or len(self.sources) == 0:
+					self.close()
+					if self.received > 0:
+						raise DownloadError(f"'{self.url}' failed {self.failures} times in a row at byte {self.received} (last: {error}).", retry=False)
+					raise DownloadError(f"Couldn't stream from any of {len(self.errors)} sources:\n  " + "\n  ".join(self.errors), retry=False)
+				self.url = self.sources.pop(0)
+				self.failures = 0
+				print(f"  Streaming from '{self.url}' instead.")
+				continue
+			delay = random.uniform(0, min(download_backoff_limit, download_backoff * (2 ** self.failures)))
+			print(f"  Download of '{self.url}' interrupted at byte {self.received} ({type(error).__name__}: {error}); retrying in {delay:.1f}s.")
+			time.sleep(delay)
+		return b''
+
+	def drop_connection(self):
+		if self.response is not None:
+			self.conn.close()
+			self.response = None
+
+	def close(self):
+		self.drop_connection()
+		if self.tee is not None:
+			self.tee.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+#Download 'url' to 'filename' (resuming whatever is there already), retrying with
+# backoff; returns the sha256 of the result:
+def download_file(url, filename):
+	failures = 0
+	#(a partial file left by an earlier run is hashed once; the rest is hashed as it arrives)
+	progress = { 'sha256':hashlib.sha256() }
+	if os.path.exists(filename):
+		hash_file_into(progress['sha256'], filename)
+	while True:
+		before = os.path.getsize(filename) if os.path.exists(filename) else 0
+		if before > 0:
+			print(f"  Resuming '{filename}' from {before} bytes.")
+		try:
+			download_attempt(url, filename, progress)
+			return progress['sha256'].hexdigest()
+		except DownloadError as e:
+			if not e.retry:
+				raise
+			error = e
+		except (OSError, http.client.HTTPException) as e:
+			error = e
+		if os.path.exists(filename) and os.path.getsize(filename) > before:
+			failures = 0
+		else:
+			failures += 1
+		if failures >= download_attempts:
+			raise DownloadError(f"'{url}' failed {failures} times in a row (last: {error}).")
+		delay = random.uniform(0, min(download_backoff_limit, download_backoff * (2 ** failures)))
+		print(f"  Download of '{url}' interrupted ({type(error).__name__}: {error}); retrying in {delay:.1f}s.")
+		time.sleep(delay)
+
+#Shared download cache: archives are kept, named by their sha256, in a per-user
+# folder ($NEST_LIBS_DOWNLOAD_CACHE, else $XDG_CACHE_HOME/nest-libs/downloads)
+# and hard-linked (or, across filesystems, copied) into work/ by every checkout
+# that needs them. Changes happen under a lock file, so parallel runs can share
+# it; once it holds more than $NEST_LIBS_DOWNLOAD_CACHE_MAX (default 2G), the
+# least recently used archives are removed. --no-download-cache skips it, and
+# `rebuild-libs.py cache stats` describes it.
+def user_cache_folder():
+	if os.environ.get('XDG_CACHE_HOME', '') != '':
+		return os.environ['XDG_CACHE_HOME']
+	if target == 'windows' and 'LOCALAPPDATA' in os.environ:
+		return os.environ['LOCALAPPDATA']
+	return os.path.expanduser('~/.cache')
+
+#sizes like '2G', '500M', or a plain number of bytes:
+def parse_size(text):
+	units = { 'K':1 << 10, 'M':1 << 20, 'G':1 << 30, 'T':1 << 40 }
+	text = text.strip().upper().rstrip('B')
+	if text[-1:] in units:
+		return int(float(text[:-1]) * units[text[-1]])
+	return int(text)
+
+download_cache_folder = os.environ.get('NEST_LIBS_DOWNLOAD_CACHE', user_cache_folder() + "/nest-libs/downloads")
+download_cache_max = parse_size(os.environ.get('NEST_LIBS_DOWNLOAD_CACHE_MAX', '2G'))
+use_download_cache = "--no-download-cache" not in options
+download_cache_thread_lock = threading.Lock()
+
+#(held across threads with the mutex and across processes with the lock file)
+class DownloadCacheLock:
+	def __enter__(self):
+		download_cache_thread_lock.acquire()
+		try:
+			os.makedirs(download_cache_folder + "/by-name", exist_ok=True)
+			os.makedirs(download_cache_folder + "/sha256", exist_ok=True)
+			self.file = open(download_cache_folder + "/lock", 'a+')
+			if os.name == 'posix':
+				fcntl.flock(self.file, fcntl.LOCK_EX)
+			else:
+				self.file.seek(0)
+				msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+		except BaseException:
+			download_cache_thread_lock.release()
+			raise
+		return self
+	def __exit__(self, *exception):
+		if os.name == 'posix':
+			fcntl.flock(self.file, fcntl.LOCK_UN)
+		else:
+			self.file.seek(0)
+			msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+		self.file.close()
+		download_cache_thread_lock.release()
+
+def download_cache_entry(digest):
+	return download_cache_folder + "/sha256/" + digest
+
+#(call with the lock held)
+def update_download_cache_stats(**changes):
+	stats_file = download_cache_folder + "/stats.json"
+	stats = { 'hits':0, 'misses':0, 'bytes_saved':0 }
+	if os.path.exists(stats_file):
+		with open(stats_file, 'r') as f:
+			stats.update(json.load(f))
+	for (name, amount) in changes.items():
+		stats[name] += amount
+	with open(stats_file + ".tmp", 'w') as f:
+		json.dump(stats, f, indent='\t', sort_keys=True)
+	os.replace(stats_file + ".tmp", stats_file)
+	return stats
+
+#link (or copy) 'source' to 'filename' via a temporary name, so 'filename' is never partial:
+def link_or_copy(source, filename):
+	temporary = filename + f".{os.getpid()}.{threading.get_ident()}.tmp"
+	remove_if_exists(temporary)
+	try:
+		os.link(source, temporary)
+	except OSError:
+		shutil.copyfile(source, temporary)
+	os.replace(temporary, filename)
+
+#Put the cached copy of 'filename' (by pinned checksum, else by name) into place;
+# returns its digest, or None if the cache doesn't have it:
+def restore_from_download_cache(filename, checksum):
+	name = os.path.basename(filename)
+	with DownloadCacheLock():
+		digest = checksum
+		if digest is None and os.path.exists(download_cache_folder + "/by-name/" + name):
+			with open(download_cache_folder + "/by-name/" + name, 'r') as f:
+				digest = f.read().strip()
+		if digest is None or not os.path.exists(download_cache_entry(digest)):
+			return None
+		link_or_copy(download_cache_entry(digest), filename)
+		#(modification time is the last use, since access times often aren't kept)
+		os.utime(download_cache_entry(digest))
+		evict_from_download_cache()
+	if file_sha256(filename) != digest:
+		print(f"  WARNING: cached '{name}' is damaged; removing it.")
+		with DownloadCacheLock():
+			remove_if_exists(download_cache_entry(digest))
+		os.remove(filename)
+		return None
+	with DownloadCacheLock():
+		update_download_cache_stats(hits=1, bytes_saved=os.path.getsize(filename))
+	print(f"  Linked '{filename}' from the download cache.")
+	return digest
+
+def add_to_download_cache(filename, digest):
+	name = os.path.basename(filename)
+	with DownloadCacheLock():
+		link_or_copy(filename, download_cache_entry(digest))
+		with open(download_cache_folder + "/by-name/" + name, 'w') as f:
+			f.write(digest + '\n')
+		update_download_cache_stats(misses=1)
+		evict_from_download_cache()
+
+#(call with the lock held) drop least recently used archives until under the size cap:
+def evict_from_download_cache():
+	folder = download_cache_folder + "/sha256"
+	entries = [ (os.stat(folder + "/" + digest), digest) for digest in os.listdir(folder) if not digest.endswith('.tmp') ]
+	total = sum(st.st_size for (st, digest) in entries)
+	for (st, digest) in sorted(entries, key=lambda e: e[0].st_mtime):
+		if total <= download_cache_max:
+			break
+		print(f"  Removing {digest[0:12]} ({st.st_size / 1e6:.1f} MB) from the download cache.")
+		os.remove(folder + "/" + digest)
+		total -= st.st_size
+	#names whose archives are gone:
+	for name in os.listdir(download_cache_folder + "/by-name"):
+		with open(download_cache_folder + "/by-name/" + name, 'r') as f:
+			if not os.path.exists(download_cache_entry(f.read().strip())):
+				os.remove(download_cache_folder + "/by-name/" + name)
+
+def download_cache_stats():
+	with DownloadCacheLock():
+		stats = update_download_cache_stats()
+		names = dict() #digest => [ names ]
+		for name in sorted(os.listdir(download_cache_folder + "/by-name")):
+			with open(download_cache_folder + "/by-name/" + name, 'r') as f:
+				names.setdefault(f.read().strip(), []).append(name)
+		folder = download_cache_folder + "/sha256"
+		entries = sorted([ (os.stat(folder + "/" + digest), digest) for digest in os.listdir(folder) if not digest.endswith('.tmp') ], key=lambda e: e[0].st_mtime)
+	total = sum(st.st_size for (st, digest) in entries)
+	print(f"Download cache '{download_cache_folder}':")
+	print(f"  {len(entries)} archives, {total / 1e6:.1f} MB (cap {download_cache_max / 1e6:.1f} MB)")
+	print(f"  {stats['hits']} hits, {stats['misses']} misses; {stats['bytes_saved'] / 1e6:.1f} MB not downloaded again")
+	if len(entries) > 0:
+		print("  Least recently used first:")
+	for (st, digest) in entries:
+		used = time.strftime('%Y-%m-%d %H:%M', time.localtime(st.st_mtime))
+		print(f"    {used}  {st.st_size / 1e6:8.1f} MB  {digest[0:12]}  {', '.join(names.get(digest, ['?']))}")
+
+#every place to get 'filename' from, in the order they are tried:
+def download_sources(url, filename, mirrors=[]):
+	return [ base.rstrip('/') + '/' + os.path.basename(filename) for base in extra_mirrors ] + [ url ] + mirrors
+
+def fetch_file(url, filename, checksum=None, mirrors=[]):
+	if checksum is None:
+		checksum = pinned_checksums.get(os.path.basename(filename))
+	#(an archive that isn't pinned yet is fetched unverified, with a warning)
+	if os.path.exists(filename):
+		digest = file_sha256(filename)
+		if checksum is None or digest == checksum:
+			print("  File '" + filename + "' exists; " + ("checksum OK." if checksum is not None else "not pinned."))
+			note_checksum(filename, digest)
+			return digest
+		print("  File '" + filename + "' exists but has sha256 " + digest + "; expected " + checksum + ". Re-fetching.")
+		os.remove(filename)
+	if use_download_cache:
+		digest = restore_from_download_cache(filename, checksum)
+		if digest is not None:
+			note_checksum(filename, digest)
+			return digest
+	sources = download_sources(url, filename, mirrors)
+	errors = []
+	for source in sources:
+		start = time.time()
+		#(a partial download only continues from the source it came from)
+		source_file = filename + ".part.source"
+		if os.path.exists(filename + ".part"):
+			previous = None
+			if os.path.exists(source_file):
+				with open(source_file, 'r') as f:
+					previous = f.read().strip()
+			if previous != source:
+				os.remove(filename + ".part")
+		with open(source_file, 'w') as f:
+			f.write(source + '\n')
+		try:
+			print("  Fetching '" + source + "' => '" + filename + "'")
+			digest = download_file(source, filename + ".part")
+		except (DownloadError, OSError, http.client.HTTPException) as e:
+			print(f"ERROR: {e}")
+			errors.append(f"{source}: {e}")
+			continue
+		finally:
+			record_event('download', os.path.basename(filename), start, time.time(), url=source)
+		if checksum is not None and digest != checksum:
+			print(f"ERROR: '{source}' has sha256 {digest}; expected {checksum}.")
+			errors.append(f"{source}: sha256 {digest}, expected {checksum}")
+			os.remove(filename + ".part")
+			continue
+		os.replace(filename + ".part", filename)
+		remove_if_exists(source_file)
+		note_checksum(filename, digest)
+		if use_download_cache:
+			add_to_download_cache(filename, digest)
+		return digest
+	raise DownloadError(f"Couldn't download '{os.path.basename(filename)}' from any of its {len(sources)} sources:\n  " + "\n  ".join(errors), retry=False)
+
+#Check every archive in work_folder against the pinned checksums, hashing in parallel:
+def verify_work_folder():
+	names = sorted([ name for name in os.listdir(work_folder) if name in pinned_checksums or name.endswith('.tar.gz') or name.endswith('.zip') ])
+	print(f"Verifying {len(names)} archives in '{work_folder}'...")
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		digests = list(pool.map(lambda name: file_sha256(work_folder + "/" + name), names))
+	bad = 0
+	for (name, digest) in zip(names, digests):
+		if name not in pinned_checksums:
+			print("  " + name + ": not pinned (sha256 " + digest + ")")
+		elif digest == pinned_checksums[name]:
+			print("  " + name + ": OK")
+		else:
+			print("  " + name + ": MISMATCH (sha256 " + digest + "; expected " + pinned_checksums[name] + ")")
+			bad += 1
+	if bad != 0:
+		exit(f"{bad} archives failed verification.")
+
+#--stream-extract: pinned .tar.gz archives that aren't on disk (or in the
+# download cache) are unpacked straight from the network by extract_archive,
+# hashed in the same pass, rather than saved to work/ and read back. The
+# archive is only written out (and kept, linked into the cache) when the
+# download cache is on.
+stream_extract = "--stream-extract" in options
+stream_locks = dict() #local filename => lock held while streaming it
+stream_locks_lock = threading.Lock()
+
+def streams_archive(lib):
+	(url, filename) = lib_archives[lib]
+	digest = pinned_checksums.get(os.path.basename(filename))
+	if not stream_extract or not filename.endswith('.tar.gz') or digest is None or os.path.exists(filename):
+		return False
+	return not (use_download_cache and os.path.exists(download_cache_entry(digest)))
+
+def open_archive_stream(lib):
+	(url, filename) = lib_archives[lib]
+	print(f"  Streaming '{url}' (not saved to '{filename}')" if not use_download_cache else f"  Streaming '{url}' (and saving it to '{filename}')")
+	return DownloadStream(download_sources(url, filename, lib_mirrors.get(lib, [])), open(filename + ".part", 'wb') if use_download_cache else None)
+
+#check (and, with the download cache, keep) a streamed archive once tarfile is done with it:
+def finish_archive_stream(lib, stream, start):
+	(url, filename) = lib_archives[lib]
+	#(tarfile stops at the end-of-archive marker; the digest covers everything)
+	while len(stream.read(1 << 20)) > 0:
+		pass
+	stream.close()
+	record_event('download', os.path.basename(filename), start, time.time(), url=stream.url, streamed=True, size=stream.received)
+	digest = stream.digest.hexdigest()
+	expected = pinned_checksums[os.path.basename(filename)]
+	if digest != expected:
+		remove_if_exists(filename + ".part")
+		raise DownloadError(f"'{url}' has sha256 {digest}; expected {expected}.", retry=False)
+	if stream.tee is not None:
+		os.replace(filename + ".part", filename)
+		add_to_download_cache(filename, digest)
+	note_checksum(filename, digest)
+
+#downloads started by prefetch_archives, by local filename:
+prefetch_pool = None
+prefetches = dict()
+
+#Start downloading the archives for 'libs' in the background so that they
+# overlap with each other and with the first builds:
+def prefetch_archives(libs):
+	global prefetch_pool
+	prefetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix='fetch')
+	for lib in libs:
+		(url, filename) = lib_archives[lib]
+		if streams_archive(lib):
+			continue
+		if filename not in prefetches:
+			prefetches[filename] = prefetch_pool.submit(fetch_file, url, filename, mirrors=lib_mirrors.get(lib, []))
+
+def fetch_archive(lib):
+	(url, filename) = lib_archives[lib]
+	if plan_mode:
+		#(what the archive's digest will be, without downloading it)
+		pinned = pinned_checksums.get(os.path.basename(filename))
+		if pinned is None and os.path.exists(filename):
+			pinned = file_sha256(filename)
+		if pinned is not None:
+			archive_digests[filename] = pinned
+		return pinned
+	if streams_archive(lib):
+		#(extract_archive will download it)
+		archive_digests[filename] = pinned_checksums[os.path.basename(filename)]
+		return archive_digests[filename]
+	start = time.time()
+	if filename in prefetches:
+		print("  Waiting for '" + filename + "'")
+		digest = prefetches[filename].result()
 	else:
-		fetch_file(SDL3_urlbase + ".tar.gz", work_folder + "/" + SDL3_filebase + ".tar.gz")
-		run_command([
-			'tar',
-			'xfz',
-			SDL3_filebase + ".tar.gz"
-		], cwd=work_folder)
+		digest = fetch_file(url, filename, mirrors=lib_mirrors.get(lib, []))
+	record_event('fetch', os.path.basename(filename), start, time.time(), phase='fetch')
+	return digest
+
+#Per-phase stamps: each library build is split into phases (fetch, extract,
+# patch, configure, compile, install, copy). When a phase finishes, a hash of
+# its inputs -- chained with the hashes of the phases before it -- is written
+# to the variant's work folder's stamps/; the next run skips phases until the first whose hash changed.
+# --clean runs every phase regardless.
+use_stamps = "--clean" not in options
+
+def stamp_file(lib, ctx, name):
+	return ctx.work + "/stamps/" + lib + "." + name
+
+#environment variables a build sets beyond the ones it inherits:
+def env_changes(env):
+	return { key:env[key] for key in env if os.environ.get(key) != env[key] }
+
+def builder_source():
+	return inspect.getsource(lib_builders[build_state.lib])
+
+def begin_phases(lib, ctx):
+	build_state.phase = None
+	seed = [ ctx.out, lib_extract_excludes.get(lib, []) ] + [ installed_state(dep, ctx) for dep in lib_deps[lib] ]
+	build_state.phase_hash = hashlib.sha256(json.dumps(seed).encode('utf8')).hexdigest()
+	build_state.resuming = use_stamps
+
+#Returns True if phase 'name' needs to run. The previous phase is stamped as
+# done, since the build got this far; 'output' (if given) must exist to skip.
+def phase(name, *inputs, output=None):
+	finish_phase()
+	lib = build_state.lib
+	ctx = build_state.ctx
+	build_state.phase_hash = hashlib.sha256((build_state.phase_hash + name + json.dumps(inputs, sort_keys=True)).encode('utf8')).hexdigest()
+	if check_patches_mode:
+		#(sources are extracted fresh, and the patched ones have to be rebuilt)
+		remove_if_exists(stamp_file(lib, ctx, name))
+		return name in ('fetch', 'extract', 'patch')
+	if build_state.resuming:
+		if os.path.exists(stamp_file(lib, ctx, name)) and (output is None or os.path.exists(output)):
+			with open(stamp_file(lib, ctx, name), 'r') as f:
+				if f.read().strip() == build_state.phase_hash:
+					if plan_mode:
+						build_state.plan.append((name, inputs, False))
+					else:
+						print(f"  {lib}{ctx.variant}: {name} is up to date.")
+					return False
+		#this phase and every one after it will run:
+		build_state.resuming = False
+	if plan_mode:
+		build_state.plan.append((name, inputs, True))
+		return False
+	remove_if_exists(stamp_file(lib, ctx, name))
+	build_state.phase = name
+	build_state.phase_start = time.time()
+	build_state.phase_usage = [] #command events in this phase
+	return True
+
+def finish_phase():
+	if build_state.phase is not None:
+		commands = build_state.phase_usage
+		record_event('phase', build_state.phase, build_state.phase_start, time.time(),
+			user=sum(e['user'] for e in commands),
+			sys=sum(e['sys'] for e in commands),
+			maxrss=max([ e['maxrss'] for e in commands ] + [ 0 ]))
+		os.makedirs(build_state.ctx.work + "/stamps", exist_ok=True)
+		with open(stamp_file(build_state.lib, build_state.ctx, build_state.phase), 'w') as f:
+			f.write(build_state.phase_hash + '\n')
+		build_state.phase = None
+
+#--check-patches: extract every library's pinned sources and check that all of
+# its patches still apply (without writing them or building anything), then
+# report every patch that doesn't:
+check_patches_mode = "--check-patches" in options
+patch_problems = [] #(lib, problem)
+
+#patches are (filename relative to lib_dir, [ (old, new[, count]), ... ]); every
+# file is checked (in parallel) before any of them is written:
+def apply_patches(lib_dir, patches):
+	if len(patches) == 0:
+		return
+	def check(patch):
+		try:
+			return (patch_file_contents(lib_dir + "/" + patch[0], patch[1]), None)
+		except PatchError as e:
+			return (None, str(e))
+	with concurrent.futures.ThreadPoolExecutor(max_workers=min(jobs, len(patches))) as pool:
+		results = list(pool.map(check, patches))
+	problems = [ problem for (patched, problem) in results if problem is not None ]
+	if check_patches_mode:
+		patch_problems.extend((build_state.lib, problem) for problem in problems)
+		print(f"  Checked {len(patches)} patched files in '{lib_dir}': " + (f"{len(problems)} no longer match." if len(problems) != 0 else "ok."))
+		return
+	if len(problems) != 0:
+		raise PatchError(f"{len(problems)} of {len(patches)} patched files in '{lib_dir}' no longer match:\n" + "\n".join(problems))
+	for ((filename, replacements), (patched, problem)) in zip(patches, results):
+		write_file_atomically(lib_dir + "/" + filename, patched)
+	print(f"  Patched {len(patches)} files in '{lib_dir}'.")
+
+def build_SDL3(ctx):
+	SDL3_dir = ctx.work + "/" + SDL3_filebase
+
+	print("Fetching SDL3...")
+	phase("fetch", fetch_archive("SDL3"))
+
+	if phase("extract", output=SDL3_dir):
+		print("Cleaning any existing SDL3...")
+		remove_if_exists(SDL3_dir)
+		extract_archive("SDL3", ctx.work)
 
 	print("Building SDL3...")
 	if target == 'windows':
-		run_command([
+		msbuild = [
 			"msbuild", "/m",
 			"SDL.sln",
 			"/p:PlatformToolset=v143,Configuration=Release,Platform=x64",
 			"/t:SDL3"
-		], cwd=SDL3_dir + "/VisualC")
+		]
+		if phase("compile", msbuild):
+			run_command(msbuild, cwd=SDL3_dir + "/VisualC")
 	else:
 		env = os.environ.copy()
 		prefix = os.getcwd() + '/' + SDL3_dir + '/out'
-		env['CFLAGS'] = variant_cflags[variant]
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
+		env['CFLAGS'] = ctx.cflags
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
 
 		os_specific = []
 		if target == 'windows':
@@ -216,7 +1679,7 @@ def build_SDL3():
 			]
 		elif target == 'macos':
 			os_specific += ['-DSDL_COCOA=ON']
-		run_command(['cmake'] + ['-S', '.', '-B', 'build',
+		configure = ['cmake'] + ['-S', '.', '-B', 'build',
 			'-DSDL_STATIC=ON',
 			'-DSDL_SHARED=OFF',
 			'-DSDL_RENDER=OFF', #'--disable-render',
@@ -265,376 +1728,414 @@ def build_SDL3():
 			#'--disable-video-dummy',
 			'-DSDL_DIRECTX=OFF', #'--disable-directx',
 			#'--enable-sdl-dlopen',
-		] + os_specific + variant_cmake_flags[variant],env=env,cwd=SDL3_dir)
-
-		run_command(['cmake'] + ['--build', 'build', '--config', 'RelWithDebInfo'],env=env,cwd=SDL3_dir)
-		run_command(['cmake'] + ['--install', 'build', '--config', 'RelWithDebInfo', '--prefix', prefix],env=env,cwd=SDL3_dir)
+		] + os_specific + ctx.cmake_flags + cmake_generator_args() + compiler_launcher_cmake_flags()
+		if phase("configure", configure, env_changes(env)):
+			#(a build folder can't switch generators)
+			remove_if_exists(SDL3_dir + "/build")
+			run_command(configure,env=env,cwd=SDL3_dir)
+		build = ['cmake'] + ['--build', 'build', '--config', 'RelWithDebInfo']
+		if phase("compile", build):
+			run_build(build + parallel_args(), SDL3_dir + "/build", env=env,cwd=SDL3_dir)
+		install = ['cmake'] + ['--install', 'build', '--config', 'RelWithDebInfo', '--prefix', prefix]
+		if phase("install", install):
+			run_command(install,env=env,cwd=SDL3_dir)
 
-	print("Copying SDL3 files...")
-	os.makedirs(target + variant + "/SDL3/lib", exist_ok=True)
-	os.makedirs(target + variant + "/SDL3/dist", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(SDL3_dir + "/VisualC/x64/Release/SDL3.lib", target + variant + "/SDL3/lib/")
-		shutil.copy(SDL3_dir + "/VisualC/x64/Release/SDL3.dll", target + variant + "/SDL3/dist/")
-		shutil.copytree(SDL3_dir + "/include/", target + variant + "/SDL3/include/")
-	else:
-		shutil.copy(SDL3_dir + "/out/lib/libSDL3.a", target + variant + "/SDL3/lib/")
-		shutil.copytree(SDL3_dir + "/out/include/SDL3/", target + variant + "/SDL3/include/SDL3/")
-	shutil.copy(SDL3_dir + "/README.md", target + variant + "/SDL3/dist/README-SDL.txt")
+	if phase("copy", builder_source(), output=ctx.out + "/SDL3"):
+		print("Copying SDL3 files...")
+		remove_if_exists(ctx.out + "/SDL3/")
+		os.makedirs(ctx.out + "/SDL3/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/SDL3/dist", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(SDL3_dir + "/VisualC/x64/Release/SDL3.lib", ctx.out + "/SDL3/lib/")
+			shutil.copy(SDL3_dir + "/VisualC/x64/Release/SDL3.dll", ctx.out + "/SDL3/dist/")
+			shutil.copytree(SDL3_dir + "/include/", ctx.out + "/SDL3/include/")
+		else:
+			shutil.copy(SDL3_dir + "/out/lib/libSDL3.a", ctx.out + "/SDL3/lib/")
+			shutil.copytree(SDL3_dir + "/out/include/SDL3/", ctx.out + "/SDL3/include/SDL3/")
+		shutil.copy(SDL3_dir + "/README.md", ctx.out + "/SDL3/dist/README-SDL.txt")
 
 
-def build_glm():
-	glm_dir = work_folder + "/glm"
-	print("Cleaning any existing glm...")
-	remove_if_exists(glm_dir)
-	remove_if_exists(target + variant + "/glm/")
+def build_glm(ctx):
+	glm_dir = ctx.work + "/glm"
 
 	print("Fetching glm...")
-	fetch_file(glm_urlbase + ".zip", work_folder + "/" + glm_filebase + ".zip")
-	unzip_file(work_folder + "/" + glm_filebase + ".zip", work_folder)
+	phase("fetch", fetch_archive("glm"))
+
+	if phase("extract", output=glm_dir):
+		print("Cleaning any existing glm...")
+		remove_if_exists(glm_dir)
+		extract_archive("glm", ctx.work)
 
-	print("Copying glm files...")
-	os.makedirs(target + variant + "/glm/include", exist_ok=True)
-	os.makedirs(target + variant + "/glm/dist", exist_ok=True)
-	shutil.copytree(glm_dir + "/glm", target + variant + "/glm/include/glm/")
-	os.unlink(target + variant + "/glm/include/glm/CMakeLists.txt")
-	shutil.copy(glm_dir + "/copying.txt", target + variant + "/glm/dist/README-glm.txt")
+	if phase("copy", builder_source(), output=ctx.out + "/glm"):
+		print("Copying glm files...")
+		remove_if_exists(ctx.out + "/glm/")
+		os.makedirs(ctx.out + "/glm/include", exist_ok=True)
+		os.makedirs(ctx.out + "/glm/dist", exist_ok=True)
+		shutil.copytree(glm_dir + "/glm", ctx.out + "/glm/include/glm/")
+		os.unlink(ctx.out + "/glm/include/glm/CMakeLists.txt")
+		shutil.copy(glm_dir + "/copying.txt", ctx.out + "/glm/dist/README-glm.txt")
 
 
-def build_zlib():
-	zlib_dir = work_folder + "/" + zlib_filebase
-	print("Cleaning any existing zlib...")
-	remove_if_exists(zlib_dir)
-	remove_if_exists(target + variant + "/zlib/")
+def build_zlib(ctx):
+	zlib_dir = ctx.work + "/" + zlib_filebase
 
 	print("Fetching zlib...")
-	if target == 'windows':
-		fetch_file(zlib_url, work_folder + "/" + zlib_filebase + ".zip")
-		unzip_file(work_folder + "/" + zlib_filebase + ".zip", work_folder)
-	else:
-		fetch_file(zlib_url, work_folder + "/" + zlib_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', zlib_filebase + ".tar.gz" ], cwd=work_folder)
+	phase("fetch", fetch_archive("zlib"))
+
+	if phase("extract", output=zlib_dir):
+		print("Cleaning any existing zlib...")
+		remove_if_exists(zlib_dir)
+		extract_archive("zlib", ctx.work)
 
 
 	print("Building zlib...")
 	if target == 'windows':
-		run_command([ 'nmake', '-f', 'win32/Makefile.msc' ], cwd=zlib_dir)
+		nmake = [ 'nmake', '-f', 'win32/Makefile.msc' ]
+		if phase("compile", nmake):
+			run_command(nmake, cwd=zlib_dir)
 	else:
 		env = os.environ.copy()
 		env['prefix'] = 'out'
-		env['CFLAGS'] = variant_cflags[variant]
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
+		env['CFLAGS'] = ctx.cflags
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
 		#NOTE: not passing variant_configure_flags because this isn't really a (recent) autoconf script:
-		run_command(['./configure', '--static'], env=env, cwd=zlib_dir)
-		run_command(['make'], cwd=zlib_dir)
-		run_command(['make', 'install'], cwd=zlib_dir)
+		configure = ['./configure', '--static']
+		if phase("configure", configure, env_changes(env)):
+			run_command(configure, env=env, cwd=zlib_dir)
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=zlib_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=zlib_dir)
 
-	print("Copying zlib files...")
-	os.makedirs(target + variant + "/zlib/lib", exist_ok=True)
-	os.makedirs(target + variant + "/zlib/include", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(zlib_dir + "/zlib.lib", target + variant + "/zlib/lib/")
-		shutil.copy(zlib_dir + "/zlib.pdb", target + variant + "/zlib/lib/")
-		shutil.copy(zlib_dir + "/zconf.h", target + variant + "/zlib/include/")
-		shutil.copy(zlib_dir + "/zlib.h", target + variant + "/zlib/include/")
-	else:
-		shutil.copy(zlib_dir + "/out/include/zconf.h", target + variant + "/zlib/include/")
-		shutil.copy(zlib_dir + "/out/include/zlib.h", target + variant + "/zlib/include/")
-		shutil.copy(zlib_dir + "/out/lib/libz.a", target + variant + "/zlib/lib/")
+	if phase("copy", builder_source(), output=ctx.out + "/zlib"):
+		print("Copying zlib files...")
+		remove_if_exists(ctx.out + "/zlib/")
+		os.makedirs(ctx.out + "/zlib/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/zlib/include", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(zlib_dir + "/zlib.lib", ctx.out + "/zlib/lib/")
+			shutil.copy(zlib_dir + "/zlib.pdb", ctx.out + "/zlib/lib/")
+			shutil.copy(zlib_dir + "/zconf.h", ctx.out + "/zlib/include/")
+			shutil.copy(zlib_dir + "/zlib.h", ctx.out + "/zlib/include/")
+		else:
+			shutil.copy(zlib_dir + "/out/include/zconf.h", ctx.out + "/zlib/include/")
+			shutil.copy(zlib_dir + "/out/include/zlib.h", ctx.out + "/zlib/include/")
+			shutil.copy(zlib_dir + "/out/lib/libz.a", ctx.out + "/zlib/lib/")
 
 
-def build_libpng():
-	libpng_dir = work_folder + "/" + libpng_filebase
+def build_libpng(ctx):
+	libpng_dir = ctx.work + "/" + libpng_filebase
 
-	print("Cleaning any existing libpng...")
-	remove_if_exists(target + variant + "/libpng/")
-	remove_if_exists(libpng_dir)
+	patches = []
+	if target == 'windows':
+		#Patch makefile:
+		patches.append(("scripts/makefile.vcwin32", [
+			("-I..\\zlib","-I..\\..\\windows\\zlib\\include"),
+			("..\\zlib\\zlib.lib","..\\..\\windows\\zlib\\lib\\zlib.lib")
+		]))
 
 	print("Fetching libpng...")
-	if target == 'windows':
-		fetch_file(libpng_url, work_folder + "/" + libpng_filebase + ".zip")
-		unzip_file(work_folder + "/" + libpng_filebase + ".zip", work_folder)
-	else:
-		fetch_file(libpng_url, work_folder + "/" + libpng_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', libpng_filebase + ".tar.gz" ], cwd=work_folder)
+	phase("fetch", fetch_archive("libpng"))
+
+	if phase("extract", patches, output=libpng_dir):
+		print("Cleaning any existing libpng...")
+		remove_if_exists(libpng_dir)
+		extract_archive("libpng", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(libpng_dir, patches)
 
 	print("Building libpng...")
 	if target == 'windows':
-		#Patch makefile:
-		replace_in_file(libpng_dir + "/scripts/makefile.vcwin32", [
-			("-I..\\zlib","-I..\\..\\windows\\zlib\\include"),
-			("-..\\zlib\\zlib.lib","..\\..\\windows\\zlib\\lib\\zlib.lib")
-		])
-		run_command([
+		nmake = [
 			'nmake',
 			'-f',
 			'scripts/makefile.vcwin32'
-		], cwd=libpng_dir)
+		]
+		if phase("compile", nmake):
+			run_command(nmake, cwd=libpng_dir)
 	else:
 		prefix = os.getcwd() + '/' + libpng_dir + '/out';
 		env = os.environ.copy()
-		env['CPPFLAGS'] = '-O2 -L../../' + target + variant + '/zlib/lib -I../../' + target + variant + '/zlib/include'
-		env['CFLAGS'] = '-O2 -L../../' + target + variant + '/zlib/lib -I../../' + target + variant + '/zlib/include'
-		env['CPPFLAGS'] = env['CPPFLAGS'] + ' ' + variant_cflags[variant]
-		env['CFLAGS'] = env['CFLAGS'] + ' ' + variant_cflags[variant]
-		env['LDFLAGS'] = '-L../../' + target + variant + '/zlib/lib'
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
-		run_command(['./configure'] + variant_configure_flags[variant] + [
+		env['CPPFLAGS'] = '-O2 -L' + ctx.top + ctx.out + '/zlib/lib -I' + ctx.top + ctx.out + '/zlib/include'
+		env['CFLAGS'] = '-O2 -L' + ctx.top + ctx.out + '/zlib/lib -I' + ctx.top + ctx.out + '/zlib/include'
+		env['CPPFLAGS'] = env['CPPFLAGS'] + ' ' + ctx.cflags
+		env['CFLAGS'] = env['CFLAGS'] + ' ' + ctx.cflags
+		env['LDFLAGS'] = '-L' + ctx.top + ctx.out + '/zlib/lib'
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
+		configure = ['./configure'] + ctx.configure_flags + [
 			'--prefix=' + prefix,
-			'--with-zlib-prefix=../../' + target + variant + '/zlib',
-			'--disable-shared'], env=env, cwd=libpng_dir);
-		run_command(['make'], cwd=libpng_dir)
-		run_command(['make', 'install'], cwd=libpng_dir)
-
-	print("Copying libpng files...")
-	os.makedirs(target + variant + "/libpng/lib", exist_ok=True)
-	os.makedirs(target + variant + "/libpng/include", exist_ok=True)
-	os.makedirs(target + variant + "/libpng/dist", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(libpng_dir + "/libpng.lib", target + variant + "/libpng/lib/")
-		shutil.copy(libpng_dir + "/png.h", target + variant + "/libpng/include/")
-		shutil.copy(libpng_dir + "/pngconf.h", target + variant + "/libpng/include/")
-		shutil.copy(libpng_dir + "/pnglibconf.h", target + variant + "/libpng/include/")
-	else:
-		shutil.copy(libpng_dir + "/out/include/libpng16/png.h", target + variant + "/libpng/include/")
-		shutil.copy(libpng_dir + "/out/include/libpng16/pngconf.h", target + variant + "/libpng/include/")
-		shutil.copy(libpng_dir + "/out/include/libpng16/pnglibconf.h", target + variant + "/libpng/include/")
-		shutil.copy(libpng_dir + "/out/lib/libpng16.a", target + variant + "/libpng/lib/")
-		os.symlink("libpng16.a", target + variant + "/libpng/lib/libpng.a")
-	shutil.copy(libpng_dir + "/LICENSE", target + variant + "/libpng/dist/README-libpng.txt")
-
-def build_libogg():
-	lib_name = "libogg"
-	lib_dir = work_folder + "/" + libogg_filebase
+			'--with-zlib-prefix=' + ctx.top + ctx.out + '/zlib',
+			'--disable-shared']
+		if phase("configure", configure, env_changes(env)):
+			run_configure(configure, env=env, cwd=libpng_dir);
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=libpng_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=libpng_dir)
 
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+	if phase("copy", builder_source(), output=ctx.out + "/libpng"):
+		print("Copying libpng files...")
+		remove_if_exists(ctx.out + "/libpng/")
+		os.makedirs(ctx.out + "/libpng/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/libpng/include", exist_ok=True)
+		os.makedirs(ctx.out + "/libpng/dist", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(libpng_dir + "/libpng.lib", ctx.out + "/libpng/lib/")
+			shutil.copy(libpng_dir + "/png.h", ctx.out + "/libpng/include/")
+			shutil.copy(libpng_dir + "/pngconf.h", ctx.out + "/libpng/include/")
+			shutil.copy(libpng_dir + "/pnglibconf.h", ctx.out + "/libpng/include/")
+		else:
+			shutil.copy(libpng_dir + "/out/include/libpng16/png.h", ctx.out + "/libpng/include/")
+			shutil.copy(libpng_dir + "/out/include/libpng16/pngconf.h", ctx.out + "/libpng/include/")
+			shutil.copy(libpng_dir + "/out/include/libpng16/pnglibconf.h", ctx.out + "/libpng/include/")
+			shutil.copy(libpng_dir + "/out/lib/libpng16.a", ctx.out + "/libpng/lib/")
+			os.symlink("libpng16.a", ctx.out + "/libpng/lib/libpng.a")
+		shutil.copy(libpng_dir + "/LICENSE", ctx.out + "/libpng/dist/README-libpng.txt")
 
-	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(libogg_urlbase + ".zip", work_folder + "/" + libogg_filebase + ".zip")
-		unzip_file(work_folder + "/" + libogg_filebase + ".zip", work_folder)
-	else:
-		fetch_file(libogg_urlbase + ".tar.gz", work_folder + "/" + libogg_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', libogg_filebase + ".tar.gz" ], cwd=work_folder)
+def build_libogg(ctx):
+	lib_name = "libogg"
+	lib_dir = ctx.work + "/" + libogg_filebase
 
-	print("Building " + lib_name + "...")
+	patches = []
 	if target == 'windows':
 		#patch vcxproj to remove "WindowsTargetPlatformVersion" key:
-		replace_in_file(lib_dir + "/win32/VS2015/libogg.vcxproj", [
+		patches.append(("win32/VS2015/libogg.vcxproj", [
 			('<WindowsTargetPlatformVersion>8.1</WindowsTargetPlatformVersion>',''),
 			(">MultiThreaded<", ">MultiThreadedDLL<"),
 			("<WholeProgramOptimization>true</WholeProgramOptimization>",
 			 "<WholeProgramOptimization>false</WholeProgramOptimization>")
-		])
-		run_command([
+		]))
+
+	#(applied to the installed copy of the header)
+	os_types_patch = []
+	if target == 'macos':
+		os_types_patch = [
+			("#  include <sys/types.h>", "#include <stdint.h>"),
+			("   typedef u_int16_t ogg_uint16_t;", "   typedef uint16_t ogg_uint16_t;"),
+			("   typedef u_int32_t ogg_uint32_t;", "   typedef uint32_t ogg_uint32_t;"),
+			("   typedef u_int64_t ogg_uint64_t;", "   typedef uint64_t ogg_uint64_t;"),
+		]
+
+	print("Fetching " + lib_name + "...")
+	phase("fetch", fetch_archive("libogg"))
+
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("libogg", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
+		if check_patches_mode and len(os_types_patch) > 0:
+			apply_patches(lib_dir, [ ("include/ogg/os_types.h", os_types_patch) ])
+
+	print("Building " + lib_name + "...")
+	if target == 'windows':
+		msbuild = [
 			"msbuild", "/m",
 			"libogg.sln",
 			"/p:PlatformToolset=v143,Configuration=Release,Platform=x64",
 			"/t:libogg"
-		], cwd=lib_dir + "/win32/VS2015")
+		]
+		if phase("compile", msbuild):
+			run_command(msbuild, cwd=lib_dir + "/win32/VS2015")
 	else:
 		prefix = os.getcwd() + '/' + lib_dir + '/out';
 		env = os.environ.copy()
-		env['CPPFLAGS'] = '-O2 ' + variant_cflags[variant]
-		env['CFLAGS'] = '-O2 ' + variant_cflags[variant]
-		#env['LDFLAGS'] = '-L../../' + target + variant + '/zlib/lib'
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
-		run_command(['./configure'] + variant_configure_flags[variant] + [
+		env['CPPFLAGS'] = '-O2 ' + ctx.cflags
+		env['CFLAGS'] = '-O2 ' + ctx.cflags
+		#env['LDFLAGS'] = '-L' + ctx.top + ctx.out + '/zlib/lib'
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
+		configure = ['./configure'] + ctx.configure_flags + [
 			'--prefix=' + prefix,
 			'--disable-dependency-tracking',
 			'--enable-static',
 			'--disable-shared',
-			], env=env, cwd=lib_dir);
-		run_command(['make'], cwd=lib_dir)
-		run_command(['make', 'install'], cwd=lib_dir)
-	print("Copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/" + lib_name + "/lib", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/include/ogg", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/dist", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/libogg.lib", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/libogg.pdb", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/include/ogg/ogg.h", target + variant + "/" + lib_name + "/include/ogg/")
-		shutil.copy(lib_dir + "/include/ogg/os_types.h", target + variant + "/" + lib_name + "/include/ogg/")
-	else:
-		shutil.copy(lib_dir + "/out/include/ogg/config_types.h", target + variant + "/" + lib_name + "/include/ogg/")
-		shutil.copy(lib_dir + "/out/include/ogg/ogg.h", target + variant + "/" + lib_name + "/include/ogg/")
-		shutil.copy(lib_dir + "/out/include/ogg/os_types.h", target + variant + "/" + lib_name + "/include/ogg/")
-		if target == 'macos':
-			replace_in_file(target + variant + "/" + lib_name + "/include/ogg/os_types.h", [
-				("#  include <sys/types.h>", "#include <stdint.h>"),
-				("   typedef u_int16_t ogg_uint16_t;", "   typedef uint16_t ogg_uint16_t;"),
-				("   typedef u_int32_t ogg_uint32_t;", "   typedef uint32_t ogg_uint32_t;"),
-				("   typedef u_int64_t ogg_uint64_t;", "   typedef uint64_t ogg_uint64_t;"),
-			])
-		shutil.copy(lib_dir + "/out/lib/libogg.a", target + variant + "/" + lib_name + "/lib/")
-	shutil.copy(lib_dir + "/COPYING", target + variant + "/" + lib_name + "/dist/README-libogg.txt")
-
-def build_libopus():
-	lib_name = "libopus"
-	lib_dir = work_folder + "/" + libopus_filebase
+			]
+		if phase("configure", configure, env_changes(env)):
+			run_configure(configure, env=env, cwd=lib_dir);
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=lib_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=lib_dir)
+	if phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		print("Copying " + lib_name + " files...")
+		remove_if_exists(ctx.out + "/" + lib_name + "/")
+		os.makedirs(ctx.out + "/" + lib_name + "/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/include/ogg", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/dist", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/libogg.lib", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/libogg.pdb", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/include/ogg/ogg.h", ctx.out + "/" + lib_name + "/include/ogg/")
+			shutil.copy(lib_dir + "/include/ogg/os_types.h", ctx.out + "/" + lib_name + "/include/ogg/")
+		else:
+			shutil.copy(lib_dir + "/out/include/ogg/config_types.h", ctx.out + "/" + lib_name + "/include/ogg/")
+			shutil.copy(lib_dir + "/out/include/ogg/ogg.h", ctx.out + "/" + lib_name + "/include/ogg/")
+			shutil.copy(lib_dir + "/out/include/ogg/os_types.h", ctx.out + "/" + lib_name + "/include/ogg/")
+			if target == 'macos':
+				replace_in_file(ctx.out + "/" + lib_name + "/include/ogg/os_types.h", os_types_patch)
+			shutil.copy(lib_dir + "/out/lib/libogg.a", ctx.out + "/" + lib_name + "/lib/")
+		shutil.copy(lib_dir + "/COPYING", ctx.out + "/" + lib_name + "/dist/README-libogg.txt")
 
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+def build_libopus(ctx):
+	lib_name = "libopus"
+	lib_dir = ctx.work + "/" + libopus_filebase
 
 	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(libopus_url, work_folder + "/" + libopus_filebase + ".tar.gz")
-		remove_if_exists(work_folder + "/" + libopus_filebase + ".tar")
-		unzip_file(work_folder + "/" + libopus_filebase + ".tar.gz", work_folder)
-		unzip_file(work_folder + "/" + libopus_filebase + ".tar", work_folder)
-	else:
-		fetch_file(libopus_url, work_folder + "/" + libopus_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', libopus_filebase + ".tar.gz" ], cwd=work_folder)
+	phase("fetch", fetch_archive("libopus"))
 
-	print("Building " + lib_name + "...")
+	if phase("extract", output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("libopus", ctx.work)
 
-	os.mkdir(lib_dir + "/build")
+	print("Building " + lib_name + "...")
 
 	prefix = os.getcwd() + '/' + lib_dir + '/out';
 	env = os.environ.copy()
-	env['CFLAGS'] = variant_cflags[variant]
-	env['CXXFLAGS'] = variant_cflags[variant]
-	for key in variant_env[variant].keys():
-		env[key] = variant_env[variant][key]
-	run_command([
+	env['CFLAGS'] = ctx.cflags
+	env['CXXFLAGS'] = ctx.cflags
+	for key in ctx.env.keys():
+		env[key] = ctx.env[key]
+	configure = [
 		"cmake",
 		"-B", "build",
 		"-D", "CMAKE_BUILD_TYPE=RelWithDebInfo",
 		"-D", "OPUS_BUILD_SHARED_LIBRARY=NO",
-	] + variant_cmake_flags[variant], cwd=lib_dir, env=env)
+	] + ctx.cmake_flags + cmake_generator_args() + compiler_launcher_cmake_flags()
+	if phase("configure", configure, env_changes(env)):
+		remove_if_exists(lib_dir + "/build")
+		os.makedirs(lib_dir + "/build", exist_ok=True)
+		run_command(configure, cwd=lib_dir, env=env)
 
-	run_command([
-		"cmake",
-		"--build", "build",
-		"--config", "RelWithDebInfo",
-		"-j", str(jobs)
-	], cwd=lib_dir, env=env)
+	build = [ "cmake", "--build", "build", "--config", "RelWithDebInfo" ]
+	if phase("compile", build):
+		run_build(build + parallel_args(), lib_dir + "/build", cwd=lib_dir, env=env)
 
-	run_command([
+	install = [
 		'cmake',
 		'--install', 'build',
 		'--config', 'RelWithDebInfo',
-		'--prefix', prefix],env=env,cwd=lib_dir)
+		'--prefix', prefix]
+	if phase("install", install):
+		run_command(install,env=env,cwd=lib_dir)
 
-	print("Copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/" + lib_name + "/lib", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/include", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/dist", exist_ok=True)
+	if phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		print("Copying " + lib_name + " files...")
+		remove_if_exists(ctx.out + "/" + lib_name + "/")
+		os.makedirs(ctx.out + "/" + lib_name + "/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/include", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/dist", exist_ok=True)
 
-	shutil.copy(lib_dir + "/out/include/opus/opus.h", target + variant + "/" + lib_name + "/include/")
-	shutil.copy(lib_dir + "/out/include/opus/opus_multistream.h", target + variant + "/" + lib_name + "/include/")
-	shutil.copy(lib_dir + "/out/include/opus/opus_types.h", target + variant + "/" + lib_name + "/include/")
-	shutil.copy(lib_dir + "/out/include/opus/opus_defines.h", target + variant + "/" + lib_name + "/include/")
-	shutil.copy(lib_dir + "/out/include/opus/opus_projection.h", target + variant + "/" + lib_name + "/include/")
+		shutil.copy(lib_dir + "/out/include/opus/opus.h", ctx.out + "/" + lib_name + "/include/")
+		shutil.copy(lib_dir + "/out/include/opus/opus_multistream.h", ctx.out + "/" + lib_name + "/include/")
+		shutil.copy(lib_dir + "/out/include/opus/opus_types.h", ctx.out + "/" + lib_name + "/include/")
+		shutil.copy(lib_dir + "/out/include/opus/opus_defines.h", ctx.out + "/" + lib_name + "/include/")
+		shutil.copy(lib_dir + "/out/include/opus/opus_projection.h", ctx.out + "/" + lib_name + "/include/")
 
-	if target == 'windows':
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/opus.lib", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/opus.pdb", target + variant + "/" + lib_name + "/lib/")
-	else:
-		shutil.copy(lib_dir + "/out/lib/libopus.a", target + variant + "/" + lib_name + "/lib/")
-	shutil.copy(lib_dir + "/COPYING", target + variant + "/" + lib_name + "/dist/README-libopus.txt")
+		if target == 'windows':
+			shutil.copy(lib_dir + "/build/RelWithDebInfo/opus.lib", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/build/RelWithDebInfo/opus.pdb", ctx.out + "/" + lib_name + "/lib/")
+		else:
+			shutil.copy(lib_dir + "/out/lib/libopus.a", ctx.out + "/" + lib_name + "/lib/")
+		shutil.copy(lib_dir + "/COPYING", ctx.out + "/" + lib_name + "/dist/README-libopus.txt")
 
-def build_libopusenc():
+def build_libopusenc(ctx):
 	lib_name = "libopusenc"
-	lib_dir = work_folder + "/" + libopusenc_filebase
-
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
-
-	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(libopusenc_url, work_folder + "/" + libopusenc_filebase + ".tar.gz")
-		remove_if_exists(work_folder + "/" + libopusenc_filebase + ".tar")
-		unzip_file(work_folder + "/" + libopusenc_filebase + ".tar.gz", work_folder)
-		unzip_file(work_folder + "/" + libopusenc_filebase + ".tar", work_folder)
-	else:
-		fetch_file(libopusenc_url, work_folder + "/" + libopusenc_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', libopusenc_filebase + ".tar.gz" ], cwd=work_folder)
+	lib_dir = ctx.work + "/" + libopusenc_filebase
 
-	print("Building " + lib_name + "...")
+	patches = []
 	if target == 'windows':
 		#patch vcxproj to adjust library paths:
-		replace_in_file(lib_dir + "/win32/VS2015/opusenc.vcxproj", [
+		patches.append(("win32/VS2015/opusenc.vcxproj", [
 			("..\\..\\..\\opus\\win32\\VS2015\\$(Platform)\\$(Configuration)",
 			 "..\\..\\..\\..\\windows\\libopus\\lib")
-		])
+		]))
 		#patch props to adjust include paths:
-		replace_in_file(lib_dir + "/win32/VS2015/common.props", [
+		patches.append(("win32/VS2015/common.props", [
 			("..\\..\\..\\opus\\include",
 			 "..\\..\\..\\..\\windows\\libopus\\include")
-		])
+		]))
 
-		run_command([
+	print("Fetching " + lib_name + "...")
+	phase("fetch", fetch_archive("libopusenc"))
+
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("libopusenc", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
+
+	print("Building " + lib_name + "...")
+	if target == 'windows':
+		msbuild = [
 			"msbuild", "/m",
 			"opusenc.sln",
 			"/p:PlatformToolset=v143,Configuration=Release,Platform=x64",
 			"/t:opusenc"
-		], cwd=lib_dir + "/win32/VS2015")
+		]
+		if phase("compile", msbuild):
+			run_command(msbuild, cwd=lib_dir + "/win32/VS2015")
 	else:
 		prefix = os.getcwd() + '/' + lib_dir + '/out';
 		env = os.environ.copy()
-		env['CPPFLAGS'] = '-O2 ' + variant_cflags[variant]
-		env['CFLAGS'] = '-O2 ' + variant_cflags[variant]
-
-		env['DEPS_CFLAGS'] = '-I../../' + target + variant + '/libogg/include -I../../' + target + variant + '/libopus/include'
-		env['DEPS_LIBS'] = '-L../../' + target + variant + '/libogg/lib -L../../' + target + variant + '/libopus/lib -lopus'
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
-		run_command(['./configure'] + variant_configure_flags[variant] + [
+		env['CPPFLAGS'] = '-O2 ' + ctx.cflags
+		env['CFLAGS'] = '-O2 ' + ctx.cflags
+
+		env['DEPS_CFLAGS'] = '-I' + ctx.top + ctx.out + '/libogg/include -I' + ctx.top + ctx.out + '/libopus/include'
+		env['DEPS_LIBS'] = '-L' + ctx.top + ctx.out + '/libogg/lib -L' + ctx.top + ctx.out + '/libopus/lib -lopus'
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
+		configure = ['./configure'] + ctx.configure_flags + [
 			'--prefix=' + prefix,
 			'--disable-dependency-tracking',
 			'--enable-static',
 			'--disable-shared',
 			'--disable-doc',
 			'--disable-examples'
-			], env=env, cwd=lib_dir);
-		run_command(['make'], cwd=lib_dir)
-		run_command(['make', 'install'], cwd=lib_dir)
+			]
+		if phase("configure", configure, env_changes(env)):
+			run_configure(configure, env=env, cwd=lib_dir);
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=lib_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=lib_dir)
 	
-	print("Copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/" + lib_name + "/lib", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/include", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/dist", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusenc.lib", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/include/opusenc.h", target + variant + "/" + lib_name + "/include/")
-	else:
-		shutil.copy(lib_dir + "/out/include/opus/opusenc.h", target + variant + "/" + lib_name + "/include/")
-		shutil.copy(lib_dir + "/out/lib/libopusenc.a", target + variant + "/" + lib_name + "/lib/")
-	shutil.copy(lib_dir + "/COPYING", target + variant + "/" + lib_name + "/dist/README-libopusenc.txt")
+	if phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		print("Copying " + lib_name + " files...")
+		remove_if_exists(ctx.out + "/" + lib_name + "/")
+		os.makedirs(ctx.out + "/" + lib_name + "/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/include", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/dist", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusenc.lib", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/include/opusenc.h", ctx.out + "/" + lib_name + "/include/")
+		else:
+			shutil.copy(lib_dir + "/out/include/opus/opusenc.h", ctx.out + "/" + lib_name + "/include/")
+			shutil.copy(lib_dir + "/out/lib/libopusenc.a", ctx.out + "/" + lib_name + "/lib/")
+		shutil.copy(lib_dir + "/COPYING", ctx.out + "/" + lib_name + "/dist/README-libopusenc.txt")
 
 
 
-def build_opusfile():
+def build_opusfile(ctx):
 	lib_name = "opusfile"
-	lib_dir = work_folder + "/" + opusfile_filebase
-
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+	lib_dir = ctx.work + "/" + opusfile_filebase
 
-	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(opusfile_url, work_folder + "/" + opusfile_filebase + ".tar.gz")
-		remove_if_exists(work_folder + "/" + opusfile_filebase + ".tar")
-		unzip_file(work_folder + "/" + opusfile_filebase + ".tar.gz", work_folder)
-		unzip_file(work_folder + "/" + opusfile_filebase + ".tar", work_folder)
-	else:
-		fetch_file(opusfile_url, work_folder + "/" + opusfile_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', opusfile_filebase + ".tar.gz" ], cwd=work_folder)
-
-	print("Building " + lib_name + "...")
+	patches = []
 	if target == 'windows':
 		#patch vcxproj to adjust library and include paths:
-		replace_in_file(lib_dir + "/win32/VS2015/opusfile.vcxproj", [
+		patches.append(("win32/VS2015/opusfile.vcxproj", [
 			("..\\..\\..\\opus\\win32\\VS2015\\$(Platform)\\$(Configuration)",
 			 "..\\..\\..\\..\\windows\\libopus\\lib"),
 			("..\\..\\..\\opus\\include",
@@ -647,24 +2148,41 @@ def build_opusfile():
 			 "<WholeProgramOptimization>false</WholeProgramOptimization>"),
 			("<RuntimeLibrary>MultiThreaded</RuntimeLibrary>",
 			 "<RuntimeLibrary>MultiThreadedDLL</RuntimeLibrary>")
-		])
-		run_command([
+		]))
+
+	print("Fetching " + lib_name + "...")
+	phase("fetch", fetch_archive("opusfile"))
+
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("opusfile", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
+
+	print("Building " + lib_name + "...")
+	if target == 'windows':
+		msbuild = [
 			"msbuild", "/m",
 			"opusfile.sln",
 			"/p:PlatformToolset=v143,Configuration=Release-NoHTTP,Platform=x64",
 			"/t:opusfile"
-		], cwd=lib_dir + "/win32/VS2015")
+		]
+		if phase("compile", msbuild):
+			run_command(msbuild, cwd=lib_dir + "/win32/VS2015")
 	else:
 		prefix = os.getcwd() + '/' + lib_dir + '/out';
 		env = os.environ.copy()
-		env['CPPFLAGS'] = '-O2 ' + variant_cflags[variant]
-		env['CFLAGS'] = '-O2 ' + variant_cflags[variant]
-		env['DEPS_CFLAGS'] = '-I../../' + target + variant + '/libogg/include -I../../' + target + variant + '/libopus/include'
-		env['DEPS_LIBS'] = '-L../../' + target + variant + '/libogg/lib -L../../' + target + variant + '/libopus/lib'
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
-		#env['LDFLAGS'] = '-L../../' + target + variant + '/zlib/lib'
-		run_command(['./configure'] + variant_configure_flags[variant] + [
+		env['CPPFLAGS'] = '-O2 ' + ctx.cflags
+		env['CFLAGS'] = '-O2 ' + ctx.cflags
+		env['DEPS_CFLAGS'] = '-I' + ctx.top + ctx.out + '/libogg/include -I' + ctx.top + ctx.out + '/libopus/include'
+		env['DEPS_LIBS'] = '-L' + ctx.top + ctx.out + '/libogg/lib -L' + ctx.top + ctx.out + '/libopus/lib'
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
+		#env['LDFLAGS'] = '-L' + ctx.top + ctx.out + '/zlib/lib'
+		configure = ['./configure'] + ctx.configure_flags + [
 			'--prefix=' + prefix,
 			'--disable-dependency-tracking',
 			'--enable-static',
@@ -672,55 +2190,46 @@ def build_opusfile():
 			'--disable-http',
 			'--disable-examples',
 			'--disable-doc'
-			#'--with-zlib-prefix=../../' + target + variant + '/zlib',
-			], env=env, cwd=lib_dir);
-		run_command(['make'], cwd=lib_dir)
-		run_command(['make', 'install'], cwd=lib_dir)
-
-	print("Copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/" + lib_name + "/lib", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/include", exist_ok=True)
-	os.makedirs(target + variant + "/" + lib_name + "/dist", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release-NoHTTP/opusfile.lib", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release-NoHTTP/opusfile.pdb", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/include/opusfile.h", target + variant + "/" + lib_name + "/include/")
-	else:
-		shutil.copy(lib_dir + "/out/include/opus/opusfile.h", target + variant + "/" + lib_name + "/include/")
-		shutil.copy(lib_dir + "/out/lib/libopusfile.a", target + variant + "/" + lib_name + "/lib/")
-		shutil.copy(lib_dir + "/out/lib/libopusurl.a", target + variant + "/" + lib_name + "/lib/")
-	shutil.copy(lib_dir + "/COPYING", target + variant + "/" + lib_name + "/dist/README-opusfile.txt")
-
-def build_opustools():
-	lib_name = "opus-tools"
-	lib_dir = work_folder + "/" + opustools_filebase
+			#'--with-zlib-prefix=' + ctx.top + ctx.out + '/zlib',
+			]
+		if phase("configure", configure, env_changes(env)):
+			run_configure(configure, env=env, cwd=lib_dir);
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=lib_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=lib_dir)
 
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+	if phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		print("Copying " + lib_name + " files...")
+		remove_if_exists(ctx.out + "/" + lib_name + "/")
+		os.makedirs(ctx.out + "/" + lib_name + "/lib", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/include", exist_ok=True)
+		os.makedirs(ctx.out + "/" + lib_name + "/dist", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release-NoHTTP/opusfile.lib", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release-NoHTTP/opusfile.pdb", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/include/opusfile.h", ctx.out + "/" + lib_name + "/include/")
+		else:
+			shutil.copy(lib_dir + "/out/include/opus/opusfile.h", ctx.out + "/" + lib_name + "/include/")
+			shutil.copy(lib_dir + "/out/lib/libopusfile.a", ctx.out + "/" + lib_name + "/lib/")
+			shutil.copy(lib_dir + "/out/lib/libopusurl.a", ctx.out + "/" + lib_name + "/lib/")
+		shutil.copy(lib_dir + "/COPYING", ctx.out + "/" + lib_name + "/dist/README-opusfile.txt")
 
-	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(opustools_url, work_folder + "/" + opustools_filebase + ".tar.gz")
-		remove_if_exists(work_folder + "/" + opustools_filebase + ".tar")
-		unzip_file(work_folder + "/" + opustools_filebase + ".tar.gz", work_folder)
-		unzip_file(work_folder + "/" + opustools_filebase + ".tar", work_folder)
-	else:
-		fetch_file(opustools_url, work_folder + "/" + opustools_filebase + ".tar.gz")
-		run_command([ 'tar', 'xfz', opustools_filebase + ".tar.gz" ], cwd=work_folder)
+def build_opustools(ctx):
+	lib_name = "opus-tools"
+	lib_dir = ctx.work + "/" + opustools_filebase
 
-	print("Building " + lib_name + "...")
+	patches = []
 	if target == 'windows':
 		#patch config to remove libFLAC:
-		replace_in_file(lib_dir + "/win32/config.h", [
+		patches.append(("win32/config.h", [
 			('#define HAVE_LIBFLAC','//#define HAVE_LIBFLAC')
-		])
-
+		]))
 		#patch vcxproj to adjust library and include paths:
-		replace_in_file(lib_dir + "/win32/VS2015/generate_version.vcxproj", [
+		patches.append(("win32/VS2015/generate_version.vcxproj", [
 			('<WindowsTargetPlatformVersion>8.1</WindowsTargetPlatformVersion>','')
-		])
-		replace_in_file(lib_dir + "/win32/VS2015/opus-tools.props", [
+		]))
+		patches.append(("win32/VS2015/opus-tools.props", [
 			("..\\..\\..\\opus\\include",
 			 "..\\..\\..\\..\\windows\\libopus\\include"),
 			("..\\..\\..\\ogg\\include",
@@ -743,37 +2252,54 @@ def build_opustools():
 			(";ws2_32.lib", ""),
 			(";crypt32.lib", ""),
 			(";libFLAC_static.lib", "")
-		])
-		replace_in_file(lib_dir + "/win32/VS2015/common.props", [
+		]))
+		patches.append(("win32/VS2015/common.props", [
 			(">MultiThreaded<", ">MultiThreadedDLL<"),
 			("<WholeProgramOptimization>true</WholeProgramOptimization>",
 			 "<WholeProgramOptimization>false</WholeProgramOptimization>"),
-		])
-		run_command([
+		]))
+
+	print("Fetching " + lib_name + "...")
+	phase("fetch", fetch_archive("opus-tools"))
+
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("opus-tools", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
+
+	print("Building " + lib_name + "...")
+	if target == 'windows':
+		msbuild = [
 			"msbuild", "/m",
 			"opus-tools.sln",
 			"/p:PlatformToolset=v143,Configuration=Release,Platform=x64",
 			"/t:opusdec,opusenc,opusinfo"
-		], cwd=lib_dir + "/win32/VS2015")
+		]
+		if phase("compile", msbuild):
+			run_command(msbuild, cwd=lib_dir + "/win32/VS2015")
 	else:
 		prefix = os.getcwd() + '/' + lib_dir + '/out';
 		env = os.environ.copy()
-		env['CPPFLAGS'] = '-O2 ' + variant_cflags[variant]
-		env['CFLAGS'] = '-O2 ' + variant_cflags[variant]
+		env['CPPFLAGS'] = '-O2 ' + ctx.cflags
+		env['CFLAGS'] = '-O2 ' + ctx.cflags
 		env['LIBS'] = ''
-		env['OGG_CFLAGS'] = '-I../../' + target + variant + '/libogg/include'
-		env['OGG_LIBS'] = '-L../../' + target + variant + '/libogg/lib -logg'
-		env['OPUS_CFLAGS'] = '-I../../' + target + variant + '/libopus/include'
-		env['OPUS_LIBS'] = '-L../../' + target + variant + '/libopus/lib -lopus -lm'
-		env['OPUSFILE_CFLAGS'] = '-I../../' + target + variant + '/opusfile/include'
-		env['OPUSFILE_LIBS'] = '-L../../' + target + variant + '/opusfile/lib -lopusfile' + ' ' + env['OGG_LIBS']
-		env['OPUSURL_CFLAGS'] = '-I../../' + target + variant + '/opusfile/include'
-		env['OPUSURL_LIBS'] = '-L../../' + target + variant + '/opusfile/lib -lopusurl -lopusfile' +  ' ' + env['OGG_LIBS']
-		env['LIBOPUSENC_CFLAGS'] = '-I../../' + target + variant + '/libopusenc/include'
-		env['LIBOPUSENC_LIBS'] = '-L../../' + target + variant + '/libopusenc/lib -lopusenc'
+		env['OGG_CFLAGS'] = '-I' + ctx.top + ctx.out + '/libogg/include'
+		env['OGG_LIBS'] = '-L' + ctx.top + ctx.out + '/libogg/lib -logg'
+		env['OPUS_CFLAGS'] = '-I' + ctx.top + ctx.out + '/libopus/include'
+		env['OPUS_LIBS'] = '-L' + ctx.top + ctx.out + '/libopus/lib -lopus -lm'
+		env['OPUSFILE_CFLAGS'] = '-I' + ctx.top + ctx.out + '/opusfile/include'
+		env['OPUSFILE_LIBS'] = '-L' + ctx.top + ctx.out + '/opusfile/lib -lopusfile' + ' ' + env['OGG_LIBS']
+		env['OPUSURL_CFLAGS'] = '-I' + ctx.top + ctx.out + '/opusfile/include'
+		env['OPUSURL_LIBS'] = '-L' + ctx.top + ctx.out + '/opusfile/lib -lopusurl -lopusfile' +  ' ' + env['OGG_LIBS']
+		env['LIBOPUSENC_CFLAGS'] = '-I' + ctx.top + ctx.out + '/libopusenc/include'
+		env['LIBOPUSENC_LIBS'] = '-L' + ctx.top + ctx.out + '/libopusenc/lib -lopusenc'
 		env['HAVE_PKG_CONFIG'] = 'no'
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
 
 		#seems like with no pkg config, the values of these variables are not respected, so they need to be added to CFLAGS/LIBS directly:
 		env['CFLAGS'] = (env['CFLAGS']
@@ -789,7 +2315,7 @@ def build_opustools():
 			+ ' ' + env['OPUSFILE_LIBS']
 			+ ' ' + env['OPUSURL_LIBS'] )
 
-		run_command(['./configure'] + variant_configure_flags[variant] + [
+		configure = ['./configure'] + ctx.configure_flags + [
 			'--prefix=' + prefix,
 			'--disable-dependency-tracking',
 			'--without-flac',
@@ -802,128 +2328,149 @@ def build_opustools():
 		#	'--disable-shared',
 		#	'--disable-doc',
 		#	'--disable-examples'
-			], env=env, cwd=lib_dir);
-		run_command(['make'], cwd=lib_dir)
-		run_command(['make', 'install'], cwd=lib_dir)
+			]
+		if phase("configure", configure, env_changes(env)):
+			run_configure(configure, env=env, cwd=lib_dir);
+		if phase("compile", ['make']):
+			run_command(['make'] + parallel_args(), cwd=lib_dir)
+		if phase("install", ['make', 'install']):
+			run_command(['make', 'install'], cwd=lib_dir)
 	
-	print("Copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/" + lib_name + "/bin", exist_ok=True)
-	if target == 'windows':
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusenc.exe", target + variant + "/" + lib_name + "/bin/")
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusdec.exe", target + variant + "/" + lib_name + "/bin/")
-		shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusinfo.exe", target + variant + "/" + lib_name + "/bin/")
-	else:
-		shutil.copy(lib_dir + "/out/bin/opusenc", target + variant + "/" + lib_name + "/bin/")
-		shutil.copy(lib_dir + "/out/bin/opusdec", target + variant + "/" + lib_name + "/bin/")
-		shutil.copy(lib_dir + "/out/bin/opusinfo", target + variant + "/" + lib_name + "/bin/")
+	if phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		print("Copying " + lib_name + " files...")
+		remove_if_exists(ctx.out + "/" + lib_name + "/")
+		os.makedirs(ctx.out + "/" + lib_name + "/bin", exist_ok=True)
+		if target == 'windows':
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusenc.exe", ctx.out + "/" + lib_name + "/bin/")
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusdec.exe", ctx.out + "/" + lib_name + "/bin/")
+			shutil.copy(lib_dir + "/win32/VS2015/x64/Release/opusinfo.exe", ctx.out + "/" + lib_name + "/bin/")
+		else:
+			shutil.copy(lib_dir + "/out/bin/opusenc", ctx.out + "/" + lib_name + "/bin/")
+			shutil.copy(lib_dir + "/out/bin/opusdec", ctx.out + "/" + lib_name + "/bin/")
+			shutil.copy(lib_dir + "/out/bin/opusinfo", ctx.out + "/" + lib_name + "/bin/")
 
 
-def build_harfbuzz():
+def build_harfbuzz(ctx):
 	lib_name = "harfbuzz"
-	lib_dir = work_folder + "/harfbuzz-" + harfbuzz_filebase
+	lib_dir = ctx.work + "/harfbuzz-" + harfbuzz_filebase
 
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+	#
+	patches = [
+		("CMakeLists.txt", [
+			('  include (FindFreetype)', '  #include (FindFreetype)  # <-- hack to avoid picking up system freetype'),
+		]),
+		("meson.build", [
+			("                            required: get_option('freetype'),", "                             required: false, # <-- hack to avoid freetype search failure"),
+			#("  if not freetype_dep.found() and not get_option('freetype').disabled()", "  if false # <-- more hack to avoid freetype search"),
+			("freetype_dep = dependency('freetype2', version: freetype_min_version, required: get_option('freetype'), default_options: ['harfbuzz=disabled'])", "freetype_dep = dependency('', required: false) #<--- hack to avoid freetype search"),
+			#("if not get_option('freetype').disabled()", "if false # <--- hack to avoid freetype search"),
+			("if freetype_dep.found()", "if true # <--- more hack"),
+		]),
+	]
 
 	print("Fetching " + lib_name + "...")
-	fetch_file(harfbuzz_urlbase + ".zip", work_folder + "/" + harfbuzz_filebase + ".zip")
-	if target == 'windows':
-		unzip_file(work_folder + "/" + harfbuzz_filebase + ".zip", work_folder, '-xr!CLAUDE.md') #exclude symbolic link
-	else:
-		unzip_file(work_folder + "/" + harfbuzz_filebase + ".zip", work_folder)
-	
-	print("Building " + lib_name + "...")
+	phase("fetch", fetch_archive("harfbuzz"))
 
-	#
-	replace_in_file(lib_dir + "/CMakeLists.txt", [
-		('  include (FindFreetype)', '  #include (FindFreetype)  # <-- hack to avoid picking up system freetype'),
-	])
-	replace_in_file(lib_dir + "/meson.build", [
-		("                            required: get_option('freetype'),", "                             required: false, # <-- hack to avoid freetype search failure"),
-		#("  if not freetype_dep.found() and not get_option('freetype').disabled()", "  if false # <-- more hack to avoid freetype search"),
-		("freetype_dep = dependency('freetype2', version: freetype_min_version, required: get_option('freetype'), default_options: ['harfbuzz=disabled'])", "freetype_dep = dependency('', required: false) #<--- hack to avoid freetype search"),
-		#("if not get_option('freetype').disabled()", "if false # <--- hack to avoid freetype search"),
-		("if freetype_dep.found()", "if true # <--- more hack"),
-	])
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("harfbuzz", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
 
+	print("Building " + lib_name + "...")
 
 	if target == 'windows':
 		env = os.environ.copy()
-		run_command([
+		configure = [
 			"cmake", "-B", "build",
 			"-DHB_HAVE_FREETYPE=ON",
 			"-DFREETYPE_FOUND=1", #<-- hack!
-			"-DFREETYPE_INCLUDE_DIRS=..\\..\\" + target + variant + "\\freetype\\include",
-			"-DFREETYPE_LIBRARY=..\\..\\..\\" + target + variant + "\\freetype\\lib\\freetype",
-		] + variant_cmake_flags[variant], env=env, cwd=lib_dir)
-		run_command([
-			"cmake",
-			"--build", "build",
-			"--config", "RelWithDebInfo",
-			"-j", str(jobs)
-		],env=env, cwd=lib_dir)
+			"-DFREETYPE_INCLUDE_DIRS=" + ctx.top.replace('/', '\\') + ctx.out + "\\freetype\\include",
+			"-DFREETYPE_LIBRARY=..\\" + ctx.top.replace('/', '\\') + ctx.out + "\\freetype\\lib\\freetype",
+		] + ctx.cmake_flags + cmake_generator_args() + compiler_launcher_cmake_flags()
+		if phase("configure", configure):
+			remove_if_exists(lib_dir + "/build")
+			run_command(configure, env=env, cwd=lib_dir)
+		build = [ "cmake", "--build", "build", "--config", "RelWithDebInfo" ]
+		if phase("compile", build):
+			run_build(build + parallel_args(), lib_dir + "/build", env=env, cwd=lib_dir)
 	else:
 		cross_file = []
+		cross = None
 		if target == 'macos':
 			cross_file = ["--cross-file", "cross.txt"]
-			f = open(f"{lib_dir}/cross.txt", 'wb')
-			if variant == '-x86':
+			#(meson takes the host compilers -- and any compiler cache -- from the cross file, not CC/CXX)
+			launcher = ''.join(f"'{arg}', " for arg in compiler_launcher_command())
+			if ctx.variant == '-x86':
 				#based on https://github.com/mesonbuild/meson/issues/8206
-				f.write("""
+				cross = f"""
 					[host_machine]
 					system = 'darwin'
 					cpu_family='x86_64'
 					cpu='x86_64'
 					endian='little'
 					[binaries]
-					c=['clang', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
-					cpp=['clang++', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
-					objcpp=['clang++', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
+					c=[{launcher}'clang', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
+					cpp=[{launcher}'clang++', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
+					objcpp=[{launcher}'clang++', '-target', 'x86_64-apple-macos10.9', '-mmacosx-version-min=10.9']
 					strip='strip'
-				""".encode('utf8'))
-			elif variant == '-arm':
-				f.write("""
+				"""
+			elif ctx.variant == '-arm':
+				cross = f"""
 					[host_machine]
 					system = 'darwin'
 					cpu_family='x86_64'
 					cpu='x86_64'
 					endian='little'
 					[binaries]
-					c=['clang', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
-					cpp=['clang++', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
-					objcpp=['clang++', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
+					c=[{launcher}'clang', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
+					cpp=[{launcher}'clang++', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
+					objcpp=[{launcher}'clang++', '-target', 'arm64-apple-macos11', '-mmacosx-version-min=11']
 					strip='strip'
-				""".encode('utf8'))
+				"""
 			else:
 				assert False
-			f.close()
 		env = os.environ.copy()
-		for key in variant_env[variant].keys():
-			env[key] = variant_env[variant][key]
-		run_command([
+		for key in ctx.env.keys():
+			env[key] = ctx.env[key]
+		add_compiler_launcher(env)
+		#(variant flags go in c_args/cpp_args -- except on macOS, where the cross file has them)
+		configure = ([
 			"meson", "setup", "build"]
 			+ cross_file + [
 			"-Dbuildtype=debugoptimized",
 			"-Ddefault_library=static",
 			"-Dfreetype=enabled",
 			"-Dtests=disabled",
+			"-Ddocs=disabled", #(docs/ is not extracted)
 			"-Dutilities=disabled",
-			"-Dcpp_args=-I../../../" + target + variant + "/freetype/include",
-		], env=env, cwd=lib_dir)
-		run_command([
-			"meson", "compile", "-C", "build", "harfbuzz"
-		], env=env, cwd=lib_dir)
+			"-Dcpp_args=-I../" + ctx.top + ctx.out + "/freetype/include" + ('' if cross is not None else ' ' + ctx.cflags),
+		] + ([ "-Dc_args=" + ctx.cflags ] if cross is None and ctx.cflags != '' else []))
+		if phase("configure", configure, env_changes(env), cross):
+			#(meson refuses to set up an already-configured build dir)
+			remove_if_exists(lib_dir + "/build")
+			if cross is not None:
+				with open(f"{lib_dir}/cross.txt", 'wb') as f:
+					f.write(cross.encode('utf8'))
+			run_command(configure, env=env, cwd=lib_dir)
+		build = [ "meson", "compile", "-C", "build", "harfbuzz" ]
+		if phase("compile", build):
+			run_build(build + parallel_args(), lib_dir + "/build", env=env, cwd=lib_dir)
 
+	if not phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		return
 	print("copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/harfbuzz/lib", exist_ok=True)
-	os.makedirs(target + variant + "/harfbuzz/include", exist_ok=True)
-	os.makedirs(target + variant + "/harfbuzz/dist", exist_ok=True)
+	remove_if_exists(ctx.out + "/" + lib_name + "/")
+	os.makedirs(ctx.out + "/harfbuzz/lib", exist_ok=True)
+	os.makedirs(ctx.out + "/harfbuzz/include", exist_ok=True)
+	os.makedirs(ctx.out + "/harfbuzz/dist", exist_ok=True)
 	if target == 'windows':
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/harfbuzz.lib", target + variant + "/harfbuzz/lib/")
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/harfbuzz.pdb", target + variant + "/harfbuzz/lib/")
+		shutil.copy(lib_dir + "/build/RelWithDebInfo/harfbuzz.lib", ctx.out + "/harfbuzz/lib/")
+		shutil.copy(lib_dir + "/build/RelWithDebInfo/harfbuzz.pdb", ctx.out + "/harfbuzz/lib/")
 	else:
-		shutil.copy(lib_dir + "/build/src/libharfbuzz.a", target + variant + "/harfbuzz/lib/")
+		shutil.copy(lib_dir + "/build/src/libharfbuzz.a", ctx.out + "/harfbuzz/lib/")
 
 	for header in [
 		"hb-aat.h",
@@ -970,46 +2517,46 @@ def build_harfbuzz():
 		"hb-uniscribe.h",
 		"hb-version.h"
 		]:
-		shutil.copy(lib_dir + "/src/" + header, target + variant + "/harfbuzz/include/")
-	shutil.copy(lib_dir + "/COPYING", target + variant + "/harfbuzz/dist/README-harfbuzz.txt")
+		shutil.copy(lib_dir + "/src/" + header, ctx.out + "/harfbuzz/include/")
+	shutil.copy(lib_dir + "/COPYING", ctx.out + "/harfbuzz/dist/README-harfbuzz.txt")
 
 
-def build_freetype():
+def build_freetype(ctx):
 	lib_name = "freetype"
-	lib_dir = work_folder + "/" + freetype_filebase
+	lib_dir = ctx.work + "/" + freetype_filebase
 
-	print("Cleaning any existing " + lib_name + "...")
-	remove_if_exists(target + variant + "/" + lib_name + "/")
-	remove_if_exists(lib_dir)
+	patches = [
+		#patch config to trim a few extra modules / features:
+		("include/freetype/config/ftoption.h", [
+			('#define FT_CONFIG_OPTION_USE_LZW', '//#define FT_CONFIG_OPTION_USE_LZW'),
+			('#define FT_CONFIG_OPTION_USE_ZLIB', '//#define FT_CONFIG_OPTION_USE_ZLIB'),
+			('#define FT_CONFIG_OPTION_ENVIRONMENT_PROPERTIES', '//#define FT_CONFIG_OPTION_ENVIRONMENT_PROPERTIES'),
+			('#define FT_CONFIG_OPTION_MAC_FONTS', '//#define FT_CONFIG_OPTION_MAC_FONTS'),
+			#('#define TT_CONFIG_OPTION_BYTECODE_INTERPRETER', '//#define TT_CONFIG_OPTION_BYTECODE_INTERPRETER'), #<-- causes build error; apparently ft wasn't tested with this undefined?
+			#but actually enable error strings:
+			('/* #define FT_CONFIG_OPTION_ERROR_STRINGS */', '#define FT_CONFIG_OPTION_ERROR_STRINGS'),
+		]),
+	]
 
 	print("Fetching " + lib_name + "...")
-	if target == 'windows':
-		fetch_file(freetype_url, work_folder + "/" + freetype_filebase + ".tar.gz")
-		remove_if_exists(work_folder + "/" + freetype_filebase + ".tar")
-		unzip_file(work_folder + "/" + freetype_filebase + ".tar.gz", work_folder)
-		unzip_file(work_folder + "/" + freetype_filebase + ".tar", work_folder)
-	else:
-		fetch_file(freetype_url, work_folder + "/" + freetype_filebase + ".tar.gz")
-		run_command([ 'tar', 'xf', freetype_filebase + ".tar.gz" ], cwd=work_folder)
-	
+	phase("fetch", fetch_archive("freetype"))
+
+	if phase("extract", patches, output=lib_dir):
+		print("Cleaning any existing " + lib_name + "...")
+		remove_if_exists(lib_dir)
+		extract_archive("freetype", ctx.work)
+
+	if phase("patch", patches):
+		apply_patches(lib_dir, patches)
+
 	print("Building " + lib_name + "...")
-	#patch config to trim a few extra modules / features:
-	replace_in_file(lib_dir + "/include/freetype/config/ftoption.h", [
-		('#define FT_CONFIG_OPTION_USE_LZW', '//#define FT_CONFIG_OPTION_USE_LZW'),
-		('#define FT_CONFIG_OPTION_USE_ZLIB', '//#define FT_CONFIG_OPTION_USE_ZLIB'),
-		('#define FT_CONFIG_OPTION_ENVIRONMENT_PROPERTIES', '//#define FT_CONFIG_OPTION_ENVIRONMENT_PROPERTIES'),
-		('#define FT_CONFIG_OPTION_MAC_FONTS', '//#define FT_CONFIG_OPTION_MAC_FONTS'),
-		#('#define TT_CONFIG_OPTION_BYTECODE_INTERPRETER', '//#define TT_CONFIG_OPTION_BYTECODE_INTERPRETER'), #<-- causes build error; apparently ft wasn't tested with this undefined?
-		#but actually enable error strings:
-		('/* #define FT_CONFIG_OPTION_ERROR_STRINGS */', '#define FT_CONFIG_OPTION_ERROR_STRINGS'),
-	])
 
 	env = os.environ.copy()
-	env['CFLAGS'] = variant_cflags[variant]
-	env['CXXFLAGS'] = variant_cflags[variant]
-	for key in variant_env[variant].keys():
-		env[key] = variant_env[variant][key]
-	run_command([
+	env['CFLAGS'] = ctx.cflags
+	env['CXXFLAGS'] = ctx.cflags
+	for key in ctx.env.keys():
+		env[key] = ctx.env[key]
+	configure = [
 		"cmake",
 		"-B", "build",
 		"-D", "CMAKE_BUILD_TYPE=RelWithDebInfo",
@@ -1018,87 +2565,716 @@ def build_freetype():
 		"-D", "CMAKE_DISABLE_FIND_PACKAGE_PNG=TRUE",
 		"-D", "CMAKE_DISABLE_FIND_PACKAGE_HarfBuzz=TRUE",
 		"-D", "CMAKE_DISABLE_FIND_PACKAGE_BrotliDec=TRUE"
-	] + variant_cmake_flags[variant], cwd=lib_dir, env=env)
+	] + ctx.cmake_flags + cmake_generator_args() + compiler_launcher_cmake_flags()
+	if phase("configure", configure, env_changes(env)):
+		remove_if_exists(lib_dir + "/build")
+		run_command(configure, cwd=lib_dir, env=env)
 
-	run_command([
-		"cmake",
-		"--build", "build",
-		"--config", "RelWithDebInfo",
-		"-j", str(jobs)
-	], cwd=lib_dir, env=env)
+	build = [ "cmake", "--build", "build", "--config", "RelWithDebInfo" ]
+	if phase("compile", build):
+		run_build(build + parallel_args(), lib_dir + "/build", cwd=lib_dir, env=env)
 
 
+	if not phase("copy", builder_source(), output=ctx.out + "/" + lib_name):
+		return
 	print("copying " + lib_name + " files...")
-	os.makedirs(target + variant + "/freetype/lib", exist_ok=True)
-	os.makedirs(target + variant + "/freetype/include", exist_ok=True)
-	os.makedirs(target + variant + "/freetype/dist", exist_ok=True)
+	remove_if_exists(ctx.out + "/" + lib_name + "/")
+	os.makedirs(ctx.out + "/freetype/lib", exist_ok=True)
+	os.makedirs(ctx.out + "/freetype/include", exist_ok=True)
+	os.makedirs(ctx.out + "/freetype/dist", exist_ok=True)
 	if target == 'windows':
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/freetype.lib", target + variant + "/freetype/lib/")
-		shutil.copy(lib_dir + "/build/RelWithDebInfo/freetype.pdb", target + variant + "/freetype/lib/")
+		shutil.copy(lib_dir + "/build/RelWithDebInfo/freetype.lib", ctx.out + "/freetype/lib/")
+		shutil.copy(lib_dir + "/build/RelWithDebInfo/freetype.pdb", ctx.out + "/freetype/lib/")
 	else:
 		#todo: check what gets build on other oses:
-		shutil.copy(lib_dir + "/build/libfreetype.a", target + variant + "/freetype/lib/")
-	shutil.copy(lib_dir + "/include/ft2build.h", target + variant + "/freetype/include/")
-	shutil.copytree(lib_dir + "/include/freetype/", target + variant + "/freetype/include/freetype/")
-	shutil.copy(lib_dir + "/build/include/freetype/config/ftconfig.h", target + variant + "/freetype/include/freetype/config/")
-	shutil.copy(lib_dir + "/build/include/freetype/config/ftoption.h", target + variant + "/freetype/include/freetype/config/")
+		shutil.copy(lib_dir + "/build/libfreetype.a", ctx.out + "/freetype/lib/")
+	shutil.copy(lib_dir + "/include/ft2build.h", ctx.out + "/freetype/include/")
+	shutil.copytree(lib_dir + "/include/freetype/", ctx.out + "/freetype/include/freetype/")
+	shutil.copy(lib_dir + "/build/include/freetype/config/ftconfig.h", ctx.out + "/freetype/include/freetype/config/")
+	shutil.copy(lib_dir + "/build/include/freetype/config/ftoption.h", ctx.out + "/freetype/include/freetype/config/")
 	#This isn't quite right, since the FTL only requires acknowledgement in documentation:
-	#shutil.copy(lib_dir + "/doc/FTL.TXT", target + variant + "/freetype/dist/")
-	f = open(target + variant + '/freetype/dist/README-freetype.txt', 'wb')
+	#shutil.copy(lib_dir + "/doc/FTL.TXT", ctx.out + "/freetype/dist/")
+	f = open(ctx.out + '/freetype/dist/README-freetype.txt', 'wb')
 	f.write('Freetype used under the provisions of the FTL.\n\nPortions of this software are copyright \u00A9 2020 The FreeType Project (www.freetype.org).  All rights reserved.\n'.encode('utf8'))
 	f.close()
 
 
 
+#Release archives are written in-process: tarfile streams the tar into fixed-size
+# blocks, and the blocks are compressed in parallel on all cores (zlib and lzma
+# release the GIL while they work). --compress=gz,zst:19,xz picks the formats
+# (and levels) to write; the default is gz.
+package_block_size = 4 << 20
+package_default_levels = { 'gz':6, 'zst':19, 'xz':6 }
+
+def package_formats():
+	formats = dict() #format => level
+	for opt in options:
+		if opt.startswith('--compress='):
+			for spec in opt[len('--compress='):].split(','):
+				(fmt, _, level) = spec.partition(':')
+				if fmt not in package_default_levels:
+					exit(f"Unknown compression format '{fmt}' (expecting one of {', '.join(package_default_levels)}).")
+				formats[fmt] = int(level) if level != '' else package_default_levels[fmt]
+	if len(formats) == 0:
+		formats['gz'] = package_default_levels['gz']
+	return list(formats.items())
+
+#zstd is in the standard library from python 3.14; before that it needs the 'zstandard' module:
+def zstd_compress_function(level):
+	try:
+		from compression import zstd
+		return lambda data: zstd.compress(data, level)
+	except ImportError:
+		pass
+	try:
+		import zstandard
+	except ImportError:
+		exit("Writing .tar.zst needs python 3.14 or the 'zstandard' module (pip install zstandard).")
+	compressor = threading.local()
+	def compress(data):
+		if not hasattr(compressor, 'zstd'):
+			compressor.zstd = zstandard.ZstdCompressor(level=level)
+		return compressor.zstd.compress(data)
+	return compress
+
+#Compresses blocks of one output file on 'pool', writing them out in order.
+# gzip output is a single member (like pigz: each block is primed with the
+# previous block's last 32k and ends in a sync flush); xz and zstd output is
+# one stream/frame per block, which their decompressors read back to back.
+class BlockCompressor:
+	def __init__(self, filename, fmt, level, pool):
+		self.filename = filename
+		self.fmt = fmt
+		self.level = level
+		self.pool = pool
+		self.pending = []
+		self.file = open(filename, 'wb')
+		self.digest = hashlib.sha256()
+		self.size = 0
+		self.cpu = 0.0
+		self.crc = 0
+		self.blocks = 0
+		self.tail = b''
+		if fmt == 'gz':
+			#(mtime 0, no name; OS 255 = unknown)
+			self.output(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')
+		elif fmt == 'zst':
+			self.zstd = zstd_compress_function(level)
+
+	def output(self, data):
+		self.file.write(data)
+		self.digest.update(data)
+		self.size += len(data)
+
+	def compress(self, data, tail, first, last):
+		start = time.perf_counter()
+		if self.fmt == 'gz':
+			if tail != b'':
+				c = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, tail)
+			else:
+				c = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9)
+			out = c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+		elif self.fmt == 'xz':
+			out = lzma.compress(data, format=lzma.FORMAT_XZ, preset=self.level) if (data != b'' or first) else b''
+		else:
+			out = self.zstd(data) if (data != b'' or first) else b''
+		return (out, time.perf_counter() - start)
+
+	def write(self, data, last):
+		if self.fmt == 'gz':
+			self.crc = zlib.crc32(data, self.crc)
+		self.pending.append(self.pool.submit(self.compress, data, self.tail, self.blocks == 0, last))
+		self.blocks += 1
+		self.tail = data[-32768:]
+		#bound the memory held by blocks in flight:
+		while len(self.pending) > 2 * jobs or (last and len(self.pending) > 0):
+			(out, cpu) = self.pending.pop(0).result()
+			self.output(out)
+			self.cpu += cpu
+
+	def close(self, raw_size):
+		if self.fmt == 'gz':
+			self.output(struct.pack('<II', self.crc, raw_size & 0xffffffff))
+		self.file.close()
+
+#File-like object for tarfile that hands fixed-size blocks to each compressor:
+class PackageStream:
+	def __init__(self, compressors):
+		self.compressors = compressors
+		self.buffer = bytearray()
+		self.size = 0
+
+	def write(self, data):
+		self.buffer += data
+		self.size += len(data)
+		while len(self.buffer) >= package_block_size:
+			block = bytes(self.buffer[0:package_block_size])
+			del self.buffer[0:package_block_size]
+			for c in self.compressors:
+				c.write(block, False)
+
+	def close(self):
+		block = bytes(self.buffer)
+		self.buffer = bytearray()
+		for c in self.compressors:
+			c.write(block, True)
+			c.close(self.size)
+
+#Write 'members' ((path, name in archive) pairs) to basename + '.tar.<format>' for
+# each of package_formats(). Returns { filename:(size, sha256 hex digest) }.
+def write_tar_package(basename, members):
+	start = time.time()
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='compress') as pool:
+		compressors = [ BlockCompressor(basename + '.tar.' + fmt, fmt, level, pool) for (fmt, level) in package_formats() ]
+		stream = PackageStream(compressors)
+		with tarfile.open(fileobj=stream, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+			for (path, name) in members:
+				tar.add(path, arcname=name, recursive=False)
+		stream.close()
+	elapsed = time.time() - start
+	written = dict()
+	for c in compressors:
+		print(f"  Wrote '{c.filename}' ({c.fmt} level {c.level}): {c.size / 1e6:.1f} MB, {c.size / max(1, stream.size):.1%} of {stream.size / 1e6:.1f} MB; {c.cpu:.1f}s compressing ({elapsed:.1f}s wall, shared between formats).")
+		record_event('package', os.path.basename(c.filename), start, start + elapsed, format=c.fmt, level=c.level, raw=stream.size, size=c.size, cpu=c.cpu)
+		written[c.filename] = (c.size, c.digest.hexdigest())
+	return written
+
+#Write 'members' to basename + '.zip'. Returns { filename:(size, sha256 hex digest) }.
+def write_zip_package(basename, members):
+	filename = basename + '.zip'
+	with zipfile.ZipFile(filename, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+		for (path, name) in members:
+			archive.write(path, arcname=name)
+	return { filename:(os.path.getsize(filename), file_sha256(filename)) }
+
+#Besides the full release, each library in target/ gets its own archive
+# (e.g., nest-libs-linux-<tag>-SDL3.tar.gz), and an index lists every
+# component's archives, their sizes and digests, and the libraries it
+# depends on, so that a consumer can fetch just the closure it needs.
+def write_component_packages():
+	components = sorted([ name for name in os.listdir(output_root) if os.path.isdir(output_root + "/" + name) ])
+	def package_component(lib):
+		members = []
+		for (dirpath, dirnames, filenames) in os.walk(output_root + "/" + lib):
+			dirnames.sort()
+			for fn in sorted(filenames):
+				members.append((dirpath + '/' + fn, 'nest-libs/' + dirpath + '/' + fn))
+		basename = "nest-libs-" + output_root + "-" + tag + "-" + lib
+		if target == 'windows':
+			return write_zip_package(basename, members)
+		else:
+			return write_tar_package(basename, members)
+	#(tar packages compress in parallel internally; zip packages get a thread each)
+	if target == 'windows':
+		with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+			archives = dict(zip(components, pool.map(package_component, components)))
+	else:
+		archives = { lib:package_component(lib) for lib in components }
+
+	index = {
+		'target':target,
+		'tag':tag,
+		'components':{
+			lib:{
+				'dependencies':[ dep for dep in lib_deps.get(lib, []) if dep in components ],
+				'archives':{ filename:{ 'size':size, 'sha256':digest } for (filename, (size, digest)) in archives[lib].items() },
+			} for lib in components
+		},
+	}
+	index_file = "nest-libs-" + output_root + "-" + tag + "-index.json"
+	with open(index_file, 'w') as f:
+		json.dump(index, f, indent='\t', sort_keys=True)
+	print(f"Wrote {len(components)} component packages; index in '{index_file}'.")
+
+#Every release carries a manifest of its files (size, sha256, and which
+# component archive has them) as manifest.json, and as a separate
+# nest-libs-<target>-<tag>-manifest.json release asset for `update`.
+manifest_file = 'manifest.json'
+
+def write_manifest(files):
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		digests = list(pool.map(file_sha256, files))
+	def component(name):
+		parts = name.split('/')
+		return parts[1] if len(parts) > 2 and parts[0] == output_root else None
+	manifest = {
+		'target':target,
+		'tag':tag,
+		'archive':"nest-libs-" + output_root + "-" + tag + ('.zip' if target == 'windows' else '.tar.' + package_formats()[0][0]),
+		'files':{
+			name:{ 'size':os.path.getsize(name), 'sha256':digest, 'component':component(name) } for (name, digest) in zip(files, digests)
+		},
+	}
+	with open(manifest_file, 'w') as f:
+		json.dump(manifest, f, indent='\t', sort_keys=True)
+	shutil.copy(manifest_file, "nest-libs-" + output_root + "-" + tag + "-manifest.json")
+
+#Variant merge: combine per-variant install trees (e.g. macos-x86 + macos-arm => macos).
+# Files are compared by size and then by streamed hash; directories whose files are
+# identical in every variant are copied whole, identical files are copied, libraries
+# and executables are combined by merge_tool (run in parallel), and differing headers
+# are wrapped in each variant's preprocessor condition. Any other difference is an error.
+# NEST_LIBS_MERGE_TOOL replaces lipo, e.g. with a stub when testing on another platform.
+merge_tool = shlex.split(os.environ.get('NEST_LIBS_MERGE_TOOL', 'lipo -create -output {output} {inputs}'))
+
+def merged_by_tool(fn):
+	return fn.endswith('.a') or fn in {'opusenc','opusdec','opusinfo'}
+
+def merge_tool_command(output, inputs):
+	command = []
+	for arg in merge_tool:
+		if arg == '{inputs}':
+			command += inputs
+		else:
+			command.append(arg.replace('{output}', output))
+	return command
+
+#conditions[i] guards inputs[i]; at most one may be None, which becomes the #else branch:
+def merge_headers(output, inputs, conditions):
+	order = [ i for i in range(len(inputs)) if conditions[i] is not None ] + [ i for i in range(len(inputs)) if conditions[i] is None ]
+	with open(output, 'wb') as o:
+		for (n, i) in enumerate(order):
+			if conditions[i] is None:
+				o.write(b'#else\n')
+			else:
+				o.write(f"#{'if' if n == 0 else 'elif'} {conditions[i]}\n".encode('utf8'))
+			o.write(f"//{inputs[i]}:\n".encode('utf8'))
+			with open(inputs[i], 'rb') as f:
+				shutil.copyfileobj(f, o)
+		if conditions[order[-1]] is not None:
+			o.write(b'#else\n#error "No matching variant for this header."\n')
+		o.write(b'#endif\n')
+
+def merge_variant_trees(output, trees, conditions):
+	assert len([ c for c in conditions if c is None ]) <= 1
+	start = time.time()
+	print(f"Merging {', '.join(trees)} into '{output}'...")
+	remove_if_exists(output)
+
+	#relative path => size, for every file in every tree:
+	listings = []
+	for tree in trees:
+		listing = {}
+		for (dirpath, dirnames, filenames) in os.walk(tree):
+			for fn in filenames:
+				name = os.path.relpath(dirpath + '/' + fn, tree)
+				listing[name] = os.path.getsize(dirpath + '/' + fn)
+		listings.append(listing)
+	names = sorted(set().union(*listings))
+
+	errors = []
+	for name in names:
+		missing = [ tree for (tree, listing) in zip(trees, listings) if name not in listing ]
+		if len(missing) != 0:
+			errors.append(f"ERROR: '{name}' is missing from {', '.join(missing)}")
+	if len(errors) != 0:
+		print('\n'.join(errors))
+		sys.exit(1)
+
+	#(only same-size files can be identical, so only those get hashed)
+	def same_everywhere(name):
+		return len(set(file_sha256(tree + '/' + name) for tree in trees)) == 1
+	candidates = [ name for name in names if len(set(listing[name] for listing in listings)) == 1 ]
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		identical = set(name for (name, same) in zip(candidates, pool.map(same_everywhere, candidates)) if same)
+
+	#every directory holding (at any depth) a file that differs:
+	differing = { '.' }
+	for name in names:
+		if name not in identical:
+			parent = os.path.dirname(name)
+			while parent != '':
+				differing.add(parent)
+				parent = os.path.dirname(parent)
+
+	copied = 0
+	copied_dirs = 0
+	headers = 0
+	tool_merges = []
+	for (dirpath, dirnames, filenames) in os.walk(trees[0]):
+		rel = os.path.relpath(dirpath, trees[0])
+		if rel not in differing:
+			shutil.copytree(dirpath, output + '/' + rel)
+			copied_dirs += 1
+			copied += len([ name for name in identical if name.startswith(rel + '/') ])
+			dirnames.clear()
+			continue
+		os.makedirs(output + '/' + rel, exist_ok=True)
+		for fn in filenames:
+			name = os.path.normpath(rel + '/' + fn)
+			inputs = [ tree + '/' + name for tree in trees ]
+			if merged_by_tool(fn):
+				tool_merges.append((output + '/' + name, inputs))
+			elif name in identical:
+				shutil.copy(inputs[0], output + '/' + name)
+				copied += 1
+			elif fn.endswith('.h'):
+				merge_headers(output + '/' + name, inputs, conditions)
+				headers += 1
+			else:
+				errors.append(f"ERROR: branch mis-match {' and '.join(inputs)}")
+	if len(errors) != 0:
+		print('\n'.join(errors))
+		sys.exit(1)
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		list(pool.map(lambda merge: run_command(merge_tool_command(*merge)), tool_merges))
+
+	end = time.time()
+	record_event('package', 'merge', start, end, files=len(names), copied=copied, headers=headers, merged=len(tool_merges))
+	print(f"Merged {len(names)} files in {end - start:.1f}s: {copied} copied ({copied_dirs} whole directories), {len(tool_merges)} merged with '{merge_tool[0]}', {headers} headers wrapped.")
+
+#Debug info (linux): the RelWithDebInfo / debugoptimized builds leave full DWARF in
+# the installed libraries. split_debug_info() moves it out with objcopy, into
+# <target>-debug/<lib>/.../<file>.debug (released separately as
+# nest-libs-<target>-<tag>-debug), and strips the files that ship. Executables get
+# a .gnu_debuglink to their .debug file; objcopy can't add one to an archive (and
+# object files have no build-id), so an archive's debug info is found by name,
+# next to it, once the debug package is unpacked over a release.
+debug_folder = output_root + "-debug"
+
+def debug_file(path):
+	return debug_folder + path[len(output_root):] + ".debug"
+
+#returns True if the file had to be split (rather than having been split already):
+def split_debug_file(path):
+	debug = debug_file(path)
+	#(a .debug file with the same modification time is the one split from this file)
+	if os.path.exists(debug) and os.stat(debug).st_mtime_ns == os.stat(path).st_mtime_ns:
+		return False
+	os.makedirs(os.path.dirname(debug), exist_ok=True)
+	run_command(['objcopy', '--only-keep-debug', path, debug])
+	with open(path, 'rb') as f:
+		is_executable = f.read(4) == b'\x7fELF'
+	run_command(['objcopy', '--strip-debug'] + ([ '--add-gnu-debuglink=' + debug ] if is_executable else []) + [ path ])
+	st = os.stat(path)
+	os.utime(debug, ns=(st.st_atime_ns, st.st_mtime_ns))
+	return True
+
+def split_debug_info():
+	if shutil.which('objcopy') is None:
+		print("WARNING: objcopy not found; debug info stays in the libraries.")
+		return
+	start = time.time()
+	libs = sorted([ name for name in os.listdir(output_root) if os.path.isdir(output_root + "/" + name) ])
+	def folder_size(folder):
+		return sum(os.lstat(dirpath + '/' + fn).st_size for (dirpath, dirnames, filenames) in os.walk(folder) for fn in filenames)
+	before = { lib:folder_size(output_root + "/" + lib) for lib in libs }
+	#static archives and ELF executables / shared objects (symlinks are left alone):
+	paths = []
+	for lib in libs:
+		for (dirpath, dirnames, filenames) in os.walk(output_root + "/" + lib):
+			for fn in filenames:
+				path = dirpath + '/' + fn
+				if os.path.islink(path):
+					continue
+				with open(path, 'rb') as f:
+					magic = f.read(8)
+				if magic == b'!<arch>\n' or magic[0:4] == b'\x7fELF':
+					paths.append(path)
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		split = sum(pool.map(split_debug_file, paths))
+	record_event('package', 'split-debug', start, time.time(), files=len(paths), split=split)
+	print(f"Split debug info from {split} of {len(paths)} files in {time.time() - start:.1f}s; shipped size before => after (debug package):")
+	for lib in libs:
+		after = folder_size(output_root + "/" + lib)
+		debug = folder_size(debug_folder + "/" + lib) if os.path.isdir(debug_folder + "/" + lib) else 0
+		print(f"  {lib}: {before[lib] / 1e6:.1f} MB => {after / 1e6:.1f} MB ({debug / 1e6:.1f} MB)")
+
+def write_debug_package():
+	members = []
+	for (dirpath, dirnames, filenames) in os.walk(debug_folder):
+		dirnames.sort()
+		for fn in sorted(filenames):
+			path = dirpath + '/' + fn
+			shipped = output_root + path[len(debug_folder):-len('.debug')]
+			#(skipping leftovers from files that aren't shipped any more)
+			if os.path.exists(shipped):
+				#(named to unpack next to the file it belongs to)
+				members.append((path, 'nest-libs/' + shipped + '.debug'))
+	write_tar_package("nest-libs-" + output_root + "-" + tag + "-debug", members)
+
+#Smoke tests: before anything is packaged, a tiny program per library -- and
+# one using all of them -- is compiled and linked (with c++, the way games use
+# the libraries) against the output tree, and run on linux. This catches a
+# static library that needs another one at link time (opusfile needs libogg,
+# harfbuzz needs freetype), a missing symbol, or a dangling symlink (like
+# libpng.a => libpng16.a) before the release is uploaded. Tests run in parallel.
+smoke_tests = {
+	'SDL3':{
+		'includes':['SDL3'],
+		'libs':['SDL3/lib/libSDL3.a'],
+		'system':{
+			'linux':['-ldl', '-lpthread'],
+			'macos':[ arg for fw in ['CoreMedia', 'CoreVideo', 'Cocoa', 'IOKit', 'ForceFeedback', 'Carbon', 'CoreAudio', 'AudioToolbox', 'AVFoundation', 'Foundation', 'GameController', 'Metal', 'QuartzCore', 'CoreHaptics', 'UniformTypeIdentifiers'] for arg in ['-framework', fw] ] + ['-liconv'],
+		},
+		'headers':'#include <SDL3/SDL.h>\n',
+		'source':r"""
+static int smoke_SDL3() {
+	return SDL_GetVersion() == SDL_VERSION ? 0 : 1;
+}
+""",
+	},
+	'glm':{
+		'includes':['glm'],
+		'libs':[],
+		'headers':'#include <glm/glm.hpp>\n',
+		'source':r"""
+static int smoke_glm() {
+	glm::vec3 v(1.0f, 2.0f, 3.0f);
+	return glm::dot(v, v) == 14.0f ? 0 : 1;
+}
+""",
+	},
+	'zlib':{
+		'includes':['zlib'],
+		'libs':['zlib/lib/libz.a'],
+		'headers':'#include <zlib.h>\n',
+		'source':r"""
+static int smoke_zlib() {
+	const char text[] = "nest-libs nest-libs nest-libs";
+	unsigned char packed[128], unpacked[128];
+	uLongf packed_size = sizeof(packed), unpacked_size = sizeof(unpacked);
+	if (compress(packed, &packed_size, (const Bytef *)text, sizeof(text)) != Z_OK) return 1;
+	if (uncompress(unpacked, &unpacked_size, packed, packed_size) != Z_OK) return 1;
+	return unpacked_size == sizeof(text) && memcmp(unpacked, text, sizeof(text)) == 0 ? 0 : 1;
+}
+""",
+	},
+	'libpng':{
+		'includes':['libpng', 'zlib'],
+		'libs':['libpng/lib/libpng.a', 'zlib/lib/libz.a'],
+		'headers':'#include <png.h>\n',
+		'source':r"""
+static int smoke_libpng() {
+	const unsigned char pixels[2 * 2 * 4] = { 255,0,0,255, 0,255,0,255, 0,0,255,255, 255,255,255,0 };
+	png_image image;
+	memset(&image, 0, sizeof(image));
+	image.version = PNG_IMAGE_VERSION;
+	image.width = 2;
+	image.height = 2;
+	image.format = PNG_FORMAT_RGBA;
+	unsigned char png[1024];
+	png_alloc_size_t png_size = sizeof(png);
+	if (!png_image_write_to_memory(&image, png, &png_size, 0, pixels, 0, NULL)) return 1;
+	png_image decode;
+	memset(&decode, 0, sizeof(decode));
+	decode.version = PNG_IMAGE_VERSION;
+	if (!png_image_begin_read_from_memory(&decode, png, png_size)) return 1;
+	decode.format = PNG_FORMAT_RGBA;
+	unsigned char decoded[sizeof(pixels)];
+	if (!png_image_finish_read(&decode, NULL, decoded, 0, NULL)) return 1;
+	return memcmp(decoded, pixels, sizeof(pixels)) == 0 ? 0 : 1;
+}
+""",
+	},
+	'libogg':{
+		'includes':['libogg'],
+		'libs':['libogg/lib/libogg.a'],
+		'headers':'#include <ogg/ogg.h>\n',
+		'source':r"""
+static int smoke_libogg() {
+	ogg_stream_state stream;
+	if (ogg_stream_init(&stream, 466) != 0) return 1;
+	ogg_stream_clear(&stream);
+	return 0;
+}
+""",
+	},
+	'libopus':{
+		'includes':['libopus'],
+		'libs':['libopus/lib/libopus.a'],
+		'headers':'#include <opus.h>\n',
+		'source':r"""
+static int smoke_libopus() {
+	int error = 0;
+	OpusEncoder *encoder = opus_encoder_create(48000, 2, OPUS_APPLICATION_AUDIO, &error);
+	if (encoder == NULL || error != OPUS_OK) return 1;
+	opus_int16 pcm[960 * 2] = { 0 };
+	unsigned char packet[1500];
+	opus_int32 size = opus_encode(encoder, pcm, 960, packet, sizeof(packet));
+	opus_encoder_destroy(encoder);
+	return size > 0 ? 0 : 1;
+}
+""",
+	},
+	'opusfile':{
+		'includes':['opusfile', 'libogg', 'libopus'],
+		'libs':['opusfile/lib/libopusfile.a', 'libogg/lib/libogg.a', 'libopus/lib/libopus.a'],
+		'headers':'#include <opusfile.h>\n',
+		'source':r"""
+static int smoke_opusfile() {
+	//(not an Ogg Opus stream, but checking takes libogg and libopus)
+	const unsigned char data[64] = { 'O', 'g', 'g', 'S' };
+	return op_test(NULL, data, sizeof(data)) < 0 ? 0 : 1;
+}
+""",
+	},
+	'libopusenc':{
+		'includes':['libopusenc', 'libopus'],
+		'libs':['libopusenc/lib/libopusenc.a', 'libopus/lib/libopus.a'],
+		'headers':'#include <opusenc.h>\n',
+		'source':r"""
+static int smoke_libopusenc() {
+	int error = 0;
+	OggOpusComments *comments = ope_comments_create();
+	OggOpusEnc *encoder = ope_encoder_create_pull(comments, 48000, 2, 0, &error);
+	if (encoder == NULL || error != OPE_OK) return 1;
+	opus_int16 pcm[960 * 2] = { 0 };
+	if (ope_encoder_write(encoder, pcm, 960) != OPE_OK) return 1;
+	if (ope_encoder_drain(encoder) != OPE_OK) return 1;
+	int pages = 0;
+	unsigned char *page;
+	opus_int32 length;
+	while (ope_encoder_get_page(encoder, &page, &length, 1)) ++pages;
+	ope_encoder_destroy(encoder);
+	ope_comments_destroy(comments);
+	return pages > 0 ? 0 : 1;
+}
+""",
+	},
+	'freetype':{
+		'includes':['freetype'],
+		'libs':['freetype/lib/libfreetype.a'],
+		'headers':'#include <ft2build.h>\n#include FT_FREETYPE_H\n',
+		'source':r"""
+static int smoke_freetype() {
+	FT_Library library;
+	if (FT_Init_FreeType(&library) != 0) return 1;
+	FT_Int major, minor, patch;
+	FT_Library_Version(library, &major, &minor, &patch);
+	FT_Done_FreeType(library);
+	return major == FREETYPE_MAJOR ? 0 : 1;
+}
+""",
+	},
+	'harfbuzz':{
+		'includes':['harfbuzz', 'freetype'],
+		'libs':['harfbuzz/lib/libharfbuzz.a', 'freetype/lib/libfreetype.a'],
+		'system':{ 'linux':['-lpthread'] },
+		'headers':'#include <hb.h>\n#include <hb-ft.h>\n',
+		'source':r"""
+static int smoke_harfbuzz() {
+	hb_face_t *face = hb_face_create(hb_blob_get_empty(), 0);
+	hb_font_t *font = hb_font_create(face);
+	//(uses freetype, as games that render with it do)
+	hb_ft_font_set_funcs(font);
+	hb_buffer_t *buffer = hb_buffer_create();
+	hb_buffer_add_utf8(buffer, "nest", -1, 0, -1);
+	hb_buffer_guess_segment_properties(buffer);
+	hb_shape(font, buffer, NULL, 0);
+	unsigned int glyphs = hb_buffer_get_length(buffer);
+	hb_buffer_destroy(buffer);
+	hb_font_destroy(font);
+	hb_face_destroy(face);
+	return glyphs == 4 ? 0 : 1;
+}
+""",
+	},
+}
+
+#programs (not libraries) that ship, run with --version on linux:
+smoke_commands = [ 'opus-tools/bin/opusenc', 'opus-tools/bin/opusdec', 'opus-tools/bin/opusinfo' ]
+
+def smoke_test(name, tests, folder):
+	tree = os.path.abspath(output_root)
+	source = '#include <stdio.h>\n#include <string.h>\n'
+	source += ''.join(smoke_tests[t]['headers'] for t in tests)
+	source += ''.join(smoke_tests[t]['source'] for t in tests)
+	source += 'int main(int argc, char **argv) {\n\tint failed = 0;\n'
+	for t in tests:
+		source += f'\tif (smoke_{t}() != 0) {{ printf("{t} failed\\n"); failed = 1; }}\n'
+	source += '\treturn failed;\n}\n'
+	with open(folder + "/" + name + ".cpp", 'w') as f:
+		f.write(source)
+	#(libraries in link order, each after everything that uses it)
+	libs = []
+	for t in tests:
+		for lib in smoke_tests[t]['libs']:
+			if lib in libs:
+				libs.remove(lib)
+			libs.append(lib)
+	system = [ arg for t in tests for arg in smoke_tests[t].get('system', {}).get(target, []) ]
+	includes = sorted(set(lib for t in tests for lib in smoke_tests[t]['includes']))
+	cxx = os.environ.get('CXX', 'c++')
+	commands = [
+		[ cxx, '-std=c++17', name + '.cpp', '-o', name ] + [ '-I' + tree + "/" + lib + "/include" for lib in includes ] + [ tree + "/" + lib for lib in libs ] + system + [ '-lm' ]
+	]
+	if target == 'linux':
+		commands.append([ './' + name ])
+	for args in commands:
+		result = subprocess.run(args, cwd=folder, capture_output=True, text=True)
+		if result.returncode != 0:
+			return f"{name}: `{' '.join(args)}` failed ({result.returncode}):\n{result.stdout}{result.stderr}"
+	return None
+
+def run_smoke_tests():
+	if target == 'windows':
+		print("Smoke tests build with c++; skipped on windows.")
+		return
+	start = time.time()
+	folder = work_folder + "/smoke/" + output_root
+	remove_if_exists(folder)
+	os.makedirs(folder)
+	problems = []
+	#symlinks in the tree must point at something that ships:
+	for (dirpath, dirnames, filenames) in os.walk(output_root):
+		for fn in filenames:
+			path = dirpath + '/' + fn
+			if os.path.islink(path) and not os.path.exists(path):
+				problems.append(f"'{path}' is a symlink to '{os.readlink(path)}', which doesn't exist.")
+	libs = [ lib for lib in smoke_tests if os.path.isdir(output_root + "/" + lib) ]
+	programs = [ (lib, [lib]) for lib in libs ] + [ ('all', libs) ]
+	def run_program(program):
+		(name, tests) = program
+		return smoke_test(name, tests, folder)
+	def run_smoke_command(command):
+		if not os.path.exists(output_root + "/" + command):
+			return None
+		result = subprocess.run([ os.path.abspath(output_root + "/" + command), '--version' ], capture_output=True, text=True)
+		if result.returncode != 0:
+			return f"`{command} --version` failed ({result.returncode}):\n{result.stdout}{result.stderr}"
+		return None
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		results = list(pool.map(run_program, programs))
+		if target == 'linux':
+			results += list(pool.map(run_smoke_command, smoke_commands))
+	problems += [ r for r in results if r is not None ]
+	record_event('package', 'smoke-tests', start, time.time(), programs=len(programs), failed=len(problems))
+	if len(problems) > 0:
+		for problem in problems:
+			print("ERROR: " + problem)
+		exit(f"Smoke tests failed ({len(problems)} problems); not packaging.")
+	print(f"Smoke tests: {len(programs)} programs ({', '.join(libs)}, all) " + ("linked and ran" if target == 'linux' else "linked") + f" in {time.time() - start:.1f}s.")
+
 def make_package():
 	print("Packaging...")
-	if target == 'macos':
-		remove_if_exists('macos')
-
-		subprocess.run(['diff', '-r', 'macos-arm', 'macos-x86'],check=False) #DEBUG: what's actually different?
-		#merge the -x86 and -arm branches:
-		for (armpath, dirnames, filenames) in os.walk(target + '-arm'):
-			outpath = re.sub('^macos-arm', 'macos', armpath)
-			x86path = re.sub('^macos-arm', 'macos-x86', armpath)
-			os.makedirs(outpath, exist_ok=True)
-			for fn in filenames:
-				if fn.endswith('.a') or fn in {'opusenc','opusdec','opusinfo'}:
-					print("To merge: " + armpath + fn + " and " + x86path + fn)
-					run_command([
-						'lipo', '-create',
-						'-output', f"{outpath}/{fn}",
-						f"{armpath}/{fn}",
-						f"{x86path}/{fn}"
-					])
-				else:
-					with open(f"{armpath}/{fn}", 'rb') as f: arm = f.read()
-					with open(f"{x86path}/{fn}", 'rb') as f: x86 = f.read()
-					if arm == x86:
-						shutil.copy(f"{armpath}/{fn}", f"{outpath}/{fn}")
-					elif fn.endswith('.h'):
-						print(f"Merged {armpath}/{fn} and {x86path}/{fn}")
-						with open(f"{outpath}/{fn}", 'wb') as f:
-							f.write(b'#ifdef __aarch64__\n//arm version:\n')
-							f.write(arm)
-							f.write(b'#else //__aarch64__\n//non-arm version:\n')
-							f.write(x86)
-							f.write(b'#endif //__aarch64__\n')
-					else:
-						print(f"ERROR: branch mis-match {armpath}/{fn} and {x86path}/{fn}")
-						sys.exit(1)
+	if len(variants) > 1:
+		if any(v not in variant_merge_conditions for v in variants):
+			exit("Packaging needs a variant_merge_conditions entry for each of " + ", ".join(variants) + ".")
+		merge_variant_trees(output_root, [ ctx.out for ctx in build_contexts ], [ variant_merge_conditions[ctx.variant] for ctx in build_contexts ])
 	
+	if target == 'linux':
+		split_debug_info()
+
+	run_smoke_tests()
+
 	#create file to reflect version:
 	with open(tag, 'w') as v:
 		pass
 
+	files = [ tag, 'README.md' ]
+	for (dirpath, dirnames, filenames) in os.walk(output_root):
+		for fn in filenames:
+			files.append(dirpath + '/' + fn)
+	write_manifest(files)
+
 	#Create a list of files to compress for release builds:
 	listfile = work_folder + '/listfile'
 	with open(listfile, 'w') as l:
-		l.write('nest-libs/' + tag + '\n')
-		l.write('nest-libs/README.md\n')
-		for (dirpath, dirnames, filenames) in os.walk(target):
-			for fn in filenames:
-				l.write('nest-libs/' + dirpath + '/' + fn + '\n')
+		for name in files + [ manifest_file ]:
+			l.write('nest-libs/' + name + '\n')
 	#Eventually might do this:
 	#Also create a package directory because of the unique way in which artifact uploads work :-/
 	#remove_if_exists(target + variant + "/package/")
@@ -1110,70 +3286,1049 @@ def make_package():
 		run_command([
 			"C:\\Program Files\\7-Zip\\7z.exe",
 			"a",
-			"nest-libs\\nest-libs-" + target + "-" + tag + ".zip",
+			"nest-libs\\nest-libs-" + output_root + "-" + tag + ".zip",
 			"@nest-libs\\work\\listfile"
 		], cwd='..')
 	else:
-		run_command([
-			'tar',
-			'cfz',
-			'nest-libs/nest-libs-' + target + "-" + tag + ".tar.gz",
-			"--files-from", "nest-libs/work/listfile"
-		], cwd='..')
+		with open(listfile, 'r') as l:
+			names = [ line.rstrip('\n') for line in l ]
+		#(listfile paths are relative to the parent folder, like the archive's)
+		write_tar_package("nest-libs-" + output_root + "-" + tag, [ (name[len('nest-libs/'):], name) for name in names ])
+
+	write_component_packages()
+	if os.path.isdir(debug_folder):
+		write_debug_package()
 		
 
-to_build = sys.argv[1:]
+#Delta updates: `rebuild-libs.py update <tag> [--dir=path/to/nest-libs]` compares
+# an unpacked release against <tag>'s manifest and fetches only the component
+# archives (or, for files outside any component, the full release) holding
+# changed files. New files are staged and checked against the manifest
+# before any of them are moved into place.
+release_url = os.environ.get('NEST_LIBS_RELEASE_URL', 'https://github.com/15-466/nest-libs/releases/download')
+
+def fetch_json(url):
+	with urllib.request.urlopen(url) as response:
+		return json.load(response)
+
+#Copy the members of 'archive' named in 'wanted' (name in archive => output path):
+def extract_members(archive, wanted):
+	if archive.endswith('.zip'):
+		with zipfile.ZipFile(archive) as z:
+			for (name, path) in wanted.items():
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				with z.open(name) as src, open(path, 'wb') as dst:
+					shutil.copyfileobj(src, dst, 1 << 20)
+	else:
+		with tarfile.open(archive, 'r|*') as tar:
+			for member in tar:
+				if member.name in wanted and member.isfile():
+					path = wanted[member.name]
+					os.makedirs(os.path.dirname(path), exist_ok=True)
+					with tar.extractfile(member) as src, open(path, 'wb') as dst:
+						shutil.copyfileobj(src, dst, 1 << 20)
+					os.chmod(path, member.mode & 0o777)
+
+def update_release(new_tag):
+	root = '.'
+	for opt in options:
+		if opt.startswith('--dir='):
+			root = opt[len('--dir='):]
+	base = release_url + '/' + new_tag + '/'
+	prefix = "nest-libs-" + output_root + "-" + new_tag
+	print(f"Updating '{root}' to {new_tag} from '{base}'...")
+	manifest = fetch_json(base + prefix + "-manifest.json")
+	index = fetch_json(base + prefix + "-index.json")
+	files = manifest['files']
+
+	old_files = None
+	if os.path.exists(root + "/" + manifest_file):
+		with open(root + "/" + manifest_file, 'r') as f:
+			old_files = json.load(f)['files']
+
+	def local_digest(name):
+		path = root + "/" + name
+		if not os.path.isfile(path) or os.path.getsize(path) != files[name]['size']:
+			return None
+		return file_sha256(path)
+	names = sorted(files)
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		digests = dict(zip(names, pool.map(local_digest, names)))
+	changed = [ name for name in names if digests[name] != files[name]['sha256'] ]
+	#files from the old release that the new one doesn't have (everything under target/ if there's no old manifest):
+	if old_files is not None:
+		stale = [ name for name in old_files if name not in files ]
+	else:
+		stale = []
+		for (dirpath, dirnames, filenames) in os.walk(root + "/" + output_root):
+			for fn in filenames:
+				name = os.path.relpath(dirpath + "/" + fn, root).replace(os.sep, '/')
+				if name not in files:
+					stale.append(name)
+	stale = [ name for name in stale if os.path.exists(root + "/" + name) ]
+	print(f"  {len(names) - len(changed)} files up to date, {len(changed)} to fetch, {len(stale)} to remove.")
+
+	staging = root + "/.update"
+	remove_if_exists(staging)
+	os.makedirs(staging + "/files")
+
+	#which archive each changed file comes from (empty files need no download):
+	wanted = dict() #archive => { name in archive:staged path }
+	for name in changed:
+		staged = staging + "/files/" + name
+		if files[name]['size'] == 0:
+			os.makedirs(os.path.dirname(staged), exist_ok=True)
+			open(staged, 'wb').close()
+			continue
+		archive = manifest['archive']
+		if files[name]['component'] is not None:
+			archive = sorted(index['components'][files[name]['component']]['archives'])[0]
+		wanted.setdefault(archive, dict())['nest-libs/' + name] = staged
+
+	def fetch_and_extract(archive):
+		expected = None
+		for component in index['components'].values():
+			if archive in component['archives']:
+				expected = component['archives'][archive]['sha256']
+		print(f"  Fetching '{archive}' for {len(wanted[archive])} files...")
+		digest = download_file(base + archive, staging + "/" + archive)
+		if expected is not None and digest != expected:
+			raise RuntimeError(f"'{archive}' has sha256 {digest}; expected {expected}.")
+		extract_members(staging + "/" + archive, wanted[archive])
+	with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+		list(pool.map(fetch_and_extract, sorted(wanted)))
+
+	#check everything before touching the tree:
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+		staged_digests = list(pool.map(lambda name: file_sha256(staging + "/files/" + name) if os.path.exists(staging + "/files/" + name) else None, changed))
+	for (name, digest) in zip(changed, staged_digests):
+		if digest != files[name]['sha256']:
+			exit(f"Update failed: '{name}' has sha256 {digest}; expected {files[name]['sha256']}. '{root}' is unchanged.")
+
+	for name in changed:
+		os.makedirs(os.path.dirname(root + "/" + name), exist_ok=True)
+		os.replace(staging + "/files/" + name, root + "/" + name)
+	for name in stale:
+		os.remove(root + "/" + name)
+	with open(root + "/" + manifest_file + ".tmp", 'w') as f:
+		json.dump(manifest, f, indent='\t', sort_keys=True)
+	os.replace(root + "/" + manifest_file + ".tmp", root + "/" + manifest_file)
+	remove_if_exists(staging)
+	print(f"Updated '{root}' to {new_tag}.")
+
+#Benchmarks: `rebuild-libs.py bench [--dir=path/to/nest-libs]` compiles small
+# drivers against <dir>/<target>/ and times the library code we depend on. All
+# inputs are generated: the drivers make their own data, image and audio, and
+# freetype/harfbuzz get a generated TrueType font. Each driver runs --bench-runs
+# times (default 5); the median and minimum of each case go to
+# nest-libs-<target>-<tag>-bench.json (or --bench-out=file.json).
+#
+# `rebuild-libs.py bench compare <old> <new> [--threshold=percent]` compares two
+# result files, package trees, or release tags (fetched from the release's
+# component archives), and fails if any case got slower by more than the
+# threshold (default 5%).
+bench_runs = 5
+bench_threshold = 5.0
+for opt in options:
+	if opt.startswith('--bench-runs='):
+		bench_runs = int(opt[len('--bench-runs='):])
+	if opt.startswith('--threshold='):
+		bench_threshold = float(opt[len('--threshold='):])
+
+#(shared by every driver; each prints one "<case> <seconds>" line per case)
+bench_prelude = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+#include <time.h>
+
+static double now(void) {
+	struct timespec ts;
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+//xorshift, so that inputs are the same on every run:
+static uint32_t rng_state = 2463534242u;
+static uint32_t rng(void) {
+	rng_state ^= rng_state << 13;
+	rng_state ^= rng_state >> 17;
+	rng_state ^= rng_state << 5;
+	return rng_state;
+}
+
+#define CHECK(cond) do { if (!(cond)) { fprintf(stderr, "%s:%d: check failed: %s\n", __FILE__, __LINE__, #cond); exit(1); } } while (0)
+
+static void report(const char *name, double seconds) {
+	printf("%s %.9f\n", name, seconds);
+	fflush(stdout);
+}
+"""
+
+bench_drivers = {
+	'zlib':{
+		'includes':['zlib'],
+		'libs':['zlib/lib/libz.a'],
+		'source':r"""
+#include <zlib.h>
+
+int main(void) {
+	//text-like input (words from a small vocabulary, with some noise) that compresses about like source or json:
+	static const char *words[] = { "the ", "vertex ", "buffer ", "{ ", "}\n", "0.5f, ", "return ", "static ", "int ", "\n\t", "glyph ", "sample ", "\"name\": ", "[ ", "], ", "texture" };
+	const size_t size = (size_t)32 << 20;
+	unsigned char *data = malloc(size);
+	size_t at = 0;
+	while (at < size) {
+		const char *w = words[rng() % (sizeof(words) / sizeof(words[0]))];
+		for (; *w && at < size; ++w) data[at++] = (unsigned char)*w;
+		if (rng() % 8 == 0 && at < size) data[at++] = (unsigned char)('a' + rng() % 26);
+	}
+
+	uLongf packed_size = compressBound(size);
+	unsigned char *packed = malloc(packed_size);
+	double before = now();
+	CHECK(compress2(packed, &packed_size, data, size, Z_DEFAULT_COMPRESSION) == Z_OK);
+	report("zlib-deflate", now() - before);
+
+	uLongf unpacked_size = size;
+	unsigned char *unpacked = malloc(size);
+	before = now();
+	CHECK(uncompress(unpacked, &unpacked_size, packed, packed_size) == Z_OK);
+	report("zlib-inflate", now() - before);
+	CHECK(unpacked_size == size && memcmp(unpacked, data, size) == 0);
+	return 0;
+}
+""",
+	},
+	'libpng':{
+		'includes':['libpng', 'zlib'],
+		'libs':['libpng/lib/libpng.a', 'zlib/lib/libz.a'],
+		'source':r"""
+#include <png.h>
+
+int main(void) {
+	//gradients, hard-edged blocks, a noisy band and varying alpha -- roughly what textures look like:
+	const uint32_t width = 4096, height = 4096;
+	const size_t size = (size_t)width * height * 4;
+	unsigned char *pixels = malloc(size);
+	for (uint32_t y = 0; y < height; ++y) {
+		for (uint32_t x = 0; x < width; ++x) {
+			unsigned char *p = pixels + ((size_t)y * width + x) * 4;
+			p[0] = (unsigned char)(x * 255 / width);
+			p[1] = (unsigned char)(y * 255 / height);
+			p[2] = ((x / 64 + y / 64) & 1) ? 200 : 40;
+			p[3] = (unsigned char)(255 - ((x + y) & 63));
+			if (y > height / 2 && y < height / 2 + height / 8) {
+				p[0] ^= rng() & 0x1f;
+				p[1] ^= rng() & 0x1f;
+			}
+		}
+	}
+
+	png_image image;
+	memset(&image, 0, sizeof(image));
+	image.version = PNG_IMAGE_VERSION;
+	image.width = width;
+	image.height = height;
+	image.format = PNG_FORMAT_RGBA;
+	png_alloc_size_t png_size = 0;
+	CHECK(png_image_write_to_memory(&image, NULL, &png_size, 0, pixels, 0, NULL));
+	void *png = malloc(png_size);
+	double before = now();
+	CHECK(png_image_write_to_memory(&image, png, &png_size, 0, pixels, 0, NULL));
+	report("libpng-encode", now() - before);
+
+	png_image decode;
+	memset(&decode, 0, sizeof(decode));
+	decode.version = PNG_IMAGE_VERSION;
+	unsigned char *decoded = malloc(size);
+	before = now();
+	CHECK(png_image_begin_read_from_memory(&decode, png, png_size));
+	decode.format = PNG_FORMAT_RGBA;
+	CHECK(png_image_finish_read(&decode, NULL, decoded, 0, NULL));
+	report("libpng-decode", now() - before);
+	CHECK(decode.width == width && decode.height == height && memcmp(decoded, pixels, size) == 0);
+	return 0;
+}
+""",
+	},
+	'opus':{
+		'includes':['libopusenc', 'opusfile', 'libogg', 'libopus'],
+		'libs':['libopusenc/lib/libopusenc.a', 'opusfile/lib/libopusfile.a', 'libogg/lib/libogg.a', 'libopus/lib/libopus.a'],
+		'source':r"""
+#include <math.h>
+#include <opusenc.h>
+#include <opusfile.h>
+
+struct Buffer {
+	unsigned char *data;
+	size_t size, capacity;
+};
+
+static int write_buffer(void *user_data, const unsigned char *ptr, opus_int32 len) {
+	struct Buffer *buffer = (struct Buffer *)user_data;
+	if (buffer->size + len > buffer->capacity) {
+		buffer->capacity = 2 * (buffer->size + len);
+		buffer->data = realloc(buffer->data, buffer->capacity);
+		if (buffer->data == NULL) return 1;
+	}
+	memcpy(buffer->data + buffer->size, ptr, len);
+	buffer->size += len;
+	return 0;
+}
+
+static int close_buffer(void *user_data) {
+	return 0;
+}
+
+int main(void) {
+	//30 seconds of a stereo chord with vibrato, plus a little noise:
+	const int rate = 48000;
+	const int samples = 30 * rate;
+	opus_int16 *pcm = malloc(sizeof(opus_int16) * 2 * samples);
+	for (int i = 0; i < samples; ++i) {
+		double t = i / (double)rate;
+		double v = 0.3 * sin(2.0 * M_PI * 220.0 * t + 2.0 * sin(2.0 * M_PI * 5.0 * t))
+		         + 0.2 * sin(2.0 * M_PI * 277.18 * t)
+		         + 0.2 * sin(2.0 * M_PI * 329.63 * t);
+		pcm[2 * i + 0] = (opus_int16)(25000.0 * v + (int)(rng() % 1024) - 512);
+		pcm[2 * i + 1] = (opus_int16)(22000.0 * v + (int)(rng() % 1024) - 512);
+	}
+
+	struct Buffer ogg = { NULL, 0, 0 };
+	OpusEncCallbacks callbacks = { write_buffer, close_buffer };
+	OggOpusComments *comments = ope_comments_create();
+	int error = 0;
+	double before = now();
+	OggOpusEnc *encoder = ope_encoder_create_callbacks(&callbacks, &ogg, comments, rate, 2, 0, &error);
+	CHECK(encoder != NULL && error == OPE_OK);
+	CHECK(ope_encoder_write(encoder, pcm, samples) == OPE_OK);
+	CHECK(ope_encoder_drain(encoder) == OPE_OK);
+	report("libopusenc-encode", now() - before);
+	ope_encoder_destroy(encoder);
+	ope_comments_destroy(comments);
+
+	const int capacity = samples + rate;
+	opus_int16 *decoded = malloc(sizeof(opus_int16) * 2 * capacity);
+	int count = 0;
+	before = now();
+	OggOpusFile *file = op_open_memory(ogg.data, ogg.size, &error);
+	CHECK(file != NULL);
+	for (;;) {
+		int read = op_read_stereo(file, decoded + 2 * count, 2 * (capacity - count));
+		CHECK(read >= 0);
+		if (read == 0) break;
+		count += read;
+	}
+	report("opusfile-decode", now() - before);
+	op_free(file);
+	CHECK(count == samples);
+	return 0;
+}
+""",
+	},
+	'freetype':{
+		'includes':['freetype'],
+		'libs':['freetype/lib/libfreetype.a'],
+		'font':True,
+		'source':r"""
+#include <ft2build.h>
+#include FT_FREETYPE_H
+
+int main(int argc, char **argv) {
+	CHECK(argc == 2);
+	FT_Library library;
+	CHECK(FT_Init_FreeType(&library) == 0);
+	FT_Face face;
+	CHECK(FT_New_Face(library, argv[1], 0, &face) == 0);
+
+	//every printable glyph, at text through title sizes:
+	static const int sizes[] = { 12, 16, 20, 24, 32, 48, 64, 96, 128 };
+	size_t pixels = 0;
+	double before = now();
+	for (int round = 0; round < 20; ++round) {
+		for (size_t s = 0; s < sizeof(sizes) / sizeof(sizes[0]); ++s) {
+			CHECK(FT_Set_Pixel_Sizes(face, 0, sizes[s]) == 0);
+			for (FT_ULong c = 33; c < 127; ++c) {
+				CHECK(FT_Load_Char(face, c, FT_LOAD_RENDER) == 0);
+				pixels += (size_t)face->glyph->bitmap.rows * face->glyph->bitmap.width;
+			}
+		}
+	}
+	report("freetype-render", now() - before);
+	CHECK(pixels > 0);
+
+	FT_Done_Face(face);
+	FT_Done_FreeType(library);
+	return 0;
+}
+""",
+	},
+	'harfbuzz':{
+		'includes':['harfbuzz'],
+		'libs':['harfbuzz/lib/libharfbuzz.a', 'freetype/lib/libfreetype.a'],
+		'font':True,
+		#(harfbuzz is C++)
+		'cxx':True,
+		'source':r"""
+#include <hb.h>
+
+int main(int argc, char **argv) {
+	CHECK(argc == 2);
+	hb_blob_t *blob = hb_blob_create_from_file(argv[1]);
+	CHECK(hb_blob_get_length(blob) > 0);
+	hb_face_t *face = hb_face_create(blob, 0);
+	hb_font_t *font = hb_font_create(face);
+
+	//paragraphs of generated words:
+	const int length = 4096;
+	char *text = malloc(length);
+	for (int i = 0; i < length; ++i) {
+		text[i] = (rng() % 6 == 0) ? ' ' : (char)(33 + rng() % 94);
+	}
+
+	hb_buffer_t *buffer = hb_buffer_create();
+	const int rounds = 500;
+	size_t glyphs = 0;
+	double before = now();
+	for (int round = 0; round < rounds; ++round) {
+		hb_buffer_clear_contents(buffer);
+		hb_buffer_add_utf8(buffer, text, length, 0, length);
+		hb_buffer_set_direction(buffer, HB_DIRECTION_LTR);
+		hb_buffer_set_script(buffer, HB_SCRIPT_LATIN);
+		hb_buffer_set_language(buffer, hb_language_from_string("en", -1));
+		hb_shape(font, buffer, NULL, 0);
+		glyphs += hb_buffer_get_length(buffer);
+	}
+	report("harfbuzz-shape", now() - before);
+	CHECK(glyphs == (size_t)rounds * length);
+
+	hb_buffer_destroy(buffer);
+	hb_font_destroy(font);
+	hb_face_destroy(face);
+	hb_blob_destroy(blob);
+	return 0;
+}
+""",
+	},
+}
+
+#A TrueType font with a glyph for ' ' through '~' (each a few quadratic-curve
+# stars, so there is real outline to rasterize) and a 'kern' table, which
+# harfbuzz applies when there is no GPOS:
+def write_bench_font(filename):
+	rng = random.Random(466)
+	glyphs = [] #(contours, advance) for .notdef, then ' ' to '~'; contours are lists of (x, y, on curve)
+	for g in range(1 + 127 - 32):
+		if g == 1:
+			glyphs.append(([], 250))
+			continue
+		contours = []
+		for c in range(1 + g % 3):
+			(cx, cy, r) = (rng.randint(150, 450), rng.randint(150, 550), rng.randint(60, 140))
+			n = 2 * rng.randint(4, 10)
+			points = []
+			for i in range(n):
+				a = -2.0 * math.pi * i / n
+				rr = r if i % 2 == 0 else r * rng.uniform(0.5, 1.5)
+				points.append((round(cx + rr * math.cos(a)), round(cy + rr * math.sin(a)), i % 2 == 0))
+			contours.append(points)
+		glyphs.append((contours, 600))
+
+	glyf = b''
+	loca = []
+	bounds = []
+	for (contours, advance) in glyphs:
+		loca.append(len(glyf))
+		if len(contours) == 0:
+			bounds.append((0, 0, 0, 0))
+			continue
+		points = [ p for contour in contours for p in contour ]
+		box = (min(x for (x, y, on) in points), min(y for (x, y, on) in points), max(x for (x, y, on) in points), max(y for (x, y, on) in points))
+		bounds.append(box)
+		data = struct.pack('>hhhhh', len(contours), *box)
+		end = -1
+		for contour in contours:
+			end += len(contour)
+			data += struct.pack('>H', end)
+		data += struct.pack('>H', 0) #(no instructions)
+		#(flags: on-curve bit only, so every coordinate is a 16-bit delta)
+		data += bytes(1 if on else 0 for (x, y, on) in points)
+		for axis in [0, 1]:
+			prev = 0
+			for p in points:
+				data += struct.pack('>h', p[axis] - prev)
+				prev = p[axis]
+		glyf += data + b'\0' * (-len(data) % 4)
+	loca.append(len(glyf))
+
+	count = len(glyphs)
+	box = (min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds))
+	max_points = max(sum(len(c) for c in contours) for (contours, advance) in glyphs)
+	max_contours = max(len(contours) for (contours, advance) in glyphs)
+	pairs = sorted((l, r, -rng.randint(10, 80)) for l in range(2, count) for r in range(2, count) if (l * 31 + r) % 7 == 0)
+	log2 = lambda n: n.bit_length() - 1
+	tables = {
+		b'head':struct.pack('>IIIIHHqqhhhhHHhhh', 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0x000B, 1000, 0, 0, *box, 0, 8, 2, 1, 0),
+		b'hhea':struct.pack('>IhhhHhhhhhhhhhhhH', 0x00010000, 800, -200, 0, 600, box[0], 0, box[2], 1, 0, 0, 0, 0, 0, 0, 0, count),
+		b'maxp':struct.pack('>IHHHHHHHHHHHHHH', 0x00010000, count, max_points, max_contours, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0),
+		b'hmtx':b''.join(struct.pack('>Hh', advance, b[0]) for ((contours, advance), b) in zip(glyphs, bounds)),
+		b'loca':b''.join(struct.pack('>I', offset) for offset in loca),
+		b'glyf':glyf,
+		#format 4, one segment mapping ' '..'~' to glyphs 1.. (plus the required 0xFFFF segment):
+		b'cmap':struct.pack('>HHHHI', 0, 1, 3, 1, 12) + struct.pack('>HHHHHHHHHHHHHHHH', 4, 32, 0, 4, 4, 1, 0, 126, 0xFFFF, 0, 32, 0xFFFF, (1 - 32) & 0xFFFF, 1, 0, 0),
+		b'kern':struct.pack('>HHHHHHHHH', 0, 1, 0, 14 + 6 * len(pairs), 0x0001, len(pairs), 6 * (1 << log2(len(pairs))), log2(len(pairs)), 6 * (len(pairs) - (1 << log2(len(pairs)))))
+			+ b''.join(struct.pack('>HHh', *pair) for pair in pairs),
+		b'name':struct.pack('>HHH', 0, 0, 6),
+		b'post':struct.pack('>IihhIIIII', 0x00030000, 0, -100, 50, 0, 0, 0, 0, 0),
+	}
+	def checksum(data):
+		data += b'\0' * (-len(data) % 4)
+		return sum(struct.unpack('>%dI' % (len(data) // 4), data)) & 0xFFFFFFFF
+	tags = sorted(tables)
+	search = 16 * (1 << log2(len(tags)))
+	header = struct.pack('>IHHHH', 0x00010000, len(tags), search, log2(len(tags)), 16 * len(tags) - search)
+	offset = len(header) + 16 * len(tags)
+	records = b''
+	body = b''
+	for tag_name in tags:
+		data = tables[tag_name]
+		if tag_name == b'head':
+			head_offset = offset + len(body)
+		records += struct.pack('>4sIII', tag_name, checksum(data), offset + len(body), len(data))
+		body += data + b'\0' * (-len(data) % 4)
+	font = bytearray(header + records + body)
+	#(head.checkSumAdjustment makes the whole file sum to 0xB1B0AFBA)
+	struct.pack_into('>I', font, head_offset + 8, (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF)
+	with open(filename, 'wb') as f:
+		f.write(font)
+
+def run_benchmarks(root):
+	tree = root + "/" + output_root
+	if not os.path.isdir(tree):
+		exit(f"There is no '{tree}' to benchmark (build one, or pass --dir=path/to/nest-libs).")
+	if target == 'windows':
+		exit("Benchmarks only build with cc/c++ (linux and macos).")
+	#(each tree gets its own folder of drivers)
+	folder = work_folder + "/bench/" + hashlib.sha256(os.path.abspath(tree).encode('utf8')).hexdigest()[0:12]
+	os.makedirs(folder, exist_ok=True)
+	font = os.path.abspath(folder + "/bench-font.ttf")
+	write_bench_font(font)
+	cc = os.environ.get('CC', 'cc')
+	cxx = os.environ.get('CXX', 'c++')
+
+	tree_tag = None
+	if os.path.exists(root + "/" + manifest_file):
+		with open(root + "/" + manifest_file, 'r') as f:
+			tree_tag = json.load(f).get('tag')
+	print(f"Benchmarking '{tree}' ({tree_tag if tree_tag is not None else 'no manifest'}), {bench_runs} runs per driver...")
+
+	cases = dict() #case => [seconds, ...]
+	for (name, driver) in bench_drivers.items():
+		missing = [ lib for lib in driver['libs'] if not os.path.exists(tree + "/" + lib) ]
+		if len(missing) > 0:
+			print(f"  Skipping {name}: no " + ", ".join(missing) + ".")
+			continue
+		with open(folder + "/" + name + ".c", 'w') as f:
+			f.write(bench_prelude + driver['source'])
+		run_command([ cc, '-O2', '-c', name + '.c', '-o', name + '.o' ] + [ '-I' + os.path.abspath(tree + "/" + lib + "/include") for lib in driver['includes'] ], cwd=folder)
+		run_command([ cxx if driver.get('cxx', False) else cc, name + '.o', '-o', name ] + [ os.path.abspath(tree + "/" + lib) for lib in driver['libs'] ] + [ '-lm' ], cwd=folder)
+		for run in range(bench_runs):
+			result = subprocess.run([ './' + name ] + ([ font ] if driver.get('font', False) else []), cwd=folder, capture_output=True, text=True)
+			if result.returncode != 0:
+				exit(f"Benchmark '{name}' failed:\n{result.stderr}")
+			for line in result.stdout.splitlines():
+				(case, seconds) = line.split()
+				cases.setdefault(case, []).append(float(seconds))
+
+	versions = get_compiler_version().splitlines()
+	results = {
+		'target':target,
+		'root':output_root,
+		'tree':os.path.abspath(tree),
+		'tag':tree_tag,
+		'compiler':versions[0] if len(versions) > 0 else '',
+		'runs':bench_runs,
+		'cases':{
+			case:{ 'median':sorted(times)[len(times) // 2], 'min':min(times), 'seconds':times } for (case, times) in cases.items()
+		},
+	}
+	for (case, r) in sorted(results['cases'].items()):
+		print(f"  {case}: {r['median'] * 1000:.1f} ms (min {r['min'] * 1000:.1f} ms)")
+	return results
+
+#Unpack the benchmarked libraries from a release's component archives into work/bench/release-<tag>/:
+def fetch_release_tree(release_tag):
+	base = release_url + '/' + release_tag + '/'
+	index = fetch_json(base + "nest-libs-" + output_root + "-" + release_tag + "-index.json")
+	folder = work_folder + "/bench/release-" + release_tag
+	os.makedirs(folder, exist_ok=True)
+	extract_args = {}
+	if hasattr(tarfile, 'data_filter'):
+		extract_args['filter'] = 'data'
+	libs = sorted(set(path.split('/')[0] for driver in bench_drivers.values() for path in driver['libs']))
+	for lib in libs:
+		if lib not in index['components']:
+			continue
+		archives = index['components'][lib]['archives']
+		#(python's tarfile can't read .tar.zst before 3.14)
+		readable = [ name for name in sorted(archives) if name.endswith(('.tar.gz', '.tar.xz', '.tar.bz2')) ]
+		if len(readable) == 0:
+			exit(f"{release_tag} has no .tar.gz/.tar.xz/.tar.bz2 archive for {lib}.")
+		filename = folder + "/" + readable[0]
+		expected = archives[readable[0]]['sha256']
+		if not os.path.exists(filename) or file_sha256(filename) != expected:
+			print(f"  Fetching '{readable[0]}'...")
+			digest = download_file(base + readable[0], filename)
+			if digest != expected:
+				raise RuntimeError(f"'{readable[0]}' has sha256 {digest}; expected {expected}.")
+		with tarfile.open(filename, 'r:*') as archive:
+			archive.extractall(folder, **extract_args)
+	return folder + "/nest-libs"
+
+#A result file, a package tree, or a release tag:
+def bench_results(source):
+	if source.endswith('.json') and os.path.isfile(source):
+		with open(source, 'r') as f:
+			return json.load(f)
+	if os.path.isdir(source):
+		return run_benchmarks(source)
+	return run_benchmarks(fetch_release_tree(source))
+
+def compare_benchmarks(old_source, new_source):
+	old = bench_results(old_source)['cases']
+	new = bench_results(new_source)['cases']
+	print(f"Comparing '{old_source}' => '{new_source}' (median times; threshold {bench_threshold:g}%):")
+	regressions = []
+	for case in sorted(set(old) | set(new)):
+		if case not in old or case not in new:
+			print(f"  {case:<20} only in '{old_source if case in old else new_source}'")
+			continue
+		change = 100.0 * (new[case]['median'] / old[case]['median'] - 1.0)
+		note = ''
+		if change > bench_threshold:
+			note = '  <-- REGRESSION'
+			regressions.append(case)
+		elif change < -bench_threshold:
+			note = '  (faster)'
+		print(f"  {case:<20} {old[case]['median'] * 1000:10.1f} ms => {new[case]['median'] * 1000:10.1f} ms  {change:+6.1f}%{note}")
+	if len(regressions) > 0:
+		exit(f"{len(regressions)} case(s) slower by more than {bench_threshold:g}%: " + ", ".join(regressions))
+	print("No regressions.")
+
+#libraries that must be installed into a variant's output folder before a library can build:
+lib_deps = {
+	"SDL3":[],
+	"glm":[],
+	"zlib":[],
+	"libpng":["zlib"],
+	"libogg":[],
+	"libopus":[],
+	"opusfile":["libogg", "libopus"],
+	"libopusenc":["libogg", "libopus"],
+	"opus-tools":["libogg", "libopus", "opusfile", "libopusenc"],
+	"freetype":[],
+	"harfbuzz":["freetype"],
+}
+
+lib_builders = {
+	"SDL3":build_SDL3,
+	"glm":build_glm,
+	"zlib":build_zlib,
+	"libpng":build_libpng,
+	"libogg":build_libogg,
+	"libopus":build_libopus,
+	"opusfile":build_opusfile,
+	"libopusenc":build_libopusenc,
+	"opus-tools":build_opustools,
+	"freetype":build_freetype,
+	"harfbuzz":build_harfbuzz,
+}
+
+#Build output cache: each library's installed <target><variant>/<lib> tree is
+# stored under a key that hashes everything that goes into building it.
+build_cache_folder = os.environ.get('NEST_LIBS_BUILD_CACHE', work_folder + "/build-cache")
+use_build_cache = "--no-cache" not in options
+lib_cache_keys = dict() #(lib, variant) => key
+
+def get_compiler_version():
+	version = ''
+	if target == 'windows':
+		compilers = [ ['cl'] ]
+	else:
+		compilers = [ [os.environ.get('CC', 'cc'), '--version'], [os.environ.get('CXX', 'c++'), '--version'] ]
+	for args in compilers:
+		try:
+			result = subprocess.run(args, capture_output=True, text=True)
+			#(cl prints its version banner to stderr)
+			version += result.stdout + result.stderr
+		except OSError:
+			version += args[0] + ': not found\n'
+	return version
+
+compiler_version = None
+
+def installed_key_file(lib, ctx):
+	return build_cache_folder + "/installed-" + ctx.out + "-" + lib
+
+#What is installed in ctx.out/<lib>: its cache key, or the hash of the
+# phase that copied it there, or None if it is unknown.
+def installed_state(lib, ctx):
+	if (lib, ctx.variant) in lib_cache_keys:
+		return lib_cache_keys[(lib, ctx.variant)]
+	for filename in [ installed_key_file(lib, ctx), stamp_file(lib, ctx, 'copy') ]:
+		if os.path.exists(filename):
+			with open(filename, 'r') as f:
+				return f.read().strip()
+	return None
+
+def lib_cache_key(lib, ctx):
+	(url, filename) = lib_archives[lib]
+	key = hashlib.sha256()
+	def add(name, value):
+		key.update((name + '=' + json.dumps(value, sort_keys=True) + '\n').encode('utf8'))
+	add('target', ctx.out)
+	add('url', url)
+	if filename in archive_digests:
+		add('archive', archive_digests[filename])
+	else:
+		add('archive', file_sha256(filename))
+	#the build function's source covers its patch lists and configure/cmake/meson arguments:
+	add('builder', inspect.getsource(lib_builders[lib]))
+	add('helpers', [ inspect.getsource(f) for f in [extract_archive, patch_data, replace_in_file] ])
+	add('cflags', ctx.cflags)
+	add('cmake_flags', ctx.cmake_flags)
+	add('configure_flags', ctx.configure_flags)
+	add('env', ctx.env)
+	add('compiler', compiler_version)
+	for dep in lib_deps[lib]:
+		add('dep:' + dep, installed_state(dep, ctx))
+	return key.hexdigest()
+
+def run_builder(lib, ctx):
+	begin_phases(lib, ctx)
+	try:
+		lib_builders[lib](ctx)
+	except BaseException:
+		#a failed phase is timed but not stamped:
+		if build_state.phase is not None:
+			record_event('phase', build_state.phase, build_state.phase_start, time.time(), failed=True)
+			build_state.phase = None
+		raise
+	finish_phase()
 
-print("To build: " + ", ".join(to_build))
+def build_cached(lib, ctx):
+	fetch_archive(lib)
+	key = lib_cache_key(lib, ctx)
+	lib_cache_keys[(lib, ctx.variant)] = key
+	installed = ctx.out + "/" + lib
+	cached = build_cache_folder + "/" + key
+	if os.path.isdir(cached):
+		print(f"Restoring {lib}{ctx.variant} from build cache ({key[0:12]})...")
+		remove_if_exists(installed)
+		shutil.copytree(cached, installed, symlinks=True)
+	else:
+		print(f"No cached {lib}{ctx.variant} ({key[0:12]}); building.")
+		run_builder(lib, ctx)
+		remove_if_exists(cached + ".tmp")
+		shutil.copytree(installed, cached + ".tmp", symlinks=True)
+		remove_if_exists(cached)
+		os.rename(cached + ".tmp", cached)
+	with open(installed_key_file(lib, ctx), 'w') as f:
+		f.write(key + '\n')
+
+def build_library(lib, ctx, slots, jobserver):
+	build_state.lib = lib
+	build_state.ctx = ctx
+	build_state.jobs = slots
+	build_state.jobserver = jobserver
+	if jobserver is not None:
+		print(f"Starting {lib}{ctx.variant} with a jobserver.")
+	else:
+		print(f"Starting {lib}{ctx.variant} with {slots} job slots.")
+	start = time.time()
+	if compiler_cache is not None:
+		start_compiler_cache(lib, ctx)
+	try:
+		if use_build_cache:
+			build_cached(lib, ctx)
+		else:
+			#(whatever gets installed will not match a cache key)
+			remove_if_exists(installed_key_file(lib, ctx))
+			run_builder(lib, ctx)
+	finally:
+		if compiler_cache is not None:
+			stop_compiler_cache(lib, ctx)
+		record_event('library', lib + ctx.variant, start, time.time(), slots=slots)
+
+#Hand unused jobserver tokens to the libraries that are using all of theirs,
+# taking idle tokens back when something else is waiting for one.
+# Returns the new number of free tokens.
+def balance_jobservers(jobservers, free_slots, waiting):
+	for js in jobservers:
+		js.poll()
+	starved = [ js for js in jobservers if js.idle == 0 ]
+	if free_slots < waiting + len(starved):
+		for js in jobservers:
+			free_slots += js.reclaim()
+	#keep a token for each library that is ready to start:
+	spare = free_slots - min(free_slots, waiting)
+	given = 0
+	while starved and given < spare:
+		starved[given % len(starved)].give(1)
+		given += 1
+	return free_slots - given
+
+#Build 'libs' for every variant in 'contexts', starting each library as soon
+# as the libraries it depends on are installed in its variant (so different
+# variants build side by side). Job slots (or jobserver tokens) are shared out
+# of the global 'jobs' budget; if any build fails, the rest are cancelled.
+#--plan: say what a run would do -- which libraries and phases would run, in
+# what order, with which configure commands and environment -- and estimate
+# its wall time from build-history.json, without running anything.
+plan_mode = "--plan" in options
+plan_default_seconds = 60.0 #(estimate for a library with no history)
+
+def describe_plan_input(value):
+	if isinstance(value, dict):
+		return [ 'env: ' + ' '.join(f"{key}='{value[key]}'" for key in sorted(value)) ] if len(value) > 0 else []
+	if isinstance(value, list) and len(value) > 0 and all(isinstance(arg, str) for arg in value):
+		return [ ' '.join(value) ]
+	return []
+
+#Prints the plan for 'libs' in ctx's variant; returns (critical path, cpu) seconds:
+def plan_builds(libs, ctx):
+	history = load_build_history().get(ctx.out, dict())
+	#the order build_libraries would start things in, by dependency level:
+	levels = dict()
+	order = []
+	pending = list(libs)
+	while pending:
+		ready = [ lib for lib in pending if all(dep in levels or dep not in libs for dep in lib_deps[lib]) ]
+		for lib in ready:
+			levels[lib] = 1 + max([ levels[dep] for dep in lib_deps[lib] if dep in libs ] + [ -1 ])
+			order.append(lib)
+			pending.remove(lib)
+	print(f"Plan for {ctx.out} ({jobs} jobs):")
+	estimates = dict() #lib => (wall, cpu)
+	rebuilt = set()
+	build_state.ctx = ctx
+	for lib in order:
+		build_state.lib = lib
+		build_state.jobs = jobs
+		build_state.plan = []
+		steps = []
+		if use_build_cache:
+			key = lib_cache_key(lib, ctx) if fetch_archive(lib) is not None else None
+			if key is not None and any(dep in rebuilt for dep in lib_deps[lib]):
+				key = None #(a dependency's new key isn't known until it's built)
+			if key is not None and os.path.isdir(build_cache_folder + "/" + key):
+				lib_cache_keys[(lib, ctx.variant)] = key
+				steps = [ ('restore from build cache', (), True) ]
+		if len(steps) == 0:
+			begin_phases(lib, ctx)
+			if any(dep in rebuilt for dep in lib_deps[lib]):
+				build_state.resuming = False
+			#(the builders' progress messages aren't part of the plan)
+			with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+				lib_builders[lib](ctx)
+			#(a patch phase with no patches has nothing to do)
+			steps = [ (name, inputs, runs) for (name, inputs, runs) in build_state.plan if not (name == 'patch' and inputs == ([],)) ]
+		wall = 0.0
+		cpu = 0.0
+		running = [ name for (name, inputs, runs) in steps if runs ]
+		if len(running) > 0 and lib not in history and steps[0][0] != 'restore from build cache':
+			(wall, cpu) = (plan_default_seconds, plan_default_seconds)
+			note = "no history"
+		else:
+			for name in running:
+				wall += history.get(lib, dict()).get(name, { 'wall':0.0 })['wall']
+				cpu += history.get(lib, dict()).get(name, { 'cpu':0.0 })['cpu']
+			note = "from history"
+		if len(running) > 0 and steps[0][0] != 'restore from build cache':
+			rebuilt.add(lib)
+		estimates[lib] = (wall, cpu)
+		print(f"  [{levels[lib]}] {lib}{ctx.variant}: " + (f"{', '.join(running)}" if len(running) > 0 else "up to date") + f" (est {wall:.1f}s wall, {cpu:.1f}s cpu; {note})")
+		for (name, inputs, runs) in steps:
+			if not runs:
+				continue
+			for line in [ line for value in inputs for line in describe_plan_input(value) ]:
+				print(f"      {name}: {line}")
+	build_state.lib = None
+	build_state.ctx = None
+
+	#longest chain of estimated wall times through the dependency graph:
+	path_to = dict() #lib => (seconds, [ libs ])
+	for lib in order:
+		best = max([ path_to[dep] for dep in lib_deps[lib] if dep in libs ] + [ (0.0, []) ], key=lambda p: p[0])
+		path_to[lib] = (best[0] + estimates[lib][0], best[1] + [ lib ])
+	(critical, path) = max(path_to.values(), key=lambda p: p[0]) if len(path_to) > 0 else (0.0, [])
+	total_cpu = sum(cpu for (wall, cpu) in estimates.values())
+	#(libraries overlap, so the run takes at least the critical path and at least the cpu time spread over all jobs)
+	estimate = max(critical, total_cpu / jobs)
+	print("  Critical path: " + ' \u2192 '.join(path) + f" ({critical:.1f}s)")
+	print(f"  Total: {total_cpu:.1f} cpu-seconds; estimated wall time {estimate:.1f}s ({estimate / 60:.1f} min)")
+	return (critical, total_cpu)
+
+def build_libraries(libs, contexts):
+	if len(libs) == 0:
+		return
+	pending = [ (lib, ctx) for lib in libs for ctx in contexts ]
+	done = set() #(lib, variant)
+	running = dict() #future => (lib, ctx, slots, jobserver)
+	free_slots = jobs
+	failure = None
+	build_cancelled.clear()
+	with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as pool:
+		try:
+			while running or (pending and failure is None):
+				ready = []
+				if failure is None:
+					#deps not being built this run are assumed to already be installed:
+					ready = [ (lib, ctx) for (lib, ctx) in pending if all((dep, ctx.variant) in done or dep not in libs for dep in lib_deps[lib]) ]
+					while ready and free_slots > 0:
+						(lib, ctx) = ready.pop(0)
+						jobserver = None
+						if use_jobserver and (lib not in ninja_libs or ninja_joins_jobserver):
+							#the library's first token is the implicit one its make holds:
+							slots = 1
+							jobserver = Jobserver(lib + ctx.variant)
+						else:
+							slots = max(1, free_slots // (len(ready) + 1))
+						free_slots -= slots
+						pending.remove((lib, ctx))
+						running[pool.submit(build_library, lib, ctx, slots, jobserver)] = (lib, ctx, slots, jobserver)
+				if not running:
+					break
+				if use_jobserver:
+					jobservers = [ js for (lib, ctx, slots, js) in running.values() if js is not None ]
+					free_slots = balance_jobservers(jobservers, free_slots, len(ready))
+				finished, _ = concurrent.futures.wait(running, timeout=(0.2 if use_jobserver else None), return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in finished:
+					(lib, ctx, slots, jobserver) = running.pop(future)
+					if jobserver is not None:
+						jobserver.poll()
+						jobserver.report()
+						#once the build is done, every token it was granted is back:
+						free_slots += jobserver.granted
+						jobserver.close()
+					else:
+						free_slots += slots
+					try:
+						future.result()
+						done.add((lib, ctx.variant))
+						print(f"Finished {lib}{ctx.variant}.")
+					except BuildCancelled:
+						print(f"Cancelled {lib}{ctx.variant}.")
+					except Exception as e:
+						print(f"ERROR: {lib}{ctx.variant} failed; cancelling other builds.")
+						if failure is None:
+							failure = (lib + ctx.variant, e)
+						cancel_builds()
+		except KeyboardInterrupt:
+			cancel_builds()
+			raise
+		finally:
+			for (lib, ctx, slots, jobserver) in running.values():
+				if jobserver is not None:
+					jobserver.close()
+	if failure is not None:
+		(lib, e) = failure
+		traceback.print_exception(type(e), e, e.__traceback__)
+		exit(f"Building {lib} failed.")
+
+#---- command line (tests/support.py loads just the definitions above this line) ----
+
+if "--verify" in options:
+	verify_work_folder()
+	exit(0)
+
+to_build = [ arg for arg in sys.argv[1:] if arg not in options ]
+
+if len(to_build) > 0 and to_build[0] == 'update':
+	if len(to_build) != 2:
+		exit("Usage: rebuild-libs.py update <tag> [--dir=path/to/nest-libs]")
+	update_release(to_build[1])
+	exit(0)
+
+if len(to_build) > 0 and to_build[0] == 'bench':
+	if to_build[1:2] == ['compare'] and len(to_build) == 4:
+		compare_benchmarks(to_build[2], to_build[3])
+	elif len(to_build) == 1:
+		root = '.'
+		bench_out = None
+		for opt in options:
+			if opt.startswith('--dir='):
+				root = opt[len('--dir='):]
+			if opt.startswith('--bench-out='):
+				bench_out = opt[len('--bench-out='):]
+		results = run_benchmarks(root)
+		if bench_out is None:
+			bench_out = "nest-libs-" + output_root + "-" + (results['tag'] or tag) + "-bench.json"
+		with open(bench_out, 'w') as f:
+			json.dump(results, f, indent='\t', sort_keys=True)
+		print(f"Wrote '{bench_out}'.")
+	else:
+		exit("Usage: rebuild-libs.py bench [--dir=path/to/nest-libs] [--bench-runs=N] [--bench-out=file.json]\n"
+			"       rebuild-libs.py bench compare <old> <new> [--threshold=percent] (each a .json, a nest-libs folder, or a release tag)")
+	exit(0)
+
+if len(to_build) > 0 and to_build[0] == 'cache':
+	if to_build[1:] != ['stats']:
+		exit("Usage: rebuild-libs.py cache stats")
+	download_cache_stats()
+	exit(0)
+
+if not plan_mode:
+	print("To build: " + ", ".join(to_build))
 
 if "all" in to_build:
 	to_build = [ "harfbuzz", "freetype", "SDL3", "glm", "zlib", "libpng", "libogg", "libopus", "opusfile", "libopusenc", "opus-tools"]
 	if "package" in sys.argv[1:]:
 		to_build.append("package")
 
-if "freetype" in to_build:
-	for variant in variants:
-		build_freetype()
-
-if "harfbuzz" in to_build:
-	for variant in variants:
-		build_harfbuzz()
-
-if "SDL3" in to_build:
-	for variant in variants:
-		build_SDL3()
+if not plan_mode:
+	prefetch_archives([ lib for lib in to_build if lib in lib_archives ])
 
-if "glm" in to_build:
-	for variant in variants:
-		build_glm()
+compiler_version = get_compiler_version()
 
-if "zlib" in to_build:
-	for variant in variants:
-		build_zlib()
-
-if "libpng" in to_build:
-	for variant in variants:
-		build_libpng()
+if check_patches_mode:
+	#(patches don't depend on the variant, so the first one will do)
+	ctx = build_contexts[0]
+	build_state.ctx = ctx
+	build_state.jobs = jobs
+	for lib in [ lib for lib in to_build if lib in lib_builders ]:
+		build_state.lib = lib
+		begin_phases(lib, ctx)
+		lib_builders[lib](ctx)
+	if len(patch_problems) != 0:
+		exit(f"{len(patch_problems)} patched files no longer match their sources:\n" + "\n".join(f"{lib}: {problem}" for (lib, problem) in patch_problems))
+	print(f"Every patch applies to the pinned sources for {target}.")
+	exit(0)
 
-if "libopus" in to_build:
-	for variant in variants:
-		build_libopus()
+if plan_mode:
+	estimates = [ plan_builds([ lib for lib in to_build if lib in lib_builders ], ctx) for ctx in build_contexts ]
+	if "package" in to_build:
+		print("Then package: " + ', '.join(f"{fmt} (level {level})" for (fmt, level) in package_formats()) + ", plus per-library components and a manifest.")
+	if len(variants) > 1:
+		#(the variants build at the same time, sharing the same jobs)
+		total = max(max(critical for (critical, cpu) in estimates), sum(cpu for (critical, cpu) in estimates) / jobs)
+		print(f"Estimated wall time for all variants: {total:.1f}s ({total / 60:.1f} min)")
+	exit(0)
 
-if "libogg" in to_build:
-	for variant in variants:
-		build_libogg()
+if use_build_cache:
+	os.makedirs(build_cache_folder, exist_ok=True)
 
-if "opusfile" in to_build:
-	for variant in variants:
-		build_opusfile()
+#(also written when a build fails)
+atexit.register(write_timeline)
 
-if "libopusenc" in to_build:
-	for variant in variants:
-		build_libopusenc()
+build_libraries([ lib for lib in to_build if lib in lib_builders ], build_contexts)
 
-if "opus-tools" in to_build:
-	for variant in variants:
-		build_opustools()
+report_compiler_cache()
+report_configure_times()
 
 if "package" in to_build:
+	start = time.time()
 	make_package()
+	record_event('package', 'package', start, time.time())
@@ -0,0 +1,143 @@
+#Helpers for the tests: load the definitions from rebuild-libs.py into a fresh
+# namespace (run from a scratch folder), and serve files over HTTP the way a
+# flaky mirror would -- with Range requests and dropped connections.
+import os
+import sys
+import io
+import shutil
+import tempfile
+import time
+import threading
+import contextlib
+import unittest
+import unittest.mock
+import http.server
+
+script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rebuild-libs.py")
+#(the script handles its command line below this line)
+script_marker = "#---- command line"
+
+#Returns the script's globals, as if it were run (from the current folder) with
+# 'argv' and 'env'. (With no arguments at all, the script just prints a notice.)
+def load_script(argv=['all'], env={}):
+	with open(script, 'r', encoding='utf8') as f:
+		source = f.read()
+	definitions = source[:source.index(script_marker)]
+	saved_argv = sys.argv
+	saved_env = dict(os.environ)
+	sys.argv = [script] + argv
+	os.environ.update(env)
+	try:
+		namespace = { '__name__':'rebuild_libs', '__file__':script }
+		with contextlib.redirect_stdout(io.StringIO()):
+			exec(compile(definitions, script, 'exec'), namespace)
+	finally:
+		sys.argv = saved_argv
+		os.environ.clear()
+		os.environ.update(saved_env)
+	return namespace
+
+#Each test runs in its own scratch folder with its own copy of the script's
+# globals (self.script), and with the script's output collected in self.output:
+class ScriptTest(unittest.TestCase):
+	argv = ['all']
+	env = {}
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix='nest-libs-test-')
+		self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+		cwd = os.getcwd()
+		os.chdir(self.folder)
+		self.addCleanup(os.chdir, cwd)
+		env = { 'NEST_LIBS_DOWNLOAD_CACHE':self.folder + '/download-cache', 'NEST_LIBS_DOWNLOAD_BACKOFF':'0' }
+		env.update(self.env)
+		self.script = load_script(self.argv, env)
+		#(the local servers are reached directly, whatever proxy the tests run behind)
+		environment = unittest.mock.patch.dict(os.environ)
+		environment.start()
+		self.addCleanup(environment.stop)
+		for name in [ 'http_proxy', 'https_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'all_proxy', 'ALL_PROXY' ]:
+			os.environ.pop(name, None)
+		self.output = io.StringIO()
+		quiet = contextlib.redirect_stdout(self.output)
+		quiet.__enter__()
+		self.addCleanup(quiet.__exit__, None, None, None)
+
+#Serves 'files' (path => bytes) over HTTP/1.1 on localhost. Range requests get
+# 206 responses (unless 'ranges' is False). While 'drops' (path => [ byte counts ])
+# has counts left for a path, the next response for it sends that many bytes of
+# its body and then drops the connection; while 'errors' (path => [ statuses ])
+# has statuses left, the next response is that error. 'rate' (path => bytes per
+# second) throttles a body. Every request is logged in 'requests' as (path, Range
+# header), and when it arrived in 'times'; 'connections' counts connections.
+class FileServer:
+	def __init__(self, files, drops={}, errors={}, rate={}, ranges=True):
+		self.files = files
+		self.drops = { path:list(counts) for (path, counts) in drops.items() }
+		self.errors = { path:list(statuses) for (path, statuses) in errors.items() }
+		self.rate = rate
+		self.ranges = ranges
+		self.requests = []
+		self.times = []
+		self.connections = 0
+		server = self
+
+		class Handler(http.server.BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def log_message(self, *args):
+				pass
+
+			def setup(self):
+				server.connections += 1
+				super().setup()
+
+			def do_GET(self):
+				requested = self.headers.get('Range')
+				server.requests.append((self.path, requested))
+				server.times.append(time.time())
+				if self.path not in server.files:
+					self.send_error(404)
+					return
+				statuses = server.errors.get(self.path, [])
+				if len(statuses) > 0:
+					self.send_error(statuses.pop(0))
+					return
+				data = server.files[self.path]
+				start = 0
+				if requested is not None and server.ranges:
+					start = int(requested[len('bytes='):].rstrip('-'))
+					if start >= len(data):
+						self.send_response(416)
+						self.send_header('Content-Length', '0')
+						self.end_headers()
+						return
+				self.send_response(206 if start > 0 else 200)
+				self.send_header('Content-Length', str(len(data) - start))
+				if start > 0:
+					self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+				self.end_headers()
+				counts = server.drops.get(self.path, [])
+				if len(counts) > 0:
+					self.wfile.write(data[start:start + counts.pop(0)])
+					self.wfile.flush()
+					self.close_connection = True
+					return
+				if self.path in server.rate:
+					block = max(1, server.rate[self.path] // 20)
+					for offset in range(start, len(data), block):
+						self.wfile.write(data[offset:offset + block])
+						self.wfile.flush()
+						time.sleep(block / server.rate[self.path])
+					return
+				self.wfile.write(data[start:])
+
+		self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self.httpd.daemon_threads = True
+		self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+		self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+		self.thread.start()
+
+	def close(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+from support import ScriptTest
+
+#stands in for an autoconf configure script: adds the NAME=VALUE lines in results.txt to the cache
+fake_configure = """
+import sys
+cache = [ arg[len('--cache-file='):] for arg in sys.argv if arg.startswith('--cache-file=') ][0]
+with open('results.txt') as results, open(cache, 'a') as f:
+	for line in results.read().split():
+		(name, value) = line.split('=', 1)
+		f.write(name + '=${' + name + '=' + value + '}\\n')
+"""
+
+class ConfigCacheTest(ScriptTest):
+	def setUp(self):
+		super().setUp()
+		self.script['compiler_version'] = 'test-cc 1.0'
+		self.ctx = self.script['build_contexts'][0]
+		self.script['build_state'].ctx = self.ctx
+		with open('configure.py', 'w') as f:
+			f.write(fake_configure)
+
+	def configure(self, lib, env, results):
+		self.script['build_state'].lib = lib
+		os.makedirs(lib, exist_ok=True)
+		with open(lib + '/results.txt', 'w') as f:
+			f.write('\n'.join(results))
+		self.script['run_configure']([ sys.executable, os.path.abspath('configure.py') ], cwd=lib, env=dict(os.environ, **env))
+		return self.script['read_config_cache'](lib + '/config.cache')
+
+	#libraries configured with different flags don't see each other's results:
+	def test_key_includes_library_flags(self):
+		self.configure('one', { 'CFLAGS':'-O2' }, [ 'ac_cv_env_CFLAGS_value=-O2', 'ac_cv_header_foo_h=yes' ])
+		seen = self.configure('two', { 'CFLAGS':'-O2 -Ione' }, [])
+		self.assertEqual(seen, {})
+		seen = self.configure('three', { 'CFLAGS':'-O2' }, [])
+		self.assertEqual(sorted(seen), [ 'ac_cv_env_CFLAGS_value', 'ac_cv_header_foo_h' ])
+
+	def test_key_includes_variable_arguments(self):
+		file = self.script['config_cache_file']
+		env = dict(os.environ)
+		self.assertNotEqual(file(self.ctx, [ './configure', 'LIBS=-lm' ], env), file(self.ctx, [ './configure' ], env))
+		self.assertEqual(file(self.ctx, [ './configure', '--enable-static' ], env), file(self.ctx, [ './configure' ], env))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import shlex
+import unittest
+
+from support import ScriptTest
+
+#a stand-in for lipo: concatenates its inputs, with a header line, into the output
+stub_merger = "import sys; open(sys.argv[1], 'wb').write(b'merged\\n' + b''.join(open(f, 'rb').read() for f in sys.argv[2:]))"
+
+class MergeTest(ScriptTest):
+	env = { 'NEST_LIBS_MERGE_TOOL':shlex.join([ sys.executable, '-c', stub_merger ]) + ' {output} {inputs}' }
+
+	variants = [ ('-a', 'defined(A)'), ('-b', 'defined(B)'), ('-c', None) ]
+
+	def write(self, filename, data):
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename, 'wb') as f:
+			f.write(data)
+
+	def read(self, filename):
+		with open(filename, 'rb') as f:
+			return f.read()
+
+	def make_trees(self, extra={}):
+		trees = []
+		for (suffix, condition) in self.variants:
+			tree = 'out' + suffix
+			self.write(tree + '/glm/include/glm.hpp', b'same everywhere\n')
+			self.write(tree + '/glm/dist/README.txt', b'same everywhere too\n')
+			self.write(tree + '/ogg/include/ogg/ogg.h', b'same header\n')
+			self.write(tree + '/ogg/include/ogg/config_types.h', f"typedef int size{suffix};\n".encode('utf8'))
+			self.write(tree + '/ogg/lib/libogg.a', f"code for{suffix}\n".encode('utf8'))
+			for (name, data) in extra.get(suffix, {}).items():
+				self.write(tree + '/' + name, data)
+			trees.append(tree)
+		return trees
+
+	def merge(self, trees):
+		self.script['merge_variant_trees']('out', trees, [ condition for (suffix, condition) in self.variants ])
+
+	def test_merges_n_variants(self):
+		self.merge(self.make_trees())
+		self.assertEqual(self.read('out/glm/include/glm.hpp'), b'same everywhere\n')
+		self.assertEqual(self.read('out/ogg/include/ogg/ogg.h'), b'same header\n')
+		self.assertEqual(self.read('out/ogg/lib/libogg.a'), b'merged\ncode for-a\ncode for-b\ncode for-c\n')
+		self.assertEqual(self.read('out/ogg/include/ogg/config_types.h'), (
+			b'#if defined(A)\n//out-a/ogg/include/ogg/config_types.h:\ntypedef int size-a;\n'
+			b'#elif defined(B)\n//out-b/ogg/include/ogg/config_types.h:\ntypedef int size-b;\n'
+			b'#else\n//out-c/ogg/include/ogg/config_types.h:\ntypedef int size-c;\n'
+			b'#endif\n'))
+		self.assertIn('1 whole directories', self.output.getvalue())
+
+	def test_conflicting_file_fails(self):
+		trees = self.make_trees({ '-b':{ 'glm/dist/README.txt':b'different\n' } })
+		with self.assertRaises(SystemExit):
+			self.merge(trees)
+		self.assertIn('branch mis-match', self.output.getvalue())
+
+	def test_missing_file_fails(self):
+		trees = self.make_trees({ '-a':{ 'ogg/include/ogg/extra.h':b'only here\n' } })
+		with self.assertRaises(SystemExit):
+			self.merge(trees)
+		self.assertIn("'ogg/include/ogg/extra.h' is missing from out-b, out-c", self.output.getvalue())
+
+	#with every variant guarded, a header with no matching variant is an error:
+	def test_headers_without_else(self):
+		self.variants = [ ('-a', 'defined(A)'), ('-b', 'defined(B)') ]
+		self.merge(self.make_trees())
+		self.assertTrue(self.read('out/ogg/include/ogg/config_types.h').endswith(b'#else\n#error "No matching variant for this header."\n#endif\n'))
+
+if __name__ == '__main__':
+	unittest.main()
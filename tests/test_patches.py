@@ -0,0 +1,46 @@
+import os
+import unittest
+
+from support import ScriptTest
+
+class PatchTest(ScriptTest):
+	def write(self, filename, text):
+		os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+		with open(filename, 'wb') as f:
+			f.write(text)
+
+	def read(self, filename):
+		with open(filename, 'rb') as f:
+			return f.read()
+
+	def test_counts(self):
+		patch_data = self.script['patch_data']
+		(patched, problems, warnings) = patch_data(b'a b a\r\n', [ ('a', 'x', 2), ('b', 'bb') ])
+		self.assertEqual((patched, problems, warnings), (b'x bb x\r\n', [], []))
+		(patched, problems, warnings) = patch_data(b'a b a', [ ('a', 'x', 1) ])
+		self.assertEqual(len(problems), 1)
+
+	#a replacement without a count only warns when it misses, except with --check-patches:
+	def test_missing_replacement(self):
+		(patched, problems, warnings) = self.script['patch_data'](b'a', [ ('a', 'x'), ('zzz', 'y') ])
+		self.assertEqual((patched, problems, len(warnings)), (b'x', [], 1))
+		(patched, problems, warnings) = self.script['patch_data'](b'a', [ ('a', 'x'), ('zzz', 'y') ], strict=True)
+		self.assertEqual((len(problems), warnings), (1, []))
+
+	#every file is checked before any of them is written:
+	def test_apply_checks_first(self):
+		self.write('src/one.txt', b'one')
+		self.write('src/two.txt', b'two')
+		with self.assertRaises(self.script['PatchError']):
+			self.script['apply_patches']('src', [ ('one.txt', [ ('one', '1') ]), ('two.txt', [ ('two', '2', 2) ]) ])
+		self.assertEqual(self.read('src/one.txt'), b'one')
+		self.script['apply_patches']('src', [ ('one.txt', [ ('one', '1') ]), ('two.txt', [ ('two', '2') ]) ])
+		self.assertEqual((self.read('src/one.txt'), self.read('src/two.txt')), (b'1', b'2'))
+
+	def test_io_errors_propagate(self):
+		os.makedirs('src', exist_ok=True)
+		with self.assertRaises(FileNotFoundError):
+			self.script['apply_patches']('src', [ ('missing.txt', [ ('a', 'b') ]) ])
+
+if __name__ == '__main__':
+	unittest.main()
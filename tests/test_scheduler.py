@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+import unittest
+
+from support import ScriptTest, FileServer
+
+class SchedulerTest(ScriptTest):
+	argv = ['all', '--no-cache', '--no-jobserver']
+
+	def setUp(self):
+		super().setUp()
+		self.script['jobs'] = 4
+		self.script['compiler_cache'] = None
+		self.events = [] #(lib, 'start' or 'end', time)
+		self.lock = threading.Lock()
+
+	def note(self, lib, what):
+		with self.lock:
+			self.events.append((lib, what, time.time()))
+
+	#a builder that takes 'seconds', and stops early if the build is cancelled:
+	def fake_builder(self, lib, seconds=0.1, fail=False):
+		def build(ctx):
+			self.note(lib, 'start')
+			until = time.time() + seconds
+			while time.time() < until:
+				if self.script['build_cancelled'].is_set():
+					raise self.script['BuildCancelled']()
+				time.sleep(0.01)
+			if fail:
+				raise RuntimeError(f"{lib} failed")
+			self.note(lib, 'end')
+		return build
+
+	def when(self, lib, what):
+		return [ t for (l, w, t) in self.events if l == lib and w == what ][0]
+
+	def test_dependencies_finish_first(self):
+		libs = list(self.script['lib_deps'])
+		for lib in libs:
+			self.script['lib_builders'][lib] = self.fake_builder(lib)
+		self.script['build_libraries'](libs, self.script['build_contexts'])
+		self.assertEqual(sorted(lib for (lib, what, t) in self.events if what == 'end'), sorted(libs))
+		for lib in libs:
+			for dep in self.script['lib_deps'][lib]:
+				self.assertLessEqual(self.when(dep, 'end'), self.when(lib, 'start'), f"{lib} started before {dep} finished")
+		#(independent libraries overlap)
+		self.assertLess(self.when('SDL3', 'start'), self.when('glm', 'end'))
+
+	#a failure cancels what is running, and nothing that depends on it starts:
+	def test_failure_propagates(self):
+		libs = [ 'libogg', 'libopus', 'opusfile', 'libopusenc', 'opus-tools', 'SDL3' ]
+		for lib in libs:
+			self.script['lib_builders'][lib] = self.fake_builder(lib, seconds=(5.0 if lib == 'SDL3' else 0.1), fail=(lib == 'libogg'))
+		start = time.time()
+		with self.assertRaises(SystemExit) as caught:
+			self.script['build_libraries'](libs, self.script['build_contexts'])
+		self.assertIn('libogg', str(caught.exception))
+		started = set(lib for (lib, what, t) in self.events if what == 'start')
+		self.assertFalse(started & { 'opusfile', 'libopusenc', 'opus-tools' })
+		self.assertNotIn(('SDL3', 'end'), [ (lib, what) for (lib, what, t) in self.events ])
+		self.assertLess(time.time() - start, 4.0)
+
+	#archives download while the first builds run, and each build waits only for its own:
+	def test_prefetch_overlaps_builds(self):
+		files = { '/small.tar.gz':os.urandom(1000), '/large.tar.gz':os.urandom(200000) }
+		server = FileServer(files, rate={ '/large.tar.gz':200000 })
+		self.addCleanup(server.close)
+		self.script['lib_archives']['zlib'] = (server.url + '/small.tar.gz', 'work/small.tar.gz')
+		self.script['lib_archives']['SDL3'] = (server.url + '/large.tar.gz', 'work/large.tar.gz')
+		fetched = dict()
+		def builder(lib):
+			def build(ctx):
+				self.note(lib, 'start')
+				self.script['fetch_archive'](lib)
+				fetched[lib] = time.time()
+				self.note(lib, 'end')
+			return build
+		for lib in [ 'zlib', 'SDL3' ]:
+			self.script['lib_builders'][lib] = builder(lib)
+		self.script['prefetch_archives']([ 'zlib', 'SDL3' ])
+		self.script['build_libraries']([ 'zlib', 'SDL3' ], self.script['build_contexts'])
+		#both downloads started before zlib's build was done, which was before SDL3's archive arrived:
+		self.assertLess(max(server.times), self.when('zlib', 'end'))
+		self.assertLess(self.when('zlib', 'end'), fetched['SDL3'])
+		self.assertGreater(fetched['SDL3'] - min(server.times), 0.5)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,89 @@
+import os
+import io
+import shutil
+import tarfile
+import unittest
+
+from support import ScriptTest, FileServer
+
+class UpdateTest(ScriptTest):
+	#lays out 'tree' (relative path => bytes) under the output root and packages it as 'tag';
+	# returns the release's assets (name => bytes):
+	def make_release(self, tag, tree):
+		root = self.script['output_root']
+		shutil.rmtree(root, ignore_errors=True)
+		for name in [ name for name in os.listdir('.') if name.startswith('nest-libs-') ]:
+			os.remove(name)
+		for (name, data) in tree.items():
+			os.makedirs(os.path.dirname(root + '/' + name), exist_ok=True)
+			with open(root + '/' + name, 'wb') as f:
+				f.write(data)
+		self.script['tag'] = tag
+		open(tag, 'w').close()
+		files = [ tag, 'README.md' ]
+		for (dirpath, dirnames, filenames) in os.walk(root):
+			files += [ dirpath + '/' + fn for fn in filenames ]
+		self.script['write_manifest'](files)
+		self.script['write_tar_package']('nest-libs-' + root + '-' + tag, [ (name, 'nest-libs/' + name) for name in files + [ 'manifest.json' ] ])
+		self.script['write_component_packages']()
+		os.remove(tag)
+		assets = dict()
+		for name in os.listdir('.'):
+			if name.startswith('nest-libs-'):
+				with open(name, 'rb') as f:
+					assets[name] = f.read()
+		return assets
+
+	def read(self, filename):
+		with open(filename, 'rb') as f:
+			return f.read()
+
+	def test_round_trip(self):
+		with open('README.md', 'w') as f:
+			f.write('nest-libs\n')
+		v1 = self.make_release('v1', {
+			'zlib/include/zlib.h':b'#define ZLIB_VERSION "1"\n',
+			'zlib/lib/libz.a':os.urandom(5000),
+			'libpng/include/png.h':b'png\n',
+			'libpng/lib/libpng.a':os.urandom(5000),
+			'libogg/include/ogg/ogg.h':b'ogg\n',
+		})
+		v2_tree = {
+			'zlib/include/zlib.h':b'#define ZLIB_VERSION "2"\n',
+			'zlib/lib/libz.a':os.urandom(5000),
+			'libpng/include/png.h':b'png\n',
+			'libpng/lib/libpng.a':self.read(self.script['output_root'] + '/libpng/lib/libpng.a'),
+			'libpng/dist/README-libpng.txt':b'',
+		}
+		v2 = self.make_release('v2', v2_tree)
+		files = { '/v1/' + name:data for (name, data) in v1.items() }
+		files.update({ '/v2/' + name:data for (name, data) in v2.items() })
+		server = FileServer(files)
+		self.addCleanup(server.close)
+
+		#a consumer unpacks v1, then updates to v2:
+		root = self.script['output_root']
+		with tarfile.open(fileobj=io.BytesIO(v1['nest-libs-' + root + '-v1.tar.gz'])) as tar:
+			tar.extractall('client')
+		self.script['release_url'] = server.url
+		self.script['options'].append('--dir=client/nest-libs')
+		self.script['update_release']('v2')
+
+		for (name, data) in v2_tree.items():
+			self.assertEqual(self.read('client/nest-libs/' + root + '/' + name), data, name)
+		self.assertFalse(os.path.exists('client/nest-libs/' + root + '/libogg/include/ogg/ogg.h'))
+		self.assertFalse(os.path.exists('client/nest-libs/v1'))
+		self.assertTrue(os.path.exists('client/nest-libs/v2'))
+		self.assertEqual(self.read('client/nest-libs/manifest.json'), v2['nest-libs-' + root + '-v2-manifest.json'])
+		self.assertFalse(os.path.exists('client/nest-libs/.update'))
+		#only the changed component was fetched, not libpng's or the whole release:
+		fetched = [ path for (path, requested) in server.requests if not path.endswith('.json') ]
+		self.assertEqual(fetched, [ '/v2/nest-libs-' + root + '-v2-zlib.tar.gz' ])
+
+		#and a second update has nothing to do:
+		del server.requests[:]
+		self.script['update_release']('v2')
+		self.assertEqual([ path for (path, requested) in server.requests if not path.endswith('.json') ], [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+import unittest
+
+from support import ScriptTest
+
+class VariantsTest(ScriptTest):
+	argv = ['all', '--no-cache', '--no-jobserver', '--variant=-O1:-O1', '--variant=-O3:-O3']
+
+	def setUp(self):
+		super().setUp()
+		self.script['jobs'] = 4
+		self.script['compiler_cache'] = None
+		self.events = [] #(lib + variant, 'start' or 'end', time)
+		self.lock = threading.Lock()
+
+	def note(self, name, what):
+		with self.lock:
+			self.events.append((name, what, time.time()))
+
+	def when(self, name, what):
+		return [ t for (n, w, t) in self.events if n == name and w == what ][0]
+
+	#a builder that "builds" in its variant's work folder, with the variant's flags, into its output folder:
+	def fake_builder(self, lib):
+		def build(ctx):
+			self.note(lib + ctx.variant, 'start')
+			source = ctx.work + '/' + lib
+			os.makedirs(source, exist_ok=True)
+			with open(source + '/flags', 'w') as f:
+				f.write(ctx.cflags)
+			time.sleep(0.2)
+			with open(source + '/flags', 'r') as f:
+				flags = f.read()
+			os.makedirs(ctx.out + '/' + lib, exist_ok=True)
+			with open(ctx.out + '/' + lib + '/flags', 'w') as f:
+				f.write(flags)
+			self.note(lib + ctx.variant, 'end')
+		return build
+
+	def test_contexts(self):
+		contexts = self.script['build_contexts']
+		self.assertEqual([ (ctx.variant, ctx.cflags) for ctx in contexts ], [ ('-O1', '-O1'), ('-O3', '-O3') ])
+		self.assertEqual([ ctx.out for ctx in contexts ], [ self.script['target'] + '-O1', self.script['target'] + '-O3' ])
+		self.assertNotEqual(contexts[0].work, contexts[1].work)
+
+	def test_variants_build_side_by_side(self):
+		for lib in [ 'zlib', 'libpng' ]:
+			self.script['lib_builders'][lib] = self.fake_builder(lib)
+		self.script['build_libraries']([ 'zlib', 'libpng' ], self.script['build_contexts'])
+		#the two variants of a library overlap, but each waits for its own variant's dependencies:
+		self.assertLess(self.when('zlib-O1', 'start'), self.when('zlib-O3', 'end'))
+		self.assertLess(self.when('zlib-O3', 'start'), self.when('zlib-O1', 'end'))
+		for variant in [ '-O1', '-O3' ]:
+			self.assertLessEqual(self.when('zlib' + variant, 'end'), self.when('libpng' + variant, 'start'))
+		#and neither stepped on the other's sources or output:
+		for ctx in self.script['build_contexts']:
+			for lib in [ 'zlib', 'libpng' ]:
+				with open(ctx.out + '/' + lib + '/flags', 'r') as f:
+					self.assertEqual(f.read(), ctx.cflags)
+
+if __name__ == '__main__':
+	unittest.main()